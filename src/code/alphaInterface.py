@@ -0,0 +1,77 @@
+"""
+Retrieving data from alphavantage.co
+V0.01, October 18, 2026
+"""
+
+import datetime
+import json
+import socket
+
+import requests
+import urllib3
+
+import circuitBreaker
+import httpSession
+import responseCache
+import security
+
+
+def retrieve_daily_data(symbol, mysettings):
+    """
+    Return current price for given stock, 0 if hit an error.
+    Note that am using alphavantage.co's api to retrieve prices. Has a limit of 5 requests per
+    minute (and 500 per day) on the free tier, so waits for the alpha rate limiter before
+    each call, and each retry, to stay legal.
+    Also note that appears that if request a symbol that they don't recognize, they return
+    an empty Global Quote object.
+    Getting pricing from alphavest doesn't currently work, because the GLOBAL_QUOTE method
+    doesn't return the 52 week range - only currentPrice is filled in. Have hidden this
+    option, may eventually try to find another method that returns everything I need.
+    Prices retrieved earlier today come from the response cache, if caching quotes. Once
+    alpha's circuit breaker opens, fails straight away, without waiting for the limiter.
+    """
+    priceInfo = security.PriceInfo()
+    cacheKey = responseCache.make_key("alpha", symbol, "quote", datetime.date.today())
+    myCache = responseCache.get_quote_cache(mysettings)
+    if myCache is not None:
+        cachedPrice = myCache.get(cacheKey)
+        if cachedPrice is not None:
+            priceInfo.currentPrice = float(cachedPrice)
+            return priceInfo
+    price = 0
+    reqParams = {'function': 'GLOBAL_QUOTE',
+                 'symbol': symbol,
+                 'apikey': mysettings.alphaApiKey,
+                 'datatype': 'json'}
+    try:
+        r = httpSession.call_with_retries(
+            "alpha", mysettings,
+            lambda: httpSession.get("alpha", mysettings, mysettings.alphaBaseUrl,
+                                    params=reqParams,
+                                    timeout=mysettings.alphaApiTimeOut))
+        if r.ok:
+            try:
+                with open(symbol + ".json", 'w') as f:
+                    json.dump(r.json(), f)
+
+                price = r.json()[mysettings.respContName][mysettings.priceName]
+                if myCache is not None:
+                    myCache.put(cacheKey, price)
+            except (NameError, KeyError) as E:
+                print("Couldn't find price element for ", symbol)
+                print("E: ", E)
+        else:
+            print(r.ok, r.reason, r.request, r.status_code, r.text)
+    except (ConnectionError,
+            urllib3.exceptions.MaxRetryError,
+            urllib3.exceptions.NewConnectionError,
+            socket.timeout,
+            NameError,
+            requests.exceptions.RequestException,
+            circuitBreaker.CircuitOpenError) as E:
+        print("Failed to retrieve price for ", symbol)
+        print(E)
+
+    priceInfo.currentPrice = float(price)
+
+    return priceInfo
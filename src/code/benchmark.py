@@ -0,0 +1,251 @@
+"""
+Benchmark for the daily update, without Yahoo or RDS. A fake price provider, with
+configurable latency and error rate, stands in for Yahoo, and a synthetic portfolio of
+any size is loaded into a local SQLite database. Reports wall time, database statement
+count and peak memory for each stage - loading the list (including full histories),
+the daily update and building the email - to show how the nightly job scales.
+Also compares the quote page parser with the pandas.read_html one it replaced.
+V0.01, October 18, 2026
+"""
+
+from contextlib import contextmanager
+from datetime import timedelta
+import random
+import time
+import tracemalloc
+import zlib
+
+import daily_email
+import dbAccess
+import databaseUtils
+import priceProviders
+import securities
+from security import PriceInfo
+import security_groups
+import settings
+from targetSecurity import TargetSecurity
+import yahooInterface
+
+
+class FakePriceProvider(priceProviders.BasePriceProvider):
+    """
+    Stands in for yahooInterface. Prices are made up, but the same every time for a
+    given symbol and seed. Each call waits latency seconds, and fails, the way
+    yahooInterface does, with no prices, for about errorRate of symbols.
+    """
+    name = "benchmark"
+
+    def __init__(self, latency=0.0, errorRate=0.0, seed=0):
+        self.latency = latency
+        self.errorRate = errorRate
+        self.seed = seed
+
+    def retrieve_daily_data(self, symbol, mysettings):
+        rng = self._get_random(symbol)
+        time.sleep(self.latency)
+        priceInfo = PriceInfo()
+        if not self._fails(rng):
+            basePrice = self._get_base_price(rng)
+            priceInfo.lastClosePrice = basePrice
+            priceInfo.currentPrice = round(basePrice * rng.uniform(0.95, 1.05), 2)
+            priceInfo.low52Week = round(basePrice * 0.7, 2)
+            priceInfo.high52Week = round(basePrice * 1.3, 2)
+
+        return priceInfo
+
+    def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+        """
+        Random walk from the symbol's base price - every weekday for daily prices,
+        otherwise every Monday.
+        """
+        rng = self._get_random(symbol)
+        time.sleep(self.latency)
+        pairs = []
+        if not self._fails(rng):
+            price = self._get_base_price(rng)
+            step = timedelta(1)
+            priceDate = oldestDate
+            if priceFrequency != settings.Settings.instance().daily_price_code:
+                step = timedelta(7)
+                priceDate = oldestDate + timedelta((7 - oldestDate.weekday()) % 7)
+            while priceDate <= newestDate:
+                if priceDate.weekday() < 5:
+                    price = round(max(0.01, price * rng.uniform(0.98, 1.02)), 2)
+                    pairs.append((priceDate, price))
+                priceDate += step
+
+        return pairs
+
+    def _get_random(self, symbol):
+        return random.Random(self.seed * 1000003 + zlib.crc32(symbol.encode()))
+
+    def _fails(self, rng):
+        return rng.random() < self.errorRate
+
+    def _get_base_price(self, rng):
+        return round(rng.uniform(5, 500), 2)
+
+
+def generate_portfolio(numSecurities, seed=0):
+    """
+    Made up list of securities, with buy and sell prices spread around their fake
+    prices, so that they land in every group.
+    Returns: Dictionary of TargetSecurity, key = symbol, the same as
+    StockTarget.read_target_securities.
+    """
+    rng = random.Random(seed)
+    provider = FakePriceProvider(seed=seed)
+    portfolio = {}
+    for num in range(numSecurities):
+        target = TargetSecurity()
+        target.symbol = f"BM{num:05d}"
+        target.name = f"Benchmark security {num}"
+        basePrice = provider._get_base_price(provider._get_random(target.symbol))
+        target.buyPrice = round(basePrice * rng.uniform(0.7, 1.05), 2)
+        target.sellPrice = round(target.buyPrice * rng.uniform(1.1, 1.6), 2)
+        portfolio[target.symbol] = target
+
+    return portfolio
+
+
+class StageResult:
+    """
+    Measurements for one benchmark stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.wallSeconds = 0.0
+        self.numStatements = 0
+        self.peakBytes = 0
+
+    def __str__(self):
+        return (f"{self.name}: {self.wallSeconds:.3f}s, {self.numStatements} statements, "
+                f"peak memory {self.peakBytes / 1024 / 1024:.1f}MB")
+
+
+@contextmanager
+def _measure(results, name):
+    """
+    Time the with block, count its database statements and track its peak traced
+    memory, appending a StageResult to results.
+    """
+    result = StageResult(name)
+    tracemalloc.start()
+    startStatements = dbAccess.statementCount
+    startTime = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result.wallSeconds = time.perf_counter() - startTime
+        result.numStatements = dbAccess.statementCount - startStatements
+        result.peakBytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append(result)
+
+
+@contextmanager
+def _benchmark_environment(mySettings, provider, dbPath):
+    """
+    Switch to an empty SQLite database, with statement instrumentation on, and to
+    given price provider, for the duration of a with block. Holds a connection
+    open throughout, so that an in memory database survives between stages.
+    """
+    origSettings = (mySettings.db_backend, mySettings.sqlite_path,
+                    mySettings.db_instrumentation, mySettings.price_provider)
+    dbAccess.close_pool()
+    mySettings.db_backend = "sqlite"
+    mySettings.sqlite_path = dbPath
+    mySettings.db_instrumentation = True
+    priceProviders.register_provider(provider.name, lambda x: provider)
+    mySettings.price_provider = provider.name
+    dbAccess.connect()
+    try:
+        databaseUtils.create_tables()
+        yield
+    finally:
+        dbAccess.disconnect()
+        dbAccess.close_pool()
+        priceProviders.unregister_provider(provider.name)
+        (mySettings.db_backend, mySettings.sqlite_path, mySettings.db_instrumentation,
+         mySettings.price_provider) = origSettings
+
+
+def run_benchmark(numSecurities, latency=None, errorRate=None, dbPath=None, seed=0):
+    """
+    Load a synthetic portfolio of numSecurities, run the daily update over it with the
+    fake provider, then build (but don't send) the email. Settings give any of latency,
+    errorRate and dbPath not given.
+    Note that tracing memory slows allocation, so wall times are a little pessimistic.
+    Returns: List of StageResult, plus the daily price pipeline's stage counters.
+    """
+    mySettings = settings.Settings.instance()
+    if latency is None:
+        latency = mySettings.benchmark_latency
+    if errorRate is None:
+        errorRate = mySettings.benchmark_error_rate
+    if dbPath is None:
+        dbPath = mySettings.benchmark_db_path
+    provider = FakePriceProvider(latency, errorRate, seed)
+    portfolio = generate_portfolio(numSecurities, seed)
+
+    results = []
+    with _benchmark_environment(mySettings, provider, dbPath):
+        mySecurities = securities.Securities()
+        with _measure(results, "load list and histories"):
+            mySecurities.load()
+            mySecurities.loadNewList(portfolio)
+        with _measure(results, "daily update"):
+            mySecurities.do_daily_updates()
+        with _measure(results, "email"):
+            securitiesList = mySecurities.retrieve_email_info()
+            myGroups = security_groups.SecurityGroups()
+            myGroups.populate(securitiesList)
+            daily_email.get_email(myGroups, mySettings.websiteUrl)
+
+    return results, mySecurities.pipelineCounters
+
+
+def print_benchmark(numSecurities, results, pipelineCounters):
+    print(f"Benchmark for {numSecurities} securities:")
+    for result in results:
+        print(f"    {result}")
+    print("Daily price pipeline stages:")
+    for counter in pipelineCounters:
+        print(f"    {counter}")
+
+
+def compare_quote_parsers(pages, numRepeats=20):
+    """
+    Time yahooInterface's quote page parser against the pandas.read_html one that it
+    replaced, over given list of quote page html, such as recorded pages.
+    Returns: Dictionary of parser name: average seconds per page, and whether both
+    parsers found the same previous close and 52 week range on every page.
+    """
+    parsers = {"read_html": yahooInterface._parse_quote_tables,
+               "single pass": yahooInterface._parse_quote_page}
+    timings = {}
+    results = {}
+    for name, parser in parsers.items():
+        startTime = time.perf_counter()
+        for i in range(numRepeats):
+            results[name] = [parser(page) for page in pages]
+        timings[name] = (time.perf_counter() - startTime) / (numRepeats * len(pages))
+
+    agree = all(_get_quote_fields(old) == _get_quote_fields(new)
+                for old, new in zip(results["read_html"], results["single pass"]))
+
+    return timings, agree
+
+
+def print_parser_comparison(timings, agree):
+    print("Quote page parsers, average per page:")
+    for name, seconds in timings.items():
+        print(f"    {name}: {seconds * 1000:.3f}ms")
+    print(f"    single pass is {timings['read_html'] / timings['single pass']:.1f} times as "
+          f"fast, results {'agree' if agree else 'DIFFER'}.")
+
+
+def _get_quote_fields(quoteTable):
+    return (round(float(str(quoteTable["Previous Close"]).replace(",", "")), 2),
+            yahooInterface._split_price_range(str(quoteTable["52 Week Range"])))
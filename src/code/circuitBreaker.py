@@ -0,0 +1,154 @@
+"""
+Circuit breakers for price providers, and the backoff used when retrying them.
+When a provider is throttling or down, its breaker opens after enough calls fail, and
+remaining calls fail straight away for a cool down period, rather than every symbol
+using up its retries against a provider that isn't answering.
+V0.01, October 18, 2026
+"""
+
+from collections import deque
+import random
+import threading
+import time
+
+from sprEnums import BreakerState
+
+# Response statuses that mean the provider is in trouble, rather than the request was bad.
+failureStatuses = (429, 500, 502, 503, 504)
+# Longest wait before a retry, in seconds.
+maxBackoff = 30
+# One breaker per provider, created from settings on first use.
+breakers = {}
+breakersLock = threading.Lock()
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a provider whose circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Keeps the outcomes of the last windowSize calls to a provider. Once at least
+    minCalls of them are in, and failureRate or more of them failed, opens, refusing
+    calls for coolDownSeconds. After that, lets one trial call through - if it
+    succeeds, closes again, otherwise stays open for another cool down.
+    Outcomes are only counted for calls that allow_request let through.
+    """
+
+    def __init__(self, name, failureRate, windowSize, minCalls, coolDownSeconds):
+        self.name = name
+        self.failureRate = failureRate
+        self.minCalls = minCalls
+        self.coolDownSeconds = coolDownSeconds
+        self.outcomes = deque(maxlen=windowSize)
+        self.state = BreakerState.closed
+        self.openUntil = 0.0
+        self.numCalls = 0
+        self.numFailures = 0
+        self.numRejected = 0
+        self.numOpened = 0
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        """
+        Can caller go ahead and call the provider? Counts the call if so, otherwise
+        counts it as rejected.
+        """
+        with self.lock:
+            if self.state != BreakerState.closed:
+                now = time.monotonic()
+                if now < self.openUntil:
+                    self.numRejected += 1
+                    return False
+                # Cool down over - this caller is the trial. Any others wait for its
+                # outcome, or for another cool down if it never reports one.
+                self.state = BreakerState.halfOpen
+                self.openUntil = now + self.coolDownSeconds
+            self.numCalls += 1
+
+        return True
+
+    def reject_if_open(self):
+        """
+        Raise CircuitOpenError, counting a rejected call, if cooling down. For checking
+        before waiting on a rate limiter, so that refused calls don't use up its budget.
+        Doesn't take the trial call - allow_request still has to be called.
+        """
+        with self.lock:
+            if self.state != BreakerState.closed and time.monotonic() < self.openUntil:
+                self.numRejected += 1
+                raise CircuitOpenError(f"{self.name} circuit breaker is open.")
+
+    def record(self, succeeded):
+        """
+        Record the outcome of a call that allow_request let through.
+        """
+        with self.lock:
+            if not succeeded:
+                self.numFailures += 1
+            if self.state == BreakerState.halfOpen:
+                if succeeded:
+                    self.state = BreakerState.closed
+                    self.outcomes.clear()
+                else:
+                    self._open()
+            elif self.state == BreakerState.closed:
+                self.outcomes.append(succeeded)
+                numFailed = self.outcomes.count(False)
+                if (len(self.outcomes) >= self.minCalls and
+                        numFailed >= self.failureRate * len(self.outcomes)):
+                    self._open()
+
+    def _open(self):
+        self.state = BreakerState.open
+        self.openUntil = time.monotonic() + self.coolDownSeconds
+        self.numOpened += 1
+        print(f"{self.name} circuit breaker opened, refusing calls for "
+              f"{self.coolDownSeconds} seconds.")
+
+    def __str__(self):
+        return (f"{self.name} circuit breaker: {self.state.name}, {self.numCalls} calls, "
+                f"{self.numFailures} failed, {self.numRejected} rejected, "
+                f"opened {self.numOpened} times.")
+
+
+def get_breaker(provider, mysettings):
+    """
+    Return the circuit breaker shared by everything calling given provider.
+    """
+    with breakersLock:
+        breaker = breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider,
+                                     mysettings.breaker_failure_rate,
+                                     mysettings.breaker_window,
+                                     mysettings.breaker_min_calls,
+                                     mysettings.breaker_cool_down)
+            breakers[provider] = breaker
+
+    return breaker
+
+
+def reset_breakers():
+    """
+    Forget all breakers, so that they are created again, closed, from current settings.
+    """
+    with breakersLock:
+        breakers.clear()
+
+
+def print_breakers():
+    with breakersLock:
+        for breaker in breakers.values():
+            print(breaker)
+
+
+def get_backoff_delay(retryNum, backoff):
+    """
+    How long to wait before retry number retryNum (1 for the first) - exponential
+    backoff with full jitter, i.e. a random time up to backoff * 2^(retryNum-1), capped
+    at maxBackoff, so that callers that failed together don't all retry together.
+    """
+    return random.uniform(0, min(maxBackoff, backoff * 2 ** (retryNum - 1)))
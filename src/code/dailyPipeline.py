@@ -0,0 +1,195 @@
+"""
+Staged pipeline for the daily price update - fetch, then diff, then write. The stages
+run at the same time, connected by bounded queues, so a slow stage holds back the ones
+before it, rather than letting work pile up in memory. Counts items and busy time for
+each stage, to show where the time goes.
+V0.01, October 18, 2026
+"""
+
+import queue
+import threading
+import time
+
+# Put on a queue to mark the end of a stage's output.
+endOfStage = object()
+
+
+class StageCounter:
+    """
+    Items in and out, and time spent working, for one pipeline stage.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.numIn = 0
+        self.numOut = 0
+        self.busySeconds = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, numIn, numOut, busySeconds):
+        with self.lock:
+            self.numIn += numIn
+            self.numOut += numOut
+            self.busySeconds += busySeconds
+
+    def __str__(self):
+        perSecond = 0
+        if self.busySeconds > 0:
+            perSecond = self.numIn / self.busySeconds
+        return (f"{self.name}: {self.numIn} in, {self.numOut} out, "
+                f"{self.busySeconds:.3f}s busy, {perSecond:.1f} per busy second")
+
+
+class DailyPricePipeline:
+    """
+    Fetch -> diff -> write, for a list of symbols.
+    fetchPrice(symbol) returns a PriceInfo, and runs on numWorkers threads.
+    diffPrice(symbol, priceInfo) returns the item to write, or None if nothing to write,
+    and runs on its own thread. priceInfo is None if fetching it raised an exception.
+    If diffPrice raises, that symbol is skipped, and run reports not everything saved.
+    writeBatch(items) saves a list of up to batchSize items, returning how many it saved.
+    It runs on the thread that called run, so that is the only thread using the database.
+    outOfTime() is checked before each fetch - once it returns True, no more are started.
+    """
+
+    def __init__(self, fetchPrice, diffPrice, writeBatch, outOfTime, numWorkers, batchSize,
+                 queueSize):
+        self.fetchPrice = fetchPrice
+        self.diffPrice = diffPrice
+        self.writeBatch = writeBatch
+        self.outOfTime = outOfTime
+        self.numWorkers = max(1, numWorkers)
+        self.batchSize = batchSize
+        self.queueSize = queueSize
+        self.counters = [StageCounter("fetch"), StageCounter("diff"), StageCounter("write")]
+        self.wallSeconds = 0.0
+        self.numDiffFailed = 0
+        self.stopping = threading.Event()
+
+    def run(self, symbols=None, newPrices=None):
+        """
+        Run the pipeline over given symbols or, if given newPrices, over that list of
+        already fetched (symbol, PriceInfo) pairs, in which case there are no fetch
+        workers, just one thread passing them on.
+        Returns: Number of items saved, and whether every batch saved.
+        """
+        startTime = time.monotonic()
+        fetchedQueue = queue.Queue(maxsize=self.queueSize)
+        diffedQueue = queue.Queue(maxsize=self.queueSize)
+        if newPrices is None:
+            symbolQueue = queue.Queue()
+            for tmpSymbol in symbols:
+                symbolQueue.put(tmpSymbol)
+            threads = [threading.Thread(target=self._fetch, args=(symbolQueue, fetchedQueue),
+                                        daemon=True)
+                       for workerNum in range(self.numWorkers)]
+        else:
+            threads = [threading.Thread(target=self._pass_on, args=(newPrices, fetchedQueue),
+                                        daemon=True)]
+        threads.append(threading.Thread(target=self._diff,
+                                        args=(fetchedQueue, diffedQueue, len(threads)),
+                                        daemon=True))
+
+        for thread in threads:
+            thread.start()
+        try:
+            numSaved, allSaved = self._write(diffedQueue)
+        finally:
+            # Only matters if the writer failed - lets the other stages give up, rather
+            # than wait forever for it to make room on their queues.
+            self.stopping.set()
+            for thread in threads:
+                thread.join()
+        self.wallSeconds = time.monotonic() - startTime
+
+        return numSaved, allSaved and self.numDiffFailed == 0
+
+    def print_counters(self):
+        print(f"Daily price pipeline took {self.wallSeconds:.3f}s.")
+        for counter in self.counters:
+            print(f"    {counter}")
+
+    # Each stage puts endOfStage in a finally, so that, whatever goes wrong, the next
+    # stage isn't left waiting forever.
+
+    def _fetch(self, symbolQueue, fetchedQueue):
+        counter = self.counters[0]
+        try:
+            while not self.stopping.is_set() and not self.outOfTime():
+                try:
+                    tmpSymbol = symbolQueue.get_nowait()
+                except queue.Empty:
+                    break
+                startTime = time.monotonic()
+                try:
+                    newPrice = self.fetchPrice(tmpSymbol)
+                except Exception as E:
+                    print(f"DailyPricePipeline failed to fetch price for {tmpSymbol}, {E=}")
+                    newPrice = None
+                counter.record(1, 1, time.monotonic() - startTime)
+                self._put(fetchedQueue, (tmpSymbol, newPrice))
+        finally:
+            self._put(fetchedQueue, endOfStage)
+
+    def _pass_on(self, newPrices, fetchedQueue):
+        try:
+            for tmpSymbol, newPrice in newPrices:
+                self.counters[0].record(1, 1, 0)
+                self._put(fetchedQueue, (tmpSymbol, newPrice))
+        finally:
+            self._put(fetchedQueue, endOfStage)
+
+    def _diff(self, fetchedQueue, diffedQueue, numFetchers):
+        counter = self.counters[1]
+        numEnded = 0
+        try:
+            while numEnded < numFetchers and not self.stopping.is_set():
+                try:
+                    fetched = fetchedQueue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if fetched is endOfStage:
+                    numEnded += 1
+                    continue
+                startTime = time.monotonic()
+                try:
+                    item = self.diffPrice(*fetched)
+                except Exception as E:
+                    print(f"DailyPricePipeline failed to check price for {fetched[0]}, {E=}")
+                    self.numDiffFailed += 1
+                    item = None
+                counter.record(1, int(item is not None), time.monotonic() - startTime)
+                if item is not None:
+                    self._put(diffedQueue, item)
+        finally:
+            self._put(diffedQueue, endOfStage)
+
+    def _write(self, diffedQueue):
+        counter = self.counters[2]
+        numSaved = 0
+        allSaved = True
+        batch = []
+        item = diffedQueue.get()
+        while item is not endOfStage:
+            batch.append(item)
+            item = diffedQueue.get()
+            if len(batch) >= self.batchSize or (item is endOfStage and len(batch) > 0):
+                startTime = time.monotonic()
+                numBatchSaved = self.writeBatch(batch)
+                counter.record(len(batch), numBatchSaved, time.monotonic() - startTime)
+                numSaved += numBatchSaved
+                allSaved = allSaved and numBatchSaved == len(batch)
+                batch = []
+
+        return numSaved, allSaved
+
+    def _put(self, destQueue, item):
+        """
+        Put item on a bounded queue, waiting for room - unless the pipeline is stopping.
+        """
+        while not self.stopping.is_set():
+            try:
+                destQueue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
@@ -25,11 +25,14 @@ code_display_names = {sprEnums.GroupCodes.buy: "Buy",
 
 
 # @profile
-def send_from_db(resultsTopicName, websiteUrl):
+def send_from_db(resultsTopicName, websiteUrl, timeLeft=None):
     """
     Create and send email summarizing price data from db, after first checking
     that have most recent prices downloaded.
     Usually runs once a day, called by the lambda.
+    If given timeLeft, a function returning seconds left to run in, and the update
+    has to stop before finishing, doesn't send the email. Returns None in that case,
+    so that caller knows to run again, otherwise whether sent an email.
     """
     # h = hpy()
     # print(f"send_from_db hpy 1: {h.heap()}")
@@ -39,19 +42,30 @@ def send_from_db(resultsTopicName, websiteUrl):
     mySecurities = Securities()
     # print(f"send_from_db hpy 2: {h.heap()}")
     # print(f"Initial size of securities: {sys.getsizeof(mySecurities)}")
-    mySecurities.do_daily_updates()
+    mySecurities.do_daily_updates(timeLeft)
+    if not mySecurities.daily_update_finished():
+        print("Daily update ran out of time, so not sending email until it finishes.")
+        return None
     # print(f"send_from_db hpy 3: {h.heap()}")
     # print(f"After update size of securities: {sys.getsizeof(mySecurities)}")
+    sent = send_for_securities(mySecurities, resultsTopicName, websiteUrl)
+    # print(f"send_from_db hpy 5: {h.heap()}")
+    print("finished deaily_email.send_from_db")
+
+    return sent
+
+def send_for_securities(mySecurities, resultsTopicName, websiteUrl):
+    """
+    Create and send email summarizing prices for given, already updated, Securities.
+    Returns whether sent an email.
+    """
+    sent = False
     securitiesList = mySecurities.retrieve_email_info()
-    # print(f"send_from_db hpy 4: {h.heap()}")
-    # print(f"After email size of securities: {sys.getsizeof(mySecurities)}")
     if len(securitiesList) > 0:
         _generate_and_send(securitiesList, resultsTopicName, websiteUrl)
         sent = True
     else:
         print("Didn't find any securities to send an email regarding.")
-    # print(f"send_from_db hpy 5: {h.heap()}")
-    print("finished deaily_email.send_from_db")
 
     return sent
 
@@ -4,40 +4,59 @@ business logic.
 V0.02, November 9, 2022
 """
 
+from contextlib import contextmanager
+from decimal import Decimal
+import os
+import re
+import sqlite3
+import sys
+import time
+
 import boto3
+import numpy as np
 import pymysql
+from pymysql.constants import FIELD_TYPE
 
 import settings
+import sqliteBackend
+from sprEnums import ResultMode
 
 client = boto3.client('rds')
 mysettings = settings.Settings.instance()
 dbConn = None
 connected_status = False
 
-# Connect to RDS.
+# Errors that statements can raise, whichever backend is in use - RDS MySQL or, if
+# settings.db_backend is "sqlite", a local SQLite database (see sqliteBackend.)
+dbErrors = (pymysql.MySQLError, sqlite3.Error)
+
+# Connections that have been released, kept at module level so that they survive
+# between warm invocations of a lambda, along with the most recent IAM auth token.
+idleConnections = []
+cachedToken = None
+tokenExpiry = 0
+
+# Transaction state. While transactionDepth > 0, statements don't commit individually.
+transactionDepth = 0
+transactionFailed = False
+lastTransactionCommitted = False
+
+# Per statement instrumentation, keyed by normalized sql. Only collected when
+# settings.db_instrumentation is on. Cleared by print_query_summary.
+queryStats = {}
+# Running total of statements recorded, never cleared, so callers can count the
+# statements run by a piece of work by comparing before and after.
+statementCount = 0
+
+# Connect to RDS. Takes a connection from the pool, so repeated connect/disconnect
+# cycles only pay for a liveness check.
 def connect():
     global connected_status, dbConn
     if not connected_status:
         try:
-            token = client.generate_db_auth_token(DBHostname=mysettings.rds_endpoint,
-                                                  Port=mysettings.rds_port,
-                                                  DBUsername=mysettings.rds_user_name)
-            print("rds_endpoint: ", mysettings.rds_endpoint)
-            print("rds port: ", mysettings.rds_port)
-            print("rds_user: ", mysettings.rds_user_name)
-            print("db_name: ", mysettings.rds_db_name)
-            # print(f"rds token length: {len(token)}")
-            # print(f"{token=}")
-            ssl = {'ca': 'rds-combined-ca-bundle.pem'}
-            dbConn = pymysql.connect(host=mysettings.rds_endpoint,
-                                     user=mysettings.rds_user_name,
-                                     password=token,
-                                     database=mysettings.rds_db_name,
-                                     connect_timeout=10,
-                                     ssl=ssl)
-            print("Connection succeeded")
+            dbConn = _acquire_connection()
             connected_status = True
-        except pymysql.MySQLError as e:
+        except dbErrors as e:
             connected_status = False
             print("Error (connect), could not connect to MySQL database ", mysettings.rds_db_name)
             print(e)
@@ -46,23 +65,53 @@ def connect():
 
     return connected_status
 
+# Hand out a connection from the pool for the duration of a with block, then return
+# it to the pool. Raises one of dbErrors if unable to connect.
+@contextmanager
+def pooled_connection():
+    conn = _acquire_connection()
+    try:
+        yield conn
+    finally:
+        _release_connection(conn)
+
+# Run the statements in a with block as one transaction - per-statement commits are
+# suspended, and there is a single commit at the end. If any statement fails, or the
+# block raises, everything is rolled back instead. Nested transactions join the
+# outermost one. Afterwards, lastTransactionCommitted says how it ended.
+@contextmanager
+def transaction():
+    global transactionDepth, transactionFailed, lastTransactionCommitted
+    if transactionDepth == 0:
+        transactionFailed = False
+    transactionDepth += 1
+    try:
+        yield
+    except Exception:
+        transactionFailed = True
+        raise
+    finally:
+        # Depth is already 0 if disconnect abandoned the transaction.
+        if transactionDepth > 0:
+            transactionDepth -= 1
+            if transactionDepth == 0:
+                lastTransactionCommitted = _end_transaction(not transactionFailed)
+
 def test_rds_connection():
-    global connected_status, dbConn
     print("rds_endpoint: ", mysettings.rds_endpoint)
     print("rds port: ", mysettings.rds_port)
     print("rds_user: ", mysettings.rds_user_name)
     print("db_name: ", mysettings.rds_db_name)
 
     try:
-        if connect():
-            cur = dbConn.cursor()
+        with pooled_connection() as conn:
+            cur = conn.cursor()
             cur.execute("""Select now()""")
             query_results = cur.fetchall()
             print(query_results)
             print("Connection succeeded")
             cur.close()
-            disconnect()
-    except pymysql.MySQLError as e:
+    except dbErrors as e:
         print("Error, could not connect to MySQL database ", mysettings.rds_db_name)
         print(e)
 
@@ -75,10 +124,14 @@ def create_table(tableCmd):
         cursor = dbConn.cursor()
         try:
             print("Creating table, sql= ", tableCmd)
-            cursor.execute(tableCmd)
+            tableCmds = [tableCmd]
+            if mysettings.db_backend == "sqlite":
+                tableCmds = sqliteBackend.translate_create_table(tableCmd)
+            for cmd in tableCmds:
+                _execute(cursor, cmd)
             print("Successfully created table")
             created = True
-        except pymysql.MySQLError as err:
+        except dbErrors as err:
             print("Error when creating table, ", err)
         cursor.close()
     else:
@@ -95,16 +148,21 @@ def does_table_exist(tableName):
         cursor = dbConn.cursor()
         try:
             print("Checking for table ", tableName)
-            sqlCmd = (
-                "SELECT count(*) FROM information_schema.tables "
-                "WHERE (table_schema = %s) AND (table_name = %s)"
-            )
-            cursor.execute(sqlCmd, (mysettings.rds_db_name, tableName))
+            if mysettings.db_backend == "sqlite":
+                sqlCmd = sqliteBackend.table_exists_sql()
+                queryParams = (tableName,)
+            else:
+                sqlCmd = (
+                    "SELECT count(*) FROM information_schema.tables "
+                    "WHERE (table_schema = %s) AND (table_name = %s)"
+                )
+                queryParams = (mysettings.rds_db_name, tableName)
+            _execute(cursor, sqlCmd, queryParams)
             numTables = cursor.fetchone()[0]
             print("numTables=", numTables)
             if numTables > 0:
                 exists = True
-        except pymysql.MySQLError as err:
+        except dbErrors as err:
             print("Error when checking for table, ", err)
         cursor.close()
     else:
@@ -124,11 +182,11 @@ def delete_table(tableName):
             # Apparently mySql can't escape table names, so have to do myself.
             # Assumes table name doesn't come from external source.
             sqlCmd = "DROP TABLE IF EXISTS %s " % (tableName,)
-            cursor.execute(sqlCmd)
+            _execute(cursor, sqlCmd)
             print("last statement was: ", cursor._last_executed)
             if not does_table_exist(tableName):
                 deleted = True
-        except pymysql.MySQLError as err:
+        except dbErrors as err:
             print("cursor.dict: ", cursor.__dict__)
             print("dir(cursor): ", dir(cursor))
             print("last statement was: ", cursor._last_executed)
@@ -166,18 +224,20 @@ def insert_data(tableName, fieldNames, fieldValues):
             # If inserting empty record, executemany doesn't do anything,
             # because it iterates through provided fieldValues.
             if len(fieldValues) > 0:
-                cursor.executemany(sqlCmd, fieldValues)
+                _execute(cursor, sqlCmd, fieldValues, many=True)
             else:
-                cursor.execute(sqlCmd)
+                _execute(cursor, sqlCmd)
             print("last statement was: ", cursor._last_executed)
-            dbConn.commit()
+            _commit()
             print("Successfully inserted data")
             inserted = True
-        except pymysql.MySQLError as err:
+        except dbErrors as err:
+            _statement_failed()
             print("last statement was: ", cursor._last_executed)
             print("Error when inserting data, ", err)
         cursor.close()
     else:
+        _statement_failed()
         print("Error (insert_data) - not connected to database.")
     print("insert_data for table ", tableName, " resulted in ", inserted)
 
@@ -197,38 +257,95 @@ def insert_data(tableName, fieldNames, fieldValues):
 # Alternatively, seems that can pass parameters for the where clause to the execute
 # command, and those parameters can be datetime.date, which the connector does correctly
 # translate.
-def select_data(tableName, fieldNames, query, queryParams=()):
+# resultMode controls the shape of the returned data - see sprEnums.ResultMode. The
+# tuple and columnar modes avoid creating a dictionary for every row.
+def select_data(tableName, fieldNames, query, queryParams=(), resultMode=ResultMode.dicts):
     global connected_status, dbConn
     returnData = None
+    numRecords = 0
     if connected_status:
         # cursor = dbConn.cursor(buffered=True, dictionary=True)
-        cursor = pymysql.cursors.DictCursor(dbConn)
+        cursor = _new_cursor(resultMode == ResultMode.dicts)
         try:
-            formattedFieldNames = ""
-            for fieldName in fieldNames:
-                formattedFieldNames += fieldName + ", "
-            # Strip trailing ", " from string
-            formattedFieldNames = formattedFieldNames[:-2]
-            sqlCmd = "SELECT %s " % formattedFieldNames
-            sqlCmd += "FROM %s " % (tableName, )
-            sqlCmd += "WHERE %s" % (query,)
+            sqlCmd = _build_select(tableName, fieldNames, query)
             print("trying select, sql= ", sqlCmd)
-            cursor.execute(sqlCmd, queryParams)
+            _execute(cursor, sqlCmd, queryParams)
             print("last statement was: ", cursor._last_executed)
             returnData = cursor.fetchall()
+            numRecords = len(returnData)
             print("returnData: ", returnData)
             # print("type(returnData)= ", type(returnData))
-        except pymysql.MySQLError as err:
+            if resultMode in (ResultMode.columns, ResultMode.arrays):
+                returnData = _to_columns(cursor.description, returnData,
+                                         resultMode == ResultMode.arrays)
+        except dbErrors as err:
+            _statement_failed()
             print("last statement was: ", cursor._last_executed)
             print("Error when selecting data, ", err)
         cursor.close()
     else:
+        _statement_failed()
         print("Error (select_data) - not connected to database.")
     if not (returnData is None):
-        print("select_data is returning ", len(returnData), " records.")
+        print("select_data is returning ", numRecords, " records.")
 
     return returnData
 
+# Generator version of select_data, for result sets too big to hold in memory. Uses an
+# unbuffered (server side) cursor, so rows come from the server as they are consumed
+# rather than all at once. Yields one row at a time or, if chunkSize > 0, lists of up
+# to chunkSize rows. Rows are dictionaries, or tuples if asDict is False.
+# Must be read to the end, or closed, before running any other statement - MySQL
+# won't accept a new query on a connection while an unbuffered result is pending.
+def select_iter(tableName, fieldNames, query, queryParams=(), chunkSize=0, asDict=True):
+    global connected_status, dbConn
+    if not connected_status:
+        _statement_failed()
+        print("Error (select_iter) - not connected to database.")
+        return
+
+    cursor = _new_cursor(asDict, streaming=True)
+    numRows = 0
+    # Only count time spent in the database, not time the caller spends on each row.
+    dbTime = 0
+    sqlCmd = _build_select(tableName, fieldNames, query)
+    try:
+        print("trying select_iter, sql= ", sqlCmd)
+        startTime = time.perf_counter()
+        cursor.execute(sqlCmd, queryParams)
+        dbTime += time.perf_counter() - startTime
+        print("last statement was: ", cursor._last_executed)
+        if chunkSize > 0:
+            startTime = time.perf_counter()
+            rows = cursor.fetchmany(chunkSize)
+            dbTime += time.perf_counter() - startTime
+            while len(rows) > 0:
+                numRows += len(rows)
+                yield rows
+                startTime = time.perf_counter()
+                rows = cursor.fetchmany(chunkSize)
+                dbTime += time.perf_counter() - startTime
+        else:
+            startTime = time.perf_counter()
+            row = cursor.fetchone()
+            dbTime += time.perf_counter() - startTime
+            while row is not None:
+                numRows += 1
+                yield row
+                startTime = time.perf_counter()
+                row = cursor.fetchone()
+                dbTime += time.perf_counter() - startTime
+        print("select_iter returned ", numRows, " records.")
+    except dbErrors as err:
+        _statement_failed()
+        print("last statement was: ", cursor._last_executed)
+        print("Error when selecting data, ", err)
+    finally:
+        # Closing an unbuffered cursor discards any rows that weren't read.
+        cursor.close()
+        if mysettings.db_instrumentation:
+            _record_statement(sqlCmd, dbTime, numRows)
+
 
 # Update one record in a table using provided fields and values.
 def update_data(tableName, fieldNames, fieldValues, query):
@@ -254,21 +371,67 @@ def update_data(tableName, fieldNames, fieldValues, query):
             sqlCmd += "SET " + formattedUpdates
             sqlCmd += " WHERE %s " % (query,)
             print("trying data update, sql= ", sqlCmd)
-            cursor.execute(sqlCmd, fieldValues)
+            _execute(cursor, sqlCmd, fieldValues)
             numUpdated = cursor.rowcount
             print("last statement was: ", cursor._last_executed)
-            dbConn.commit()
+            _commit()
             print("Successfully updated data")
-        except pymysql.MySQLError as err:
+        except dbErrors as err:
+            _statement_failed()
             print("last statement was: ", cursor._last_executed)
             print("Error when updating data, ", err)
         cursor.close()
     else:
+        _statement_failed()
         print("Error (update_data) - not connected to database.")
     print("update_data for table ", tableName, " affected ", numUpdated, " records.")
 
     return numUpdated
 
+# Insert or update many records with one statement. Each row contains values for
+# keyFields followed by values for fieldNames. Rows whose keys already exist have
+# fieldNames updated, the rest are inserted, so every NOT NULL column without a default
+# must be in keyFields or fieldNames. PyMySQL's executemany turns this into a single
+# multi-row INSERT ... ON DUPLICATE KEY UPDATE, so it costs one round trip and one commit.
+# Returns number of affected rows, as reported by MySQL (1 per insert, 2 per changed
+# update, 0 per unchanged update), or -1 if failed.
+def upsert_many(tableName, keyFields, fieldNames, rows):
+    global connected_status, dbConn
+    numAffected = -1
+    if connected_status:
+        cursor = dbConn.cursor()
+        try:
+            allFields = list(keyFields) + list(fieldNames)
+            formattedFieldNames = ", ".join(allFields)
+            fieldPlaceholders = ", ".join(["%s"] * len(allFields))
+            formattedUpdates = ", ".join([f"{fieldName} = VALUES({fieldName})"
+                                          for fieldName in fieldNames])
+
+            sqlCmd = "INSERT INTO %s " % (tableName,)
+            sqlCmd += "(%s) " % formattedFieldNames
+            sqlCmd += "VALUES (" + fieldPlaceholders + ") "
+            sqlCmd += "ON DUPLICATE KEY UPDATE " + formattedUpdates
+            print("trying upsert_many, sql= ", sqlCmd)
+            if len(rows) > 0:
+                _execute(cursor, sqlCmd, rows, many=True)
+                numAffected = cursor.rowcount
+                print("last statement was: ", cursor._last_executed)
+                _commit()
+            else:
+                numAffected = 0
+            print("Successfully upserted data")
+        except dbErrors as err:
+            _statement_failed()
+            print("last statement was: ", cursor._last_executed)
+            print("Error when upserting data, ", err)
+        cursor.close()
+    else:
+        _statement_failed()
+        print("Error (upsert_many) - not connected to database.")
+    print("upsert_many for table ", tableName, " affected ", numAffected, " records.")
+
+    return numAffected
+
 # Delete requested data from specified table.
 # Query should be of the form "field=`value`", with additional clauses connected by
 # and or or.
@@ -283,16 +446,18 @@ def delete_data(tableName, query, queryParams=()):
             # Assumes table name doesn't come from external source.
             sqlCmd = "DELETE FROM %s " % (tableName,)
             sqlCmd += "WHERE %s " % (query,)
-            cursor.execute(sqlCmd, queryParams)
+            _execute(cursor, sqlCmd, queryParams)
             numDeleted = cursor.rowcount
             print("rowcount=", numDeleted)
             print("last statement was: ", cursor._last_executed)
-            dbConn.commit()
-        except pymysql.MySQLError as err:
+            _commit()
+        except dbErrors as err:
+            _statement_failed()
             print("last statement was: ", cursor._last_executed)
             print("Error when deleting data, ", err)
         cursor.close()
     else:
+        _statement_failed()
         print("Error (delete_data) - not connected to database.")
     print("delete_data for ", tableName, " removed ", numDeleted, " records.")
 
@@ -307,16 +472,18 @@ def execute_update_data(query, queryParams=()):
         cursor = dbConn.cursor()
         try:
             print("trying execute_update_data, sql= ", query)
-            cursor.execute(query, queryParams)
+            _execute(cursor, query, queryParams)
             numUpdated = cursor.rowcount
             print("last statement was: ", cursor._last_executed)
-            dbConn.commit()
+            _commit()
             print("Successfully updated data")
-        except pymysql.MySQLError as err:
+        except dbErrors as err:
+            _statement_failed()
             print("last statement was: ", cursor._last_executed)
             print("Error when running execute_update_data, ", err)
         cursor.close()
     else:
+        _statement_failed()
         print("Error (execute_update_data) - not connected to database.")
     print("execute_update_data affected ", numUpdated, " records.")
 
@@ -328,15 +495,288 @@ def execute_command(cmd):
     if connected_status:
         cursor = dbConn.cursor()
         try:
-            cursor.execute(cmd)
-        except pymysql.MySQLError as err:
+            _execute(cursor, cmd)
+        except dbErrors as err:
             print("Last statement was: ", cursor._last_executed)
             print("Error when running execute_command, ", err)
 
-# Disconnect from RDS.
+# Disconnect from RDS. The connection goes back to the pool rather than being closed.
+# If inside a transaction, it is rolled back, and reported as an error, as there is no
+# longer a connection to commit it on.
 def disconnect():
     global connected_status, dbConn
     if connected_status:
-        dbConn.close()
+        if transactionDepth > 0:
+            _abandon_transaction()
+        _release_connection(dbConn)
+        dbConn = None
         connected_status = False
-        print("Closed db connection.")
+        print("Released db connection.")
+
+# Build select statement from table, list of fields and where clause.
+def _build_select(tableName, fieldNames, query):
+    sqlCmd = "SELECT %s " % ", ".join(fieldNames)
+    sqlCmd += "FROM %s " % (tableName, )
+    sqlCmd += "WHERE %s" % (query,)
+
+    return sqlCmd
+
+# New cursor on the current connection, returning rows as dictionaries or tuples.
+# Streaming cursors are unbuffered - rows stay on the server until they are fetched.
+def _new_cursor(asDict, streaming=False):
+    if mysettings.db_backend == "sqlite":
+        return sqliteBackend.new_cursor(dbConn, asDict)
+    if streaming and asDict:
+        return pymysql.cursors.SSDictCursor(dbConn)
+    if streaming:
+        return pymysql.cursors.SSCursor(dbConn)
+    if asDict:
+        return pymysql.cursors.DictCursor(dbConn)
+    return dbConn.cursor()
+
+# Run a statement on given cursor. If instrumentation is on, records how long it took
+# and how many rows it returned or affected. Errors are left for the caller to handle.
+def _execute(cursor, sqlCmd, queryParams=None, many=False):
+    startTime = time.perf_counter()
+    try:
+        if many:
+            cursor.executemany(sqlCmd, queryParams)
+        else:
+            cursor.execute(sqlCmd, queryParams)
+    finally:
+        if mysettings.db_instrumentation:
+            _record_statement(sqlCmd, time.perf_counter() - startTime, cursor.rowcount)
+
+# Add one statement's timing to queryStats, and log it if it was slow.
+def _record_statement(sqlCmd, duration, numRows):
+    global statementCount
+    statementCount += 1
+    normalSql = _normalize_sql(sqlCmd)
+    caller = _get_caller()
+    stats = queryStats.get(normalSql)
+    if stats is None:
+        stats = {"durations": [], "rows": 0, "callers": {}}
+        queryStats[normalSql] = stats
+    stats["durations"].append(duration)
+    if numRows is not None and numRows > 0:
+        stats["rows"] += numRows
+    stats["callers"][caller] = stats["callers"].get(caller, 0) + 1
+    if duration >= mysettings.db_slow_query_seconds:
+        print(f"Slow query ({duration:.3f}s, {numRows} rows) from {caller}: {normalSql}")
+
+# Reduce sql to its shape, so that statements that differ only in literal values are
+# counted together - literals and placeholders become ?, lists of them become (?, ...).
+def _normalize_sql(sqlCmd):
+    normalSql = " ".join(sqlCmd.split())
+    normalSql = re.sub(r"'(?:[^'\\]|\\.|'')*'", "?", normalSql)
+    normalSql = re.sub(r"\b\d+(\.\d+)?\b", "?", normalSql)
+    normalSql = normalSql.replace("%s", "?")
+    normalSql = re.sub(r"\(\s*\?(\s*,\s*\?)+\s*\)", "(?, ...)", normalSql)
+
+    return normalSql
+
+# Find first function outside this module in the call stack, as file:function:line.
+def _get_caller():
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == __file__:
+        frame = frame.f_back
+    caller = "unknown"
+    if frame is not None:
+        fileName = os.path.basename(frame.f_code.co_filename)
+        caller = f"{fileName}:{frame.f_code.co_name}:{frame.f_lineno}"
+
+    return caller
+
+# Summarize queryStats - one dictionary per normalized statement, with count, total,
+# p50 and p95 durations in seconds, rows returned/affected and the callers that ran
+# it, slowest total first.
+def get_query_summary():
+    summary = []
+    for normalSql, stats in queryStats.items():
+        durations = sorted(stats["durations"])
+        summary.append({"sql": normalSql,
+                        "count": len(durations),
+                        "total": sum(durations),
+                        "p50": _percentile(durations, 50),
+                        "p95": _percentile(durations, 95),
+                        "rows": stats["rows"],
+                        "callers": dict(stats["callers"])})
+    summary.sort(key=lambda x: x["total"], reverse=True)
+
+    return summary
+
+# Print the per statement summary, then clear it, so each invocation of a warm lambda
+# reports only its own statements. Statements run many times from the same caller
+# are usually an N+1 pattern - a query inside a loop.
+def print_query_summary():
+    global queryStats
+    if mysettings.db_instrumentation:
+        summary = get_query_summary()
+        totalCount = sum(x["count"] for x in summary)
+        totalTime = sum(x["total"] for x in summary)
+        print(f"Query summary: {totalCount} statements, {len(summary)} distinct, "
+              f"{totalTime:.3f}s total.")
+        for item in summary:
+            callers = ", ".join(f"{caller} x{count}" for caller, count in item["callers"].items())
+            print(f"  {item['count']} x {item['sql']}: total={item['total']:.3f}s, "
+                  f"p50={item['p50']:.3f}s, p95={item['p95']:.3f}s, rows={item['rows']}, "
+                  f"from {callers}")
+    queryStats = {}
+
+# Nearest rank percentile of an already sorted list.
+def _percentile(sortedVals, pct):
+    value = 0
+    if len(sortedVals) > 0:
+        rank = max(1, -(-len(sortedVals) * pct // 100))
+        value = sortedVals[int(rank) - 1]
+
+    return value
+
+# Convert list of row tuples to dictionary of column name: list of values for that
+# column. If asArrays, DECIMAL and floating point columns are converted to float64
+# NumPy arrays in one step, with NULL becoming nan. Other columns are left as lists.
+# SQLite doesn't report column types, so there it goes by the values instead.
+def _to_columns(description, rows, asArrays):
+    floatTypes = (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE)
+    columns = {}
+    for colNum, colDesc in enumerate(description):
+        values = [row[colNum] for row in rows]
+        if colDesc[1] is None:
+            isFloat = any(isinstance(val, (Decimal, float)) for val in values)
+        else:
+            isFloat = colDesc[1] in floatTypes
+        if asArrays and isFloat:
+            values = np.array(values, dtype=np.float64)
+        columns[colDesc[0]] = values
+
+    return columns
+
+# Commit, unless inside a transaction, in which case the commit happens when it ends.
+def _commit():
+    if transactionDepth == 0:
+        dbConn.commit()
+
+# Flag the current transaction, if any, to be rolled back when it ends.
+def _statement_failed():
+    global transactionFailed
+    if transactionDepth > 0:
+        transactionFailed = True
+
+# Commit or roll back the outermost transaction. Returns True if committed.
+def _end_transaction(doCommit):
+    committed = False
+    if connected_status:
+        try:
+            if doCommit:
+                dbConn.commit()
+                committed = True
+                print("Committed transaction.")
+            else:
+                dbConn.rollback()
+                print("Error in transaction, rolled back.")
+        except dbErrors as err:
+            print("Error when ending transaction, ", err)
+    else:
+        print("Error (transaction) - not connected to database.")
+
+    return committed
+
+# Forget the current transaction, without committing it - its connection is about to be
+# released, which rolls it back. Any enclosing transaction() blocks end without
+# committing or rolling back.
+def _abandon_transaction():
+    global transactionDepth, transactionFailed, lastTransactionCommitted
+    print("Error (disconnect): disconnected inside a transaction, rolling it back.")
+    transactionDepth = 0
+    transactionFailed = False
+    lastTransactionCommitted = False
+
+# Close every idle connection in the pool and forget the cached auth token. With an
+# in memory SQLite database, this also discards the database.
+def close_pool():
+    global cachedToken, tokenExpiry
+    while len(idleConnections) > 0:
+        _close_quietly(idleConnections.pop())
+    sqliteBackend.close_memory_database()
+    cachedToken = None
+    tokenExpiry = 0
+    print("Closed all pooled db connections.")
+
+# Return an IAM auth token, reusing the cached one until it is close to expiring.
+# Tokens are only checked when a connection is opened, so an open connection
+# remains usable after its token expires.
+def _get_auth_token():
+    global cachedToken, tokenExpiry
+    now = time.time()
+    if cachedToken is None or now >= tokenExpiry - mysettings.rds_token_refresh_margin:
+        cachedToken = client.generate_db_auth_token(DBHostname=mysettings.rds_endpoint,
+                                                    Port=mysettings.rds_port,
+                                                    DBUsername=mysettings.rds_user_name)
+        tokenExpiry = now + mysettings.rds_token_lifetime
+        print("Generated new rds auth token.")
+
+    return cachedToken
+
+# Open a brand new TLS connection to RDS, or a connection to the SQLite database.
+def _open_connection():
+    if mysettings.db_backend == "sqlite":
+        print("sqlite database: ", mysettings.sqlite_path)
+        return sqliteBackend.open_connection(mysettings.sqlite_path)
+
+    print("rds_endpoint: ", mysettings.rds_endpoint)
+    print("rds port: ", mysettings.rds_port)
+    print("rds_user: ", mysettings.rds_user_name)
+    print("db_name: ", mysettings.rds_db_name)
+    ssl = {'ca': 'rds-combined-ca-bundle.pem'}
+    conn = pymysql.connect(host=mysettings.rds_endpoint,
+                           user=mysettings.rds_user_name,
+                           password=_get_auth_token(),
+                           database=mysettings.rds_db_name,
+                           connect_timeout=10,
+                           ssl=ssl)
+    print("Connection succeeded")
+
+    return conn
+
+# Take a live connection from the pool, discarding any that have gone stale (i.e.
+# server timed them out while the lambda was frozen.) Opens a new one if none left.
+def _acquire_connection():
+    while len(idleConnections) > 0:
+        conn = idleConnections.pop()
+        if _is_alive(conn):
+            print("Reusing pooled db connection.")
+            return conn
+        _close_quietly(conn)
+
+    return _open_connection()
+
+# Put connection back in the pool, or close it if the pool is full.
+# Rolls back first, so that the next user doesn't inherit an open transaction,
+# or the stale snapshot that comes with one.
+def _release_connection(conn):
+    if conn is None:
+        return
+    try:
+        conn.rollback()
+        if len(idleConnections) < mysettings.rds_pool_size:
+            idleConnections.append(conn)
+        else:
+            _close_quietly(conn)
+    except dbErrors + (OSError,) as err:
+        print("Discarding db connection that failed on release, ", err)
+        _close_quietly(conn)
+
+# Liveness check for a pooled connection.
+def _is_alive(conn):
+    try:
+        conn.ping(reconnect=False)
+        return True
+    except dbErrors + (OSError,) as err:
+        print("Pooled db connection is no longer alive, ", err)
+        return False
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except dbErrors + (OSError,):
+        pass
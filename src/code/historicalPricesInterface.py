@@ -4,10 +4,14 @@ business logic. Should not communicate directly with mySql.
 V0.01, November 24, 2022
 """
 
+from collections import defaultdict
 from datetime import date, timedelta
 
+import numpy as np
+
 import dbAccess
 import settings
+from sprEnums import ResultMode
 
 
 class HistoricalPricesInterface:
@@ -26,6 +30,30 @@ class HistoricalPricesInterface:
                                             [(priceDate, securityPrice), ],
                                             self.dailyPricesTable)
 
+    def save_daily_prices(self, priceRows):
+        """
+        Add (securityId, priceDate, price) rows to daily price table with one multi-row
+        insert, first deleting any existing prices for the same securities and dates, so
+        that saving the same rows again, i.e. on a rerun, doesn't duplicate them.
+        Returns True if saved.
+        """
+        if len(priceRows) == 0:
+            return True
+
+        idsByDate = defaultdict(list)
+        for securityId, priceDate, price in priceRows:
+            idsByDate[priceDate].append(securityId)
+        for priceDate, securityIds in idsByDate.items():
+            placeholders = ", ".join(["%s"] * len(securityIds))
+            query = f"priceDate = %s AND securityId IN ({placeholders})"
+            dbAccess.delete_data(self.dailyPricesTable, query, [priceDate] + securityIds)
+
+        fieldNames = ["securityId", "priceDate", "price"]
+        savedOk = dbAccess.insert_data(self.dailyPricesTable, fieldNames, priceRows)
+        print(f"save_daily_prices for {len(priceRows)} prices gave a result of {savedOk}")
+
+        return savedOk
+
     def save_weekly_price_for_security(self, securityId, priceDate):
         """
         I am defining the weekly price as the closing price on Friday, even if Friday
@@ -41,6 +69,31 @@ class HistoricalPricesInterface:
 
         return dbAccess.execute_update_data(query, params)
 
+    def save_weekly_prices_for_all(self, priceDate):
+        """
+        Set based version of save_weekly_price_for_security - copies every security's
+        closing price for the week ending on priceDate from the daily price table to the
+        weekly price table, with a single INSERT ... SELECT. If a security has no daily
+        price for priceDate itself (i.e. Friday was a holiday), uses its latest daily
+        price earlier in that week. Securities with no daily price that week, or that
+        already have a weekly price for priceDate, are skipped, so safe to rerun.
+        Returns number of weekly prices added.
+        """
+        weekStart = priceDate - timedelta(days=6)
+        params = (priceDate, weekStart, priceDate, weekStart, priceDate, priceDate)
+        query = f"INSERT INTO {self.weeklyPricesTable} "
+        query += "(securityId, priceDate, price) "
+        query += f"SELECT daily.securityId, %s, daily.price FROM {self.dailyPricesTable} daily "
+        query += "WHERE daily.priceDate BETWEEN %s AND %s "
+        query += "AND daily.priceDate = "
+        query += f"(SELECT MAX(latest.priceDate) FROM {self.dailyPricesTable} latest "
+        query += "WHERE latest.securityId = daily.securityId "
+        query += "AND latest.priceDate BETWEEN %s AND %s) "
+        query += f"AND NOT EXISTS (SELECT 1 FROM {self.weeklyPricesTable} weekly "
+        query += "WHERE weekly.securityId = daily.securityId AND weekly.priceDate = %s)"
+
+        return dbAccess.execute_update_data(query, params)
+
     def save_daily_historical_prices(self, securityId, datePricePairs):
         """
         Add record to daily price table for each date/price pair.
@@ -53,6 +106,27 @@ class HistoricalPricesInterface:
         """
         return self._save_historical_prices(securityId, datePricePairs, self.weeklyPricesTable)
 
+    def save_full_histories(self, histories):
+        """
+        Save full daily and weekly price histories for several securities, with one
+        insert per table. Histories is a list of (securityId, dailyPairs, weeklyPairs)
+        tuples. Returns True if both inserts succeeded.
+        """
+        fieldNames = ["securityId", "priceDate", "price"]
+        dailyRows = []
+        weeklyRows = []
+        for securityId, dailyPairs, weeklyPairs in histories:
+            dailyRows.extend((securityId, priceDate, price) for priceDate, price in dailyPairs)
+            weeklyRows.extend((securityId, priceDate, price) for priceDate, price in weeklyPairs)
+
+        savedOk = False
+        if len(dailyRows) > 0 and len(weeklyRows) > 0:
+            savedOk = dbAccess.insert_data(self.dailyPricesTable, fieldNames, dailyRows) and \
+                      dbAccess.insert_data(self.weeklyPricesTable, fieldNames, weeklyRows)
+        print(f"save_full_histories for {len(histories)} securities gave a result of {savedOk}")
+
+        return savedOk
+
     def get_historical_prices(self, securityId, tableName, maxAge):
         """
         Retrieve prices for requested security, for requested window of time.
@@ -64,6 +138,58 @@ class HistoricalPricesInterface:
 
         return records
 
+    def get_historical_price_columns(self, securityId, tableName, maxAge):
+        """
+        Columnar version of get_historical_prices - returns dictionary with list of
+        dates under "priceDate" and float64 array of prices under "price", oldest first.
+        """
+        dateThresh = date.today() - timedelta(days=maxAge)
+        fields = ["priceDate", "price"]
+        query = "securityId = %s AND priceDate >= %s ORDER BY priceDate"
+        columns = dbAccess.select_data(tableName, fields, query, [securityId, dateThresh],
+                                       ResultMode.arrays)
+
+        return columns
+
+    def get_historical_prices_for_all(self, tableName, maxAge):
+        """
+        Retrieve prices for every security, for requested window of time, with one
+        query. Returns dictionary of securityId: columns, in same format as
+        get_historical_price_columns. Securities with no prices in the window get
+        empty columns.
+        """
+        dateThresh = date.today() - timedelta(days=maxAge)
+        fields = ["securityId", "priceDate", "price"]
+        query = "priceDate >= %s ORDER BY securityId, priceDate"
+        columns = dbAccess.select_data(tableName, fields, query, [dateThresh],
+                                       ResultMode.arrays)
+
+        pricesById = defaultdict(_empty_price_columns)
+        if columns is not None:
+            # Rows are sorted by security, so each security's prices are one slice.
+            securityIds = columns["securityId"]
+            start = 0
+            for rowNum in range(1, len(securityIds) + 1):
+                if rowNum == len(securityIds) or securityIds[rowNum] != securityIds[start]:
+                    pricesById[securityIds[start]] = {
+                        "priceDate": columns["priceDate"][start:rowNum],
+                        "price": columns["price"][start:rowNum]}
+                    start = rowNum
+
+        return pricesById
+
+    def iter_historical_prices(self, securityId, tableName, maxAge, chunkSize=0):
+        """
+        Streaming version of get_historical_prices - yields date/price dictionaries,
+        oldest first, or lists of up to chunkSize of them, without reading the whole
+        window into memory first.
+        """
+        dateThresh = date.today() - timedelta(days=maxAge)
+        fields = ["priceDate", "price"]
+        query = "securityId = %s AND priceDate >= %s ORDER BY priceDate"
+        return dbAccess.select_iter(tableName, fields, query, [securityId, dateThresh],
+                                    chunkSize=chunkSize)
+
     def remove_old_prices(self, tableName, dateThreshold):
         """
         Remove prices older or equal to given threshold.
@@ -111,3 +237,7 @@ class HistoricalPricesInterface:
             print("_save_historical_prices had no data to save.")
 
         return savedOk
+
+
+def _empty_price_columns():
+    return {"priceDate": [], "price": np.array([], dtype=np.float64)}
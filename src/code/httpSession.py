@@ -0,0 +1,169 @@
+"""
+Shared HTTP session for calls to price providers. Keeps connections open between
+requests, so that each symbol doesn't pay for its own DNS lookup, TCP connection and TLS
+handshake, and counts how often connections are reused. Every request waits for the
+provider's rate limiter. Failed requests are retried with backoff by call_with_retries,
+rather than inside the session, so that every retry is throttled and counted by the
+provider's circuit breaker like any other request.
+V0.01, October 18, 2026
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+import circuitBreaker
+import rateLimiter
+
+# Created from settings on first use, shared by every thread.
+session = None
+sessionLock = threading.Lock()
+
+
+class SessionStats:
+    """
+    Requests made, and new connections opened for them - the rest reused a connection.
+    """
+
+    def __init__(self):
+        self.numRequests = 0
+        self.numNewConnections = 0
+        self.lock = threading.Lock()
+
+    def add_request(self, response, *args, **kwargs):
+        with self.lock:
+            self.numRequests += 1
+
+    def add_connection(self):
+        with self.lock:
+            self.numNewConnections += 1
+
+    def get_num_reused(self):
+        return max(0, self.numRequests - self.numNewConnections)
+
+
+stats = SessionStats()
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        stats.add_connection()
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        stats.add_connection()
+        return super()._new_conn()
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Adapter whose connection pools count the connections they open.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPConnectionPool,
+                                                   "https": CountingHTTPSConnectionPool}
+
+
+def get_session(mysettings):
+    """
+    Return the session shared by everything calling price providers. Up to
+    http_pool_size connections are kept open to each host. Doesn't retry - see
+    call_with_retries.
+    """
+    global session
+    with sessionLock:
+        if session is None:
+            adapter = PooledAdapter(pool_connections=mysettings.http_pool_size,
+                                    pool_maxsize=mysettings.http_pool_size)
+            newSession = requests.Session()
+            newSession.mount("http://", adapter)
+            newSession.mount("https://", adapter)
+            newSession.hooks["response"].append(stats.add_request)
+            session = newSession
+
+    return session
+
+
+def get(provider, mysettings, url, **kwargs):
+    """
+    GET url through the shared session, as session.get, if provider's circuit breaker
+    allows it, once provider's rate limiter does, recording with the breaker whether
+    the provider answered. Checks the breaker first, so that refused calls don't wait
+    for, or use up, the rate limit. Connection
+    errors, and statuses in circuitBreaker.failureStatuses, count as failures - anything
+    else, such as a 404 for a bad symbol, doesn't. Failure statuses raise
+    requests.exceptions.HTTPError, so that call_with_retries retries them.
+    Raises circuitBreaker.CircuitOpenError if the breaker is open.
+    """
+    breaker = circuitBreaker.get_breaker(provider, mysettings)
+    breaker.reject_if_open()
+    rateLimiter.get_limiter(provider, mysettings).wait()
+    if not breaker.allow_request():
+        raise circuitBreaker.CircuitOpenError(f"{provider} circuit breaker is open.")
+    try:
+        response = get_session(mysettings).get(url, **kwargs)
+    except requests.exceptions.RequestException:
+        breaker.record(False)
+        raise
+    failed = response.status_code in circuitBreaker.failureStatuses
+    breaker.record(not failed)
+    if failed:
+        response.raise_for_status()
+
+    return response
+
+
+def call_with_retries(provider, mysettings, fetch):
+    """
+    Call fetch, which makes its requests to provider with get, and return what it
+    returns. Retries fetch up to http_retries times, after a jittered backoff, if it
+    raises an error worth retrying - otherwise lets it through. Raises CircuitOpenError,
+    without calling fetch, once provider's circuit breaker is open.
+    """
+    breaker = circuitBreaker.get_breaker(provider, mysettings)
+    for retryNum in range(0, mysettings.http_retries + 1):
+        if retryNum > 0:
+            time.sleep(circuitBreaker.get_backoff_delay(retryNum, mysettings.http_retry_backoff))
+        breaker.reject_if_open()
+        try:
+            return fetch()
+        except requests.exceptions.RequestException as E:
+            if retryNum == mysettings.http_retries or not is_retryable(E):
+                raise
+            print(f"Retrying {provider} request, {E=}")
+
+
+def is_retryable(E):
+    """
+    Is requests exception worth retrying - a connection error, timeout or response
+    meaning try again later, rather than a bad request?
+    """
+    if isinstance(E, requests.exceptions.HTTPError):
+        return E.response is not None and E.response.status_code in circuitBreaker.failureStatuses
+
+    return isinstance(E, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def close_session():
+    """
+    Close the shared session and its connections, and reset stats. Next get_session
+    starts a new one.
+    """
+    global session, stats
+    with sessionLock:
+        if session is not None:
+            session.close()
+            session = None
+        stats = SessionStats()
+
+
+def print_stats():
+    print(f"HTTP session: {stats.numRequests} requests, {stats.numNewConnections} new "
+          f"connections, {stats.get_num_reused()} reused.")
@@ -4,6 +4,7 @@ store results in S3. Also removes old files after configured interval.
 """
 
 from datetime import datetime
+import json
 import os
 import sys
 
@@ -22,14 +23,23 @@ myResultsFile = resultsFile.ResultsFile(mysettings.bucketName, mysettings.result
 
 def lambda_handler(event, context):
     """
-    Standard handler for AWS Lambda.
+    Standard handler for AWS Lambda. If the daily update has to stop before the
+    lambda times out, invokes the lambda again to finish it.
     """
     print("Starting Lambda")
     print('## ENVIRONMENT VARIABLES\r' + str(dict(**os.environ)))
     print('python version=', sys.version)
     print("cwd=", os.getcwd())
 
-    daily_email.send_from_db(mysettings.resultsTopicName, mysettings.websiteUrl)
+    def time_left():
+        return context.get_remaining_time_in_millis() / 1000
+
+    timeLeft = None
+    if hasattr(context, "get_remaining_time_in_millis"):
+        timeLeft = time_left
+    sent = daily_email.send_from_db(mysettings.resultsTopicName, mysettings.websiteUrl, timeLeft)
+    if sent is None:
+        _resume_later(event, context)
 
     # Remove old files
     myManager = FileManagement()
@@ -40,5 +50,24 @@ def lambda_handler(event, context):
     print("Finished Lambda")
 
 
+def _resume_later(event, context):
+    """
+    Daily update stopped before the lambda timed out - invoke this function again,
+    asynchronously, to carry on from where it stopped. Counts resumes in the event,
+    so that a run that never finishes can't keep invoking itself.
+    """
+    resumeCount = 0
+    if isinstance(event, dict):
+        resumeCount = event.get("resumeCount", 0)
+    if resumeCount >= mysettings.lambda_max_resumes:
+        print(f"Daily update still not finished after {resumeCount} resumes, giving up.")
+        return
+
+    print(f"Invoking {context.function_name} to resume daily update, resume {resumeCount + 1}.")
+    client.invoke(FunctionName=context.function_name,
+                  InvocationType="Event",
+                  Payload=json.dumps({"resumeCount": resumeCount + 1}))
+
+
 if __name__ == '__main__':
     lambda_handler("", "")
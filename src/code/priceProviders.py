@@ -0,0 +1,299 @@
+"""
+Price providers - the sources Securities gets prices from, behind one interface, so
+that a different source can be swapped in from settings. Each provider says what it
+can do with capability flags, and has batch versions of its methods, which work for
+every provider, but are only faster for those that support them.
+Includes a replay provider, which serves recorded responses, each after the time the
+original took, for repeatable performance tests without hitting a real provider.
+V0.01, October 18, 2026
+"""
+
+from abc import ABC, abstractmethod
+import asyncio
+from datetime import date
+import json
+import os
+import threading
+import time
+
+import alphaInterface
+import security
+import yahooInterface
+
+# One provider per name, created from its factory on first use.
+instances = {}
+instancesLock = threading.Lock()
+
+
+class BasePriceProvider(ABC):
+    """
+    Interface every price provider implements. retrieve_daily_data returns a PriceInfo,
+    with currentPrice of 0 if it failed. retrieve_historical_prices returns a list of
+    date/price pairs, empty if it failed. Neither raises for a bad symbol or a failed
+    request. Must be safe to call from several threads at once.
+    Capability flags:
+        supportsHistory - retrieve_historical_prices returns prices.
+        supportsBatchQuotes - retrieve_daily_data_many gets many prices per request.
+        supportsAsync - retrieve_daily_data_many_async overlaps requests on one thread.
+    requestsPerQuote is how many rate limited requests retrieve_daily_data makes.
+    """
+    name = ""
+    supportsHistory = True
+    supportsBatchQuotes = False
+    supportsAsync = False
+    requestsPerQuote = 1
+
+    @abstractmethod
+    def retrieve_daily_data(self, symbol, mysettings):
+        pass
+
+    @abstractmethod
+    def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+        pass
+
+    def retrieve_daily_data_many(self, symbols, mysettings):
+        """
+        Current prices for all given symbols. Returns list of (symbol, PriceInfo)
+        pairs, in the same order as symbols. Unless overridden, one symbol at a time.
+        """
+        return [(symbol, self.retrieve_daily_data(symbol, mysettings)) for symbol in symbols]
+
+    async def retrieve_daily_data_many_async(self, symbols, mysettings):
+        """
+        Same as retrieve_daily_data_many, but a coroutine. Unless overridden, runs
+        retrieve_daily_data_many on another thread, so doesn't overlap requests.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.retrieve_daily_data_many, symbols,
+                                          mysettings)
+
+
+class YahooProvider(BasePriceProvider):
+    """
+    Yahoo Finance, through yahooInterface. Each quote is two requests - the quote page
+    and the chart.
+    """
+    name = "yahoo"
+    supportsBatchQuotes = True
+    supportsAsync = True
+    requestsPerQuote = 2
+
+    def retrieve_daily_data(self, symbol, mysettings):
+        return yahooInterface.retrieve_daily_data(symbol, mysettings)
+
+    def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+        return yahooInterface.retrieve_historical_prices(symbol, oldestDate, newestDate,
+                                                         priceFrequency)
+
+    def retrieve_daily_data_many(self, symbols, mysettings):
+        return yahooInterface.retrieve_daily_data_many(symbols, mysettings)
+
+    async def retrieve_daily_data_many_async(self, symbols, mysettings):
+        return await yahooInterface.retrieve_daily_data_many_async(symbols, mysettings)
+
+
+class AlphavestProvider(BasePriceProvider):
+    """
+    alphavantage.co, through alphaInterface. Current price only - no 52 week range
+    or history.
+    """
+    name = "alphavest"
+    supportsHistory = False
+
+    def retrieve_daily_data(self, symbol, mysettings):
+        return alphaInterface.retrieve_daily_data(symbol, mysettings)
+
+    def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+        return []
+
+
+class ReplayProvider(BasePriceProvider):
+    """
+    Serves responses recorded by RecordingProvider, from a json file, waiting the
+    time each original response took, times latencyScale. A symbol that wasn't
+    recorded fails, the way a bad symbol would, after the median recorded latency.
+    Histories are filtered to the date range asked for, so a recording covering the
+    longest range serves every shorter one.
+    Batch quotes wait once per batch of yahoo_quote_batch_size, for the slowest
+    response in it, and async requests overlap, up to async_fetch_limit at once.
+    """
+    name = "replay"
+    supportsBatchQuotes = True
+    supportsAsync = True
+
+    def __init__(self, recording, latencyScale=1.0):
+        self.quotes = recording["quotes"]
+        self.histories = recording["histories"]
+        self.latencyScale = latencyScale
+        latencies = sorted(entry["latency"] for entry in
+                           list(self.quotes.values()) + list(self.histories.values()))
+        self.medianLatency = latencies[len(latencies) // 2] if len(latencies) > 0 else 0.0
+
+    @classmethod
+    def from_file(cls, fileName, latencyScale=1.0):
+        with open(fileName, "r") as f:
+            return cls(json.load(f), latencyScale)
+
+    def retrieve_daily_data(self, symbol, mysettings):
+        time.sleep(self._get_latency(self.quotes.get(symbol)))
+        return self._get_price_info(symbol)
+
+    def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+        entry = self.histories.get(f"{symbol}|{priceFrequency}")
+        time.sleep(self._get_latency(entry))
+        if entry is None:
+            return []
+        oldestDate, newestDate = _to_date(oldestDate), _to_date(newestDate)
+
+        return [(priceDate, price) for priceDate, price in
+                ((date.fromisoformat(priceDate), price) for priceDate, price in entry["prices"])
+                if oldestDate <= priceDate <= newestDate]
+
+    def retrieve_daily_data_many(self, symbols, mysettings):
+        batchSize = mysettings.yahoo_quote_batch_size
+        prices = []
+        for start in range(0, len(symbols), batchSize):
+            batch = symbols[start:start + batchSize]
+            time.sleep(max(self._get_latency(self.quotes.get(symbol)) for symbol in batch))
+            prices += [(symbol, self._get_price_info(symbol)) for symbol in batch]
+
+        return prices
+
+    async def retrieve_daily_data_many_async(self, symbols, mysettings):
+        semaphore = asyncio.Semaphore(mysettings.async_fetch_limit)
+
+        async def retrieve(symbol):
+            async with semaphore:
+                await asyncio.sleep(self._get_latency(self.quotes.get(symbol)))
+            return symbol, self._get_price_info(symbol)
+
+        return list(await asyncio.gather(*[retrieve(symbol) for symbol in symbols]))
+
+    def _get_price_info(self, symbol):
+        priceInfo = security.PriceInfo()
+        entry = self.quotes.get(symbol)
+        if entry is not None:
+            for fieldName in yahooInterface.priceInfoFields:
+                setattr(priceInfo, fieldName, entry[fieldName])
+
+        return priceInfo
+
+    def _get_latency(self, entry):
+        latency = self.medianLatency if entry is None else entry["latency"]
+        return latency * self.latencyScale
+
+
+class RecordingProvider(BasePriceProvider):
+    """
+    Wraps another provider, passing calls through to it, and recording each response
+    and how long it took, for saving as a ReplayProvider recording. Only records
+    successful responses, and, for histories, the longest date range asked for.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.supportsHistory = provider.supportsHistory
+        self.requestsPerQuote = provider.requestsPerQuote
+        self.quotes = {}
+        self.histories = {}
+        self.lock = threading.Lock()
+
+    def retrieve_daily_data(self, symbol, mysettings):
+        startTime = time.perf_counter()
+        priceInfo = self.provider.retrieve_daily_data(symbol, mysettings)
+        latency = time.perf_counter() - startTime
+        if priceInfo.currentPrice > 0:
+            entry = {fieldName: getattr(priceInfo, fieldName)
+                     for fieldName in yahooInterface.priceInfoFields}
+            entry["latency"] = round(latency, 4)
+            with self.lock:
+                self.quotes[symbol] = entry
+
+        return priceInfo
+
+    def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+        startTime = time.perf_counter()
+        pairs = self.provider.retrieve_historical_prices(symbol, oldestDate, newestDate,
+                                                         priceFrequency)
+        latency = time.perf_counter() - startTime
+        key = f"{symbol}|{priceFrequency}"
+        with self.lock:
+            if len(pairs) > len(self.histories.get(key, {}).get("prices", [])):
+                self.histories[key] = {"prices": [(_to_date(priceDate).isoformat(), float(price))
+                                                  for priceDate, price in pairs],
+                                       "latency": round(latency, 4)}
+
+        return pairs
+
+    def save(self, fileName):
+        with self.lock:
+            with open(fileName, "w") as f:
+                json.dump({"quotes": self.quotes, "histories": self.histories}, f, indent=1)
+
+
+def _to_date(value):
+    """
+    Dates from providers can be dates, datetimes or pandas Timestamps.
+    """
+    if hasattr(value, "date"):
+        return value.date()
+    return value
+
+
+def _create_replay_provider(mysettings):
+    """
+    ReplayProvider for the recording in replay_file. Raises ValueError if it isn't set,
+    or isn't a file.
+    """
+    if not os.path.isfile(mysettings.replay_file):
+        raise ValueError(f"Replay provider needs replay_file set to a recording, "
+                         f"replay_file={mysettings.replay_file!r}")
+
+    return ReplayProvider.from_file(mysettings.replay_file, mysettings.replay_latency_scale)
+
+
+# Factories for each provider name, given settings. Names match sprEnums.PriceProvider.
+providers = {"yahoo": lambda mysettings: YahooProvider(),
+             "alphavest": lambda mysettings: AlphavestProvider(),
+             "replay": _create_replay_provider}
+
+
+def get_provider(mysettings, name=None):
+    """
+    Return the provider called name, or, if not given, the one chosen by the
+    price_provider setting. Raises KeyError for a name with no provider registered,
+    and ValueError if settings needed to create it are missing.
+    """
+    name = name or mysettings.price_provider
+    with instancesLock:
+        provider = instances.get(name)
+        if provider is None:
+            provider = providers[name](mysettings)
+            instances[name] = provider
+
+    return provider
+
+
+def register_provider(name, factory):
+    """
+    Add, or replace, the provider called name. Factory is given settings, and
+    returns the provider.
+    """
+    with instancesLock:
+        providers[name] = factory
+        instances.pop(name, None)
+
+
+def unregister_provider(name):
+    with instancesLock:
+        providers.pop(name, None)
+        instances.pop(name, None)
+
+
+def reset_providers():
+    """
+    Forget all providers created, so that they are created again from current settings.
+    """
+    with instancesLock:
+        instances.clear()
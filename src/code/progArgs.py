@@ -19,6 +19,7 @@ class ProgArgs:
         self.priceProvider = PriceProvider.yahoo
         self.symbol = ""
         self.display = True
+        self.numSecurities = 0
 
     def display_args(self):
         """
@@ -30,6 +31,7 @@ class ProgArgs:
         print("priceProvider=", self.priceProvider)
         print("symbol=", self.symbol)
         print("display=", self.display)
+        print("numSecurities=", self.numSecurities)
 
     def parse_args(self, argv, defltFile, defltTab):
         """
@@ -41,7 +43,7 @@ class ProgArgs:
         self.display = True
 
         try:
-            opts, args = getopt.getopt(argv[1:], "hndrcel:g:f:p:o:", [])
+            opts, args = getopt.getopt(argv[1:], "hndrcesl:g:f:p:o:b:", [])
         except getopt.GetoptError:
             self.action = Action.help
             return
@@ -67,8 +69,17 @@ class ProgArgs:
                 self.action = Action.retrieveDb
             elif opts[0][0] == "-e":
                 self.action = Action.dailyEmail
+            elif opts[0][0] == "-s":
+                self.action = Action.shardedEmail
             elif opts[0][0] == "-c":
                 self.action = Action.clearDaily
+            elif opts[0][0] == "-b":
+                self.action = Action.benchmark
+                try:
+                    self.numSecurities = int(opts[0][1])
+                except ValueError:
+                    print("Number of securities for benchmark must be a number.")
+                    self.action = Action.help
             else:
                 for opt, arg in opts:
                     print("opt=", opt, ", arg=", arg)
@@ -88,6 +99,8 @@ class ProgArgs:
                             self.priceProvider = PriceProvider.yahoo
                         elif arg == "alpha":
                             self.priceProvider = PriceProvider.alphavest
+                        elif arg == "replay":
+                            self.priceProvider = PriceProvider.replay
                         else:
                             print("Unrecognized price provider ", arg, ", using AlphaVest.")
                     else:
@@ -0,0 +1,141 @@
+"""
+Rate limiting for requests to price providers, shared by every thread making them.
+Token buckets for requests per second, per minute and per day, so callers only wait
+when a budget is actually used up.
+V0.01, October 18, 2026
+"""
+
+import asyncio
+from contextlib import contextmanager
+import threading
+import time
+
+# Settings giving each provider's limits - per second, per minute, per day.
+providerLimits = {"yahoo": ("fetch_rate_per_second", "yahoo_rate_per_minute",
+                            "yahoo_rate_per_day"),
+                  "alpha": ("alpha_rate_per_second", "alpha_rate_per_minute",
+                            "alpha_rate_per_day")}
+# One limiter per provider, created from settings on first use.
+limiters = {}
+limitersLock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Holds up to capacity tokens, refilling at refillPerSecond. Callers can take a
+    token before it has refilled, leaving the bucket in debt, which makes later
+    callers wait their turn.
+    """
+
+    def __init__(self, capacity, refillPerSecond):
+        self.capacity = capacity
+        self.refillPerSecond = refillPerSecond
+        self.tokens = capacity
+        self.lastTime = time.monotonic()
+
+    def reserve(self, now):
+        """
+        Take a token. Returns: How long caller has to wait for it to be there.
+        """
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.lastTime) * self.refillPerSecond)
+        self.lastTime = now
+        wait = max(0.0, (1 - self.tokens) / self.refillPerSecond)
+        self.tokens -= 1
+
+        return wait
+
+
+class RateLimiter:
+    """
+    Keeps requests within ratePerSecond, ratePerMinute and ratePerDay, however many
+    threads and coroutines are making them. A rate of 0 means no limit for that period.
+    Requests are spaced out evenly within a second, allowing burst at once, but the
+    whole minute or day budget can be used at once. Limits are per process, so
+    the day limit only covers requests made by this process - see split_between.
+    """
+
+    def __init__(self, ratePerSecond, ratePerMinute=0, ratePerDay=0, burst=1):
+        self.buckets = []
+        if ratePerSecond > 0:
+            self.buckets.append(TokenBucket(burst, ratePerSecond))
+        if ratePerMinute > 0:
+            self.buckets.append(TokenBucket(ratePerMinute, ratePerMinute / 60))
+        if ratePerDay > 0:
+            self.buckets.append(TokenBucket(ratePerDay, ratePerDay / (24 * 60 * 60)))
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Block until this caller is allowed to start its request. Callers are given
+        tokens in the order they arrive, so the lock is only held to reserve them,
+        not while sleeping.
+        """
+        delay = self._book_slot()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """
+        Same as wait, but for coroutines - sleeps without blocking the event loop.
+        Shares buckets with callers of wait, so threads and coroutines can be mixed.
+        """
+        delay = self._book_slot()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _book_slot(self):
+        """
+        Reserve a token from every bucket, returning how long caller has to wait until
+        they are all there.
+        """
+        with self.lock:
+            now = time.monotonic()
+            delay = 0.0
+            for bucket in self.buckets:
+                delay = max(delay, bucket.reserve(now))
+
+        return delay
+
+
+def get_limiter(provider, mysettings):
+    """
+    Return the rate limiter shared by everything calling given provider - "yahoo"
+    or "alpha".
+    """
+    with limitersLock:
+        limiter = limiters.get(provider)
+        if limiter is None:
+            limiter = RateLimiter(*[getattr(mysettings, name) for name in providerLimits[provider]])
+            limiters[provider] = limiter
+
+    return limiter
+
+
+def reset_limiters():
+    """
+    Forget all limiters, so that they are created again from current settings.
+    """
+    with limitersLock:
+        limiters.clear()
+
+
+@contextmanager
+def split_between(mysettings, numProcesses):
+    """
+    For the duration of a with block, divide every provider's limits in mysettings
+    between numProcesses, so that processes forked within it, each with its own
+    limiters, together stay within the limits. Limiters are created again, from the
+    divided limits in the block, and from the original limits after it.
+    """
+    names = [name for limitNames in providerLimits.values() for name in limitNames]
+    origLimits = {name: getattr(mysettings, name) for name in names}
+    for name, limit in origLimits.items():
+        setattr(mysettings, name, limit / numProcesses)
+    reset_limiters()
+    try:
+        yield
+    finally:
+        for name, limit in origLimits.items():
+            setattr(mysettings, name, limit)
+        reset_limiters()
@@ -0,0 +1,182 @@
+"""
+On-disk cache of price provider responses, so that a rerun on the same day - after
+clearing daily prices, or after a crash - doesn't download everything again.
+Current price quotes are only cached if response_cache_quotes is on, as they change
+during the day.
+Entries expire after a time to live, are compressed, and the least recently used are
+removed once the cache grows past its size limit.
+V0.01, October 18, 2026
+"""
+
+from collections import OrderedDict
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+# Created from settings on first use, shared by every thread.
+cache = None
+cacheLock = threading.Lock()
+
+
+def make_key(provider, symbol, interval, startDate=None, endDate=None):
+    """
+    Key for one response - provider, symbol, interval ("quote" for current prices)
+    and date range.
+    """
+    return "|".join(str(part) for part in (provider, symbol, interval, startDate, endDate))
+
+
+class ResponseCache:
+    """
+    Each entry is one gzipped json file in cacheDir, named from a hash of its key.
+    Which entries there are, their sizes and the order they were last used in are
+    kept in memory, read from the directory on first use, so that saving an entry
+    doesn't have to look at all the others. File modified times record last use, so
+    that the order survives to the next run. Files are read and written outside the
+    lock, so threads only wait on each other to update the index.
+    """
+
+    def __init__(self, cacheDir, ttlSeconds, maxBytes):
+        self.cacheDir = cacheDir
+        self.ttlSeconds = ttlSeconds
+        self.maxBytes = maxBytes
+        self.numHits = 0
+        self.numMisses = 0
+        # Path: size in bytes, least recently used first. None until first used.
+        self.entries = None
+        self.totalBytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(cacheDir, exist_ok=True)
+
+    def get(self, key):
+        """
+        Returns: Value saved for key, or None if there isn't one, or it has expired.
+        """
+        path = self._get_path(key)
+        value = None
+        try:
+            with gzip.open(path, "rt") as f:
+                entry = json.load(f)
+            if entry["key"] == key and time.time() - entry["savedAt"] < self.ttlSeconds:
+                os.utime(path)
+                value = entry["value"]
+            else:
+                os.remove(path)
+        except (OSError, ValueError, KeyError):
+            pass
+
+        with self.lock:
+            self._load_index()
+            if value is None:
+                self.numMisses += 1
+                self._forget(path)
+            else:
+                self.numHits += 1
+                if path in self.entries:
+                    self.entries.move_to_end(path)
+
+        return value
+
+    def put(self, key, value):
+        """
+        Save value, which must be json serializable, for key, then remove least
+        recently used entries if over the size limit.
+        """
+        path = self._get_path(key)
+        tmpPath = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmpPath, "wt") as f:
+                json.dump({"key": key, "savedAt": time.time(), "value": value}, f)
+            os.replace(tmpPath, path)
+            size = os.path.getsize(path)
+        except OSError as E:
+            print(f"ResponseCache failed to save {key}, {E=}")
+            return
+
+        with self.lock:
+            self._load_index()
+            self._forget(path)
+            self.entries[path] = size
+            self.totalBytes += size
+            toRemove = []
+            while self.totalBytes > self.maxBytes and len(self.entries) > 1:
+                oldPath, oldSize = self.entries.popitem(last=False)
+                self.totalBytes -= oldSize
+                toRemove.append(oldPath)
+        for oldPath in toRemove:
+            try:
+                os.remove(oldPath)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self.lock:
+            for entry in self._list_entries():
+                os.remove(entry.path)
+            self.entries = None
+            self.totalBytes = 0
+
+    def _load_index(self):
+        """
+        Build the index from the directory, if not done yet. Caller holds the lock.
+        """
+        if self.entries is not None:
+            return
+        self.entries = OrderedDict()
+        self.totalBytes = 0
+        for entry in sorted(self._list_entries(), key=lambda x: x.stat().st_mtime):
+            size = entry.stat().st_size
+            self.entries[entry.path] = size
+            self.totalBytes += size
+
+    def _forget(self, path):
+        size = self.entries.pop(path, None)
+        if size is not None:
+            self.totalBytes -= size
+
+    def _list_entries(self):
+        return [entry for entry in os.scandir(self.cacheDir) if entry.name.endswith(".json.gz")]
+
+    def _get_path(self, key):
+        fileName = hashlib.sha1(key.encode()).hexdigest() + ".json.gz"
+        return os.path.join(self.cacheDir, fileName)
+
+
+def get_cache(mysettings):
+    """
+    Return the shared response cache, or None if response_cache_enabled is off.
+    """
+    global cache
+    if not mysettings.response_cache_enabled:
+        return None
+    with cacheLock:
+        if cache is None:
+            cache = ResponseCache(mysettings.response_cache_dir,
+                                  mysettings.response_cache_ttl,
+                                  mysettings.response_cache_max_bytes)
+
+    return cache
+
+
+def get_quote_cache(mysettings):
+    """
+    Return the shared response cache for current price quotes, or None if the cache, or
+    response_cache_quotes, is off.
+    """
+    if not mysettings.response_cache_quotes:
+        return None
+
+    return get_cache(mysettings)
+
+
+def reset_cache():
+    """
+    Forget the shared cache, so that it is created again from current settings.
+    Doesn't remove its files.
+    """
+    global cache
+    with cacheLock:
+        cache = None
@@ -4,62 +4,13 @@ V0.02, February 28, 2021, GAW.
 """
 
 import datetime
-import json
-import socket
-import time
-
-import urllib3
-import requests
 
+import priceProviders
 import security
 from securities import Securities
 import stockTarget
 from sprEnums import PriceProvider
-import yahooInterface
-
 
-def _get_price_alphavest(symbol, mysettings):
-    """
-    Return current price for given stock, 0 if hit an error.
-    Note that am using alphavantage.co's api to retrieve prices. Has a limit of 5 requests per
-    minute (and 500 per day) on the free tier, so am waiting 20s before each call, to stay legal.
-    Also note that appears that if request a symbol that they don't recognize, they return
-    an empty Global Quote object.
-    Getting pricing from alphavest doesn't currently work, because the GLOBAL_QUOTE method
-    doesn't return the 52 week range. Have hidden this option, may eventually try to find
-    another method that returns everything I need.
-    """
-    time.sleep(mysettings.alphaCallDelay)
-    price = 0
-    try:
-        reqParams = {'function': 'GLOBAL_QUOTE',
-                     'symbol': symbol,
-                     'apikey': mysettings.alphaApiKey,
-                     'datatype': 'json'}
-        r = requests.get(mysettings.alphaBaseUrl,
-                         params=reqParams,
-                         timeout=mysettings.alphaApiTimeOut)
-        if r.ok:
-            try:
-                with open(symbol + ".json", 'w') as f:
-                    json.dump(r.json(), f)
-
-                price = r.json()[mysettings.respContName][mysettings.priceName]
-            except (NameError, KeyError) as E:
-                print("Couldn't find price element for ", symbol)
-                print("E: ", E)
-        else:
-            print(r.ok, r.reason, r.request, r.status_code, r.text)
-    except (ConnectionError,
-            urllib3.exceptions.MaxRetryError,
-            urllib3.exceptions.NewConnectionError,
-            socket.timeout,
-            NameError,
-            requests.exceptions.ReadTimeout) as E:
-        print("Failed to retrieve price for ", symbol)
-        print(E)
-
-    return float(price)
 
 def retrieve_prices_using_db():
     """
@@ -89,23 +40,25 @@ def retrieve_prices_from_file(excelFile,
 
 def retrieve_prices(symbolList, priceProvider, mysettings, myResultsFile):
     """
-    Retrieve price for each symbol in list, using given function, save in a file.
-    Returns name of file created.
+    Retrieve price for each symbol in list, using given provider, save in a file.
+    Returns name of file created, or None if couldn't create the provider.
     """
 
-    if priceProvider == PriceProvider.alphavest:
-        retrieveFn = _get_price_alphavest
-    elif priceProvider == PriceProvider.yahoo:
-        retrieveFn = yahooInterface.retrieve_daily_data
-    else:
-        print("Unrecognized price provider: ", priceProvider, ", using AlphaVest.")
-        retrieveFn = _get_price_alphavest
+    try:
+        if isinstance(priceProvider, PriceProvider):
+            provider = priceProviders.get_provider(mysettings, priceProvider.name)
+        else:
+            print("Unrecognized price provider: ", priceProvider, ", using AlphaVest.")
+            provider = priceProviders.get_provider(mysettings, PriceProvider.alphavest.name)
+    except ValueError as E:
+        print("retrieve_prices couldn't create price provider, ", E)
+        return None
 
     # Loop through all securities in list, getting and checking current price.
     securities = []
     for symbol in symbolList:
         print(symbol.Stock)
-        priceInfo = retrieveFn(symbol.Symbol, mysettings)
+        priceInfo = provider.retrieve_daily_data(symbol.Symbol, mysettings)
         mySecurity = security.Security()
         mySecurity.pop_from_row(symbol, priceInfo)
         if priceInfo.currentPrice > 0:
@@ -6,16 +6,22 @@ V0.01, November 23, 2022
 
 # from memory_profiler import profile
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta
 
+import circuitBreaker
+from dailyPipeline import DailyPricePipeline
 from historicalPricesInterface import HistoricalPricesInterface
+import httpSession
+import priceProviders
 import settings
 from securitiesInterface import SecuritiesInterface
 from security import Security
+from security_groups import SecurityGroups
 import sprEnums
 from utilsInterface import UtilsInterface
 from webPriceInfo import WebPriceInfo
-from yahooInterface import retrieve_historical_prices, retrieve_daily_data
 
 class Securities:
 
@@ -27,6 +33,17 @@ class Securities:
         self.securitiesInter = SecuritiesInterface()
         self.historyInter = HistoricalPricesInterface()
         self.utilsInter = UtilsInterface()
+        # Where prices come from, chosen by the price_provider setting.
+        self.provider = priceProviders.get_provider(self.mySettings)
+        # Optional function returning seconds left before we have to stop, whether we
+        # had to stop before finishing, and whether some symbols were left for next run.
+        self.timeLeft = None
+        self.stoppedEarly = False
+        self.symbolsDeferred = False
+        # Did every batch in the last daily price update save?
+        self.dailyPricesAllSaved = True
+        # Per stage counters from the last daily price pipeline run.
+        self.pipelineCounters = []
 
     def __str__(self):
         """
@@ -40,38 +57,107 @@ class Securities:
 
     def do_maintenance(self):
         self.utilsInter.connect()
-        if self._isPriceGroomingDue():
+        if self._isPriceGroomingDue() and not self._out_of_time():
             self._groomPrices()
+            self.utilsInter.set_last_groom_date()
         self.utilsInter.disconnect()
 
-    def do_daily_updates(self):
+    def do_daily_updates(self, timeLeft=None):
         """
         Runs the stuff that should run every day - price update and price grooming.
-        """
+        If given timeLeft, a function returning the number of seconds left to run in,
+        stops starting new work once less than daily_update_stop_margin seconds are left.
+        Everything finished by then is already saved - prices batch by batch, with each
+        security's currentPriceDate, and the weekly and grooming dates in the admin
+        table - so calling again carries on from where this stopped, without redoing
+        anything. Use daily_update_finished to check whether it has to be called again.
+        """
+        self.timeLeft = timeLeft
+        self.stoppedEarly = False
+        self.symbolsDeferred = False
         self.utilsInter.connect()
         self.load()
-        numUpdated = self.do_daily_price_update(date.today())
+        if self.mySettings.async_fetch and self.provider.supportsAsync:
+            numUpdated = asyncio.run(self.do_daily_price_update_async(date.today()))
+        else:
+            numUpdated = self.do_daily_price_update(date.today())
         self.do_maintenance()
         self.utilsInter.disconnect()
+        self.utilsInter.print_query_summary()
+        httpSession.print_stats()
+        circuitBreaker.print_breakers()
 
         return numUpdated
 
+    def do_shard_price_update(self, symbols, currentDate):
+        """
+        Worker side of a sharded daily update - downloads full histories, if needed,
+        and today's prices, for just the given symbols. Leaves weekly prices and
+        grooming, which cover all securities, for finish_daily_updates.
+        Returns: Number of securities that downloaded price for.
+        """
+        print(f"Starting do_shard_price_update for {len(symbols)} symbols, "
+              f"currentDate={currentDate}")
+        numUpdated = 0
+        self.dailyPricesAllSaved = True
+        self.utilsInter.connect()
+        self.load()
+        shardSymbols = set(symbols)
+        self.securitiesDict = {symbol: tmpSecurity
+                               for symbol, tmpSecurity in self.securitiesDict.items()
+                               if symbol in shardSymbols}
+
+        symbolsToUpdate = self._get_symbols_needing_price_update(currentDate)
+        if len(symbolsToUpdate) > 0:
+            if not self._are_all_downloaded():
+                self.retrieve_full_price_histories()
+            symbolsToUpdate = self._schedule_fetches(symbolsToUpdate)
+            numUpdated = self._update_daily_prices(symbolsToUpdate, currentDate, False, None)
+        self.utilsInter.disconnect()
+
+        print(f"Finished do_shard_price_update, numUpdated={numUpdated}")
+
+        return numUpdated
+
+    def finish_daily_updates(self, currentDate, allSaved):
+        """
+        Reducer side of a sharded daily update, once every shard has run - saves
+        weekly prices for all securities, if due, and runs grooming, if due. Only marks
+        the weekly update as done if allSaved, i.e. every shard saved all its prices.
+        Leaves all securities loaded, ready for the email.
+        """
+        self.utilsInter.connect()
+        self.load()
+        if self._is_weekly_price_update_due():
+            self._save_weekly_prices(self._get_weekly_price_date(currentDate), allSaved)
+        self.do_maintenance()
+        self.utilsInter.disconnect()
+        self.utilsInter.print_query_summary()
+        httpSession.print_stats()
+        circuitBreaker.print_breakers()
+
+    def daily_update_finished(self):
+        """
+        Did the last do_daily_updates get through everything, rather than stopping, or
+        deferring some symbols, because it was running out of time?
+        """
+        return not (self.stoppedEarly or self.symbolsDeferred)
+
     def load(self):
         """
         Read in securities from securities table. Convert to a dictionary of security,
         key = symbol.
         """
         print(f"\nStarting load.")
-        dbSecurities = self.securitiesInter.get_securities()
-
-        if not (dbSecurities is None):
-            self.securitiesDict = {}
-            for tmpSecurity in dbSecurities:
-                newSec = Security()
-                newSec.pop_from_dict(tmpSecurity)
-                self.securitiesDict[newSec.symbol] = newSec
-                print(f"load just read in security with symbol {newSec.symbol}")
-        else:
+        # Streaming the rows, so that only the Security objects are held, not the
+        # dictionaries they were built from as well.
+        self.securitiesDict = {}
+        for tmpSecurity in self.securitiesInter.iter_securities():
+            newSec = Security()
+            newSec.pop_from_dict(tmpSecurity)
+            self.securitiesDict[newSec.symbol] = newSec
+            print(f"load just read in security with symbol {newSec.symbol}")
+        if len(self.securitiesDict) == 0:
             print("Securities.load: No securities were found in the table.")
         print(f"load completed with {len(self.securitiesDict)} records in securitiesDict.\n")
 
@@ -88,16 +174,22 @@ class Securities:
         """
         updated = False
         print(f"\nStarting loadNewList")
-        self._remove_missing_securities(targetSecurities)
-        for symbol in targetSecurities:
-            newTarget = targetSecurities[symbol]
-            if symbol in self.securitiesDict:
-                self._update_security(newTarget)
-            else:
-                self._add_security(newTarget)
+        # Changes to the list are all or nothing. Downloading histories is left outside
+        # the transaction, as it is slow and each security's history stands on its own.
+        with self.utilsInter.transaction():
+            self._remove_missing_securities(targetSecurities)
+            for symbol in targetSecurities:
+                newTarget = targetSecurities[symbol]
+                if symbol in self.securitiesDict:
+                    self._update_security(newTarget)
+                else:
+                    self._add_security(newTarget)
 
         self.load()
-        updated = self.retrieve_full_price_histories()
+        if self.utilsInter.last_transaction_committed():
+            updated = self.retrieve_full_price_histories()
+        else:
+            print("loadNewList failed to save new list, so didn't retrieve histories.")
         print(f"Finished loadNewList.\n")
 
         return updated
@@ -109,6 +201,8 @@ class Securities:
         every security, runs grooming to remove old prices, ensures that every security
         has been updated with today's closing price, and, if it is appropriate, updates
         the weekly closing price for every security.
+        If batch_quotes is set, retrieves today's prices many symbols per request first,
+        rather than one at a time in the pipeline.
         Also uses new data to update in-memory collection of securities.
         Receives: Date running update for (assumed to be today, but useful for testing.)
         Returns: Number of securities that downloaded price for.
@@ -129,37 +223,149 @@ class Securities:
         weeklyUpdateDue = self._is_weekly_price_update_due()
         weeklyPriceDate = self._get_weekly_price_date(currentDate)
 
-        # Do prices for all securities that we haven't previously done today.
-        for tmpSymbol in symbolsToUpdate:
-            newPrice = retrieve_daily_data(tmpSymbol, self.mySettings)
-            print(f"retrieved new price for {tmpSymbol}")
-            if newPrice.currentPrice > 0:
-                tmpSecurity = self.securitiesDict[tmpSymbol]
-                changedFieldNames, newValues = tmpSecurity.get_changed_fields(newPrice, currentDate)
-                print(f"changedFieldNames={changedFieldNames}, newValues={newValues}")
-                if len(changedFieldNames) > 0:
-                    print(f"Attempting to do updates for {tmpSecurity}.")
-                    self.securitiesInter.update_security(tmpSecurity.id,
-                                                         changedFieldNames,
-                                                         newValues)
-                    self.historyInter.save_daily_price_for_security(tmpSecurity.id,
-                                                                    newPrice.currentPrice,
-                                                                    currentDate)
-                    if weeklyUpdateDue:
-                        self.historyInter.save_weekly_price_for_security(tmpSecurity.id,
-                                                                         weeklyPriceDate)
-                    tmpSecurity.update_values(newPrice)
-                    numUpdated += 1
-            else:
-                print(f"Failed to retrieve daily price for {tmpSymbol}, so didn't save anything.")
-
-        if weeklyUpdateDue:
-            self.utilsInter.set_last_weekly_update_date()
+        useBatch = self.mySettings.batch_quotes and self.provider.supportsBatchQuotes
+        requestsPerSymbol = None
+        if useBatch:
+            requestsPerSymbol = 1 / self.mySettings.yahoo_quote_batch_size
+        symbolsToUpdate = self._schedule_fetches(symbolsToUpdate, requestsPerSymbol)
+        newPrices = None
+        if useBatch:
+            newPrices = self.provider.retrieve_daily_data_many(symbolsToUpdate, self.mySettings)
+        numUpdated = self._update_daily_prices(symbolsToUpdate, currentDate,
+                                               weeklyUpdateDue, weeklyPriceDate, newPrices)
 
         print(f"Finished do_daily_price_update, numUpdated={numUpdated}")
 
         return numUpdated
 
+    async def do_daily_price_update_async(self, currentDate):
+        """
+        Same as do_daily_price_update, but retrieves today's prices with asyncio, so
+        that up to async_fetch_limit requests are waiting on Yahoo at once, rather than
+        one per thread. Prices are checked and saved once they have all arrived.
+        Receives: Date running update for.
+        Returns: Number of securities that downloaded price for.
+        """
+        print(f"Starting do_daily_price_update_async, currentDate={currentDate}")
+        numUpdated = 0
+
+        symbolsToUpdate = self._get_symbols_needing_price_update(currentDate)
+        print(f"{symbolsToUpdate=}")
+        if len(symbolsToUpdate) == 0:
+            print(f"Exiting do_daily_price_update_async because already ran today.")
+            return numUpdated
+
+        if not self._are_all_downloaded():
+            self.retrieve_full_price_histories()
+
+        weeklyUpdateDue = self._is_weekly_price_update_due()
+        weeklyPriceDate = self._get_weekly_price_date(currentDate)
+
+        symbolsToUpdate = self._schedule_fetches(symbolsToUpdate)
+        newPrices = await self.provider.retrieve_daily_data_many_async(symbolsToUpdate,
+                                                                       self.mySettings)
+        numUpdated = self._update_daily_prices(symbolsToUpdate, currentDate,
+                                               weeklyUpdateDue, weeklyPriceDate, newPrices)
+
+        print(f"Finished do_daily_price_update_async, numUpdated={numUpdated}")
+
+        return numUpdated
+
+    def _update_daily_prices(self, symbolsToUpdate, currentDate, weeklyUpdateDue,
+                             weeklyPriceDate, newPrices=None):
+        """
+        Retrieve and save today's price for each given symbol, plus weekly prices and
+        the weekly update date if due. Also updates in-memory securities.
+        If newPrices, a list of (symbol, PriceInfo) pairs, is given, saves those rather
+        than retrieving prices.
+        Runs as a DailyPricePipeline - fetch_workers threads fetch prices, one thread
+        checks which have changed, and this thread saves them, all at the same time.
+        Prices are saved in batches of daily_price_batch_size securities, with each
+        batch's securities table updates and daily prices committed together. If a batch
+        fails, its securities keep yesterday's date, so a rerun picks them up.
+        Returns: Number of securities that downloaded and saved price for.
+        """
+        pipeline = DailyPricePipeline(
+            lambda tmpSymbol: self.provider.retrieve_daily_data(tmpSymbol, self.mySettings),
+            lambda tmpSymbol, newPrice: self._diff_daily_price(tmpSymbol, newPrice, currentDate),
+            lambda batch: self._save_daily_batch(batch, currentDate),
+            self._out_of_time,
+            self.mySettings.fetch_workers,
+            self.mySettings.daily_price_batch_size,
+            self.mySettings.pipeline_queue_size)
+        numUpdated, allSaved = pipeline.run(symbolsToUpdate, newPrices)
+        pipeline.print_counters()
+        self.pipelineCounters = pipeline.counters
+
+        # Weekly prices come from the daily prices just saved, so are done for all
+        # securities at once, after the pipeline. If stopped early, or deferred some
+        # symbols, leave it for the rerun.
+        self.dailyPricesAllSaved = allSaved and self.daily_update_finished()
+        if weeklyUpdateDue and self.daily_update_finished():
+            self._save_weekly_prices(weeklyPriceDate, allSaved)
+
+        return numUpdated
+
+    def _diff_daily_price(self, tmpSymbol, newPrice, currentDate):
+        """
+        Diff stage of the daily price pipeline - only securities whose new price changes
+        something need saving.
+        Returns: (security, priceInfo) to save, or None if nothing to save.
+        """
+        print(f"retrieved new price for {tmpSymbol}")
+        if newPrice is None or newPrice.currentPrice <= 0:
+            print(f"Failed to retrieve daily price for {tmpSymbol}, so didn't save anything.")
+            return None
+
+        tmpSecurity = self.securitiesDict[tmpSymbol]
+        changedFieldNames, newValues = tmpSecurity.get_changed_fields(newPrice, currentDate)
+        print(f"changedFieldNames={changedFieldNames}, newValues={newValues}")
+        if len(changedFieldNames) > 0:
+            return tmpSecurity, newPrice
+        return None
+
+    def _save_weekly_prices(self, weeklyPriceDate, allSaved):
+        """
+        Copy every security's closing price for the week to the weekly price table.
+        Only mark the weekly update as done if every daily price saved, so that a rerun
+        fills in any securities that were missed.
+        """
+        with self.utilsInter.transaction():
+            self.historyInter.save_weekly_prices_for_all(weeklyPriceDate)
+            if allSaved:
+                self.utilsInter.set_last_weekly_update_date()
+
+    def _save_daily_batch(self, batch, currentDate):
+        """
+        Save new prices for a batch of (security, priceInfo) pairs - one bulk update of
+        the securities table and one multi-row insert of daily prices, committed
+        together. In-memory securities are only updated if the batch was committed.
+        Returns: Number of securities saved.
+        """
+        updateFieldNames = []
+        updateRows = []
+        priceRows = []
+        for tmpSecurity, newPrice in batch:
+            updateFieldNames, updateValues = \
+                tmpSecurity.get_daily_update_fields(newPrice, currentDate)
+            updateRows.append([tmpSecurity.id] + updateValues)
+            priceRows.append((tmpSecurity.id, currentDate, newPrice.currentPrice))
+
+        print(f"Saving daily prices for batch of {len(batch)} securities.")
+        with self.utilsInter.transaction():
+            self.securitiesInter.update_securities_bulk(updateFieldNames, updateRows)
+            self.historyInter.save_daily_prices(priceRows)
+
+        numSaved = 0
+        if self.utilsInter.last_transaction_committed():
+            for tmpSecurity, newPrice in batch:
+                tmpSecurity.update_values(newPrice)
+            numSaved = len(batch)
+        else:
+            print(f"Failed to save daily prices for batch of {len(batch)} securities.")
+
+        return numSaved
+
     def reset_daily_prices(self):
         """
         Reset database so that can re-run daily price update, without getting multiple
@@ -171,53 +377,158 @@ class Securities:
         reset lastWeeklyPriceUpdate in admin table to a week ago.
         """
         self.utilsInter.connect()
-        self.securitiesInter.reset_daily_prices()
-        self.historyInter.reset_daily_prices()
-        self.utilsInter.reset_daily_prices()
+        with self.utilsInter.transaction():
+            self.securitiesInter.reset_daily_prices()
+            self.historyInter.reset_daily_prices()
+            self.utilsInter.reset_daily_prices()
         self.utilsInter.disconnect()
 
     def retrieve_full_price_histories(self):
         """
         Download full daily/weekly price histories for any security for which we
         don't already have them.
-        """
+        Histories are retrieved by up to fetch_workers threads, and saved from this
+        thread in batches of history_batch_size securities, each batch's prices and
+        downloaded flags committed together. A security whose download or batch
+        fails isn't marked as downloaded, so will be retried next time, without
+        stopping the others.
+        Returns: Number of securities whose histories were saved.
+        """
+        if not self.provider.supportsHistory:
+            print(f"retrieve_full_price_histories skipped, {self.provider.name} provider "
+                  f"doesn't have histories.")
+            return 0
         today, dailyHistoryStart, weeklyHistoryStart = self._get_full_history_dates()
+        toDownload = [tmpSecurity for tmpSecurity in self.securitiesDict.values()
+                      if not tmpSecurity.fullHistoryDownloaded]
+        batchSize = self.mySettings.history_batch_size
 
-        # Retrieve and store daily and weekly price data for each security that
-        # hasn't already had it done.
+        histories = self._fetch_full_histories(toDownload, today, dailyHistoryStart,
+                                               weeklyHistoryStart)
         numDownloaded = 0
-        for tmpSecurity in self.securitiesDict.values():
-            print(f"retrieve_full_price_history working on {tmpSecurity.symbol}")
-            if not (tmpSecurity.fullHistoryDownloaded):
-                dailyPrices = retrieve_historical_prices(tmpSecurity.symbol,
-                                                         dailyHistoryStart,
-                                                         today,
-                                                         self.mySettings.daily_price_code)
-                if len(dailyPrices) > 0:
-                    # Don't go any further if first download failed.
-                    downloaded = self.historyInter.save_daily_historical_prices(tmpSecurity.id,
-                                                                                dailyPrices)
-                    print(f"retrieve_full_price_history saved daily prices.")
-
-                    weeklyPrices = retrieve_historical_prices(tmpSecurity.symbol,
-                                                              weeklyHistoryStart,
-                                                              today,
-                                                              self.mySettings.weekly_price_code)
-                    if downloaded:
-                        downloaded = downloaded and \
-                                     self.historyInter.save_weekly_historical_prices(tmpSecurity.id,
-                                                                                     weeklyPrices)
-                    print(f"retrieve_full_price_history saved weekly prices.")
-                    if downloaded:
-                        self.securitiesInter.mark_historical_data_retrieved(tmpSecurity.id)
-                        tmpSecurity.fullHistoryDownloaded = True
-                        numDownloaded += 1
-                    else:
-                        print(f"retrieve_full_price_histories failed to save data for "
-                              f"symbol: {tmpSecurity.symbol}")
+        numDone = 0
+        batch = []
+        for tmpSecurity, dailyPrices, weeklyPrices in histories:
+            numDone += 1
+            if len(dailyPrices) > 0 and len(weeklyPrices) > 0:
+                print(f"retrieve_full_price_histories {numDone}/{len(toDownload)}: retrieved "
+                      f"{len(dailyPrices)} daily, {len(weeklyPrices)} weekly prices for "
+                      f"{tmpSecurity.symbol}")
+                batch.append((tmpSecurity, dailyPrices, weeklyPrices))
+                if len(batch) >= batchSize:
+                    numDownloaded += self._save_history_batch(batch)
+                    batch = []
+            else:
+                print(f"retrieve_full_price_histories {numDone}/{len(toDownload)}: failed to "
+                      f"retrieve prices for {tmpSecurity.symbol}")
+
+        if len(batch) > 0:
+            numDownloaded += self._save_history_batch(batch)
+
+        print(f"retrieve_full_price_histories saved histories for {numDownloaded} of "
+              f"{len(toDownload)} securities.")
 
         return numDownloaded
 
+    def _fetch_full_histories(self, toDownload, today, dailyHistoryStart, weeklyHistoryStart):
+        """
+        Generator - retrieves daily and weekly price histories for each given security,
+        yielding (security, dailyPrices, weeklyPrices). If fetch_workers is more than
+        one, uses a pool of that many threads, and yields histories in the order they
+        arrive. Stops early if running out of time.
+        """
+        fetchArgs = (today, dailyHistoryStart, weeklyHistoryStart)
+        numWorkers = self.mySettings.fetch_workers
+        if numWorkers <= 1 or len(toDownload) <= 1:
+            for tmpSecurity in toDownload:
+                if self._out_of_time():
+                    return
+                yield (tmpSecurity,) + self._fetch_full_history(tmpSecurity, *fetchArgs)
+            return
+
+        with ThreadPoolExecutor(max_workers=numWorkers) as executor:
+            futures = {executor.submit(self._fetch_full_history, tmpSecurity, *fetchArgs):
+                       tmpSecurity for tmpSecurity in toDownload}
+            for tmpSecurity, history in self._as_completed_until_out_of_time(futures):
+                yield (tmpSecurity,) + history
+
+    def _as_completed_until_out_of_time(self, futures):
+        """
+        Generator - yields (key, result) for each future in given dictionary of
+        future: key, as they complete. If running out of time, or the caller stops
+        early, cancels the futures that haven't started, so that the pool only waits
+        for the ones in progress.
+        """
+        try:
+            for future in as_completed(futures):
+                if self._out_of_time():
+                    break
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def _out_of_time(self):
+        """
+        Is it time to stop starting new work? Once it is, stays that way for the rest
+        of the run.
+        """
+        if not self.stoppedEarly and self.timeLeft is not None and \
+                self.timeLeft() < self.mySettings.daily_update_stop_margin:
+            print(f"Less than {self.mySettings.daily_update_stop_margin} seconds left, so "
+                  f"stopping, will carry on from here next run.")
+            self.stoppedEarly = True
+
+        return self.stoppedEarly
+
+    def _fetch_full_history(self, tmpSecurity, today, dailyHistoryStart, weeklyHistoryStart):
+        """
+        Retrieve daily and weekly price histories for one security. Doesn't touch the
+        database, so safe to run on worker threads. Any error is reported as no prices,
+        so that one bad security can't stop the rest.
+        Returns: Tuple of daily and weekly date/price pair lists.
+        """
+        dailyPrices = []
+        weeklyPrices = []
+        try:
+            dailyPrices = self.provider.retrieve_historical_prices(
+                tmpSecurity.symbol, dailyHistoryStart, today, self.mySettings.daily_price_code)
+            # Don't go any further if first download failed.
+            if len(dailyPrices) > 0:
+                weeklyPrices = self.provider.retrieve_historical_prices(
+                    tmpSecurity.symbol, weeklyHistoryStart, today,
+                    self.mySettings.weekly_price_code)
+        except Exception as E:
+            print(f"_fetch_full_history failed for {tmpSecurity.symbol}, {E=}")
+            dailyPrices = []
+            weeklyPrices = []
+
+        return dailyPrices, weeklyPrices
+
+    def _save_history_batch(self, batch):
+        """
+        Save price histories for a batch of (security, dailyPrices, weeklyPrices), and
+        mark the securities as downloaded, all in one transaction.
+        Returns: Number of securities saved.
+        """
+        histories = [(tmpSecurity.id, dailyPrices, weeklyPrices)
+                     for tmpSecurity, dailyPrices, weeklyPrices in batch]
+        print(f"Saving price histories for batch of {len(batch)} securities.")
+        with self.utilsInter.transaction():
+            self.historyInter.save_full_histories(histories)
+            self.securitiesInter.mark_historical_data_retrieved_many(
+                [tmpSecurity.id for tmpSecurity, dailyPrices, weeklyPrices in batch])
+
+        numSaved = 0
+        if self.utilsInter.last_transaction_committed():
+            for tmpSecurity, dailyPrices, weeklyPrices in batch:
+                tmpSecurity.fullHistoryDownloaded = True
+            numSaved = len(batch)
+        else:
+            print(f"Failed to save price histories for batch of {len(batch)} securities.")
+
+        return numSaved
+
     def retrieve_email_info(self):
         """
         Return a sorted list of securities.
@@ -247,15 +558,15 @@ class Securities:
             self.load()
 
         webSecs = []
-        for tmpSec in self.securitiesDict.values():
-            historicalPrices = self.historyInter.get_historical_prices(tmpSec.id,
-                                                                       historyTable,
-                                                                       maxAge)
-            tmpWebPrice = WebPriceInfo()
-            tmpWebPrice.populate(tmpSec, historicalPrices)
-            webSecs.append(tmpWebPrice)
+        if len(self.securitiesDict) > 0:
+            pricesById = self.historyInter.get_historical_prices_for_all(historyTable, maxAge)
+            for tmpSec in self.securitiesDict.values():
+                tmpWebPrice = WebPriceInfo()
+                tmpWebPrice.populate_from_columns(tmpSec, pricesById[tmpSec.id])
+                webSecs.append(tmpWebPrice)
 
         self.utilsInter.disconnect()
+        self.utilsInter.print_query_summary()
 
         return webSecs
 
@@ -318,6 +629,35 @@ class Securities:
 
         return symbols
 
+    def _schedule_fetches(self, symbols, requestsPerSymbol=None):
+        """
+        Order symbols so that the most important are fetched first - see
+        SecurityGroups.get_fetch_priority. If running with a deadline, and the rate
+        limit won't allow all of them to be fetched before it, only keeps as many as
+        will fit, deferring the lowest priority ones to the next run.
+        requestsPerSymbol is how many rate limited requests each symbol's price takes -
+        less than one if many symbols share a request. Defaults to the provider's
+        requestsPerQuote.
+        Returns: List of symbols to fetch, in order.
+        """
+        myGroups = SecurityGroups()
+        orderedSymbols = sorted(symbols, key=lambda tmpSymbol:
+                                myGroups.get_fetch_priority(self.securitiesDict[tmpSymbol]))
+
+        ratePerSecond = self.mySettings.fetch_rate_per_second
+        if self.timeLeft is not None and ratePerSecond > 0:
+            secondsAvailable = self.timeLeft() - self.mySettings.daily_update_stop_margin
+            if requestsPerSymbol is None:
+                requestsPerSymbol = self.provider.requestsPerQuote
+            maxFetches = max(0, int(secondsAvailable * ratePerSecond / requestsPerSymbol))
+            if maxFetches < len(orderedSymbols):
+                print(f"Only time to fetch {maxFetches} of {len(orderedSymbols)} prices, "
+                      f"deferring {orderedSymbols[maxFetches:]} to next run.")
+                orderedSymbols = orderedSymbols[:maxFetches]
+                self.symbolsDeferred = True
+
+        return orderedSymbols
+
     def _update_security(self, newTargetSecurity):
         """
         Compare values in given targetSecurity with values for same symbol in current
@@ -27,6 +27,16 @@ class SecuritiesInterface:
         results = dbAccess.select_data(self.securitiesTable, self.fieldNames, query)
         return results
 
+    def iter_securities(self, chunkSize=0):
+        """
+        Streaming version of get_securities - yields a dictionary for each security,
+        or lists of up to chunkSize dictionaries, without reading the whole table into
+        memory first.
+        """
+        query = "1=1"
+        return dbAccess.select_iter(self.securitiesTable, self.fieldNames, query,
+                                    chunkSize=chunkSize)
+
     def add_security(self, newSecurity):
         """
         Add given targetSecurity to table. Need to ensure that don't have existing record
@@ -45,7 +55,7 @@ class SecuritiesInterface:
             fieldValues[1] = mySymbol
             fieldValues[2] = newSecurity.buyPrice
             fieldValues[3] = newSecurity.sellPrice
-            fieldValues[4] = "N"
+            fieldValues[4] = False
 
             # Need to nest the list so that connector recognizes that adding one record
             # with five values, rather than five records with one value each.
@@ -74,6 +84,17 @@ class SecuritiesInterface:
 
         return updatedOk
 
+    def update_securities_bulk(self, fieldNames, rows):
+        """
+        Update many securities with one statement. Each row is a security id followed by
+        values for the given fields. Since this is an upsert, fields must include name
+        and symbol, which are required if a row ends up being inserted.
+        """
+        numAffected = dbAccess.upsert_many(self.securitiesTable, ["id"], fieldNames, rows)
+        print(f"update_securities_bulk for {len(rows)} securities affected {numAffected} rows.")
+
+        return numAffected > -1
+
     def delete_security(self, deleteId):
         """
         Try to delete security for given id.
@@ -95,6 +116,17 @@ class SecuritiesInterface:
         """
         return self.update_security(securityId, ["fullHistoryDownloaded"], [True])
 
+    def mark_historical_data_retrieved_many(self, securityIds):
+        """
+        Flag all given securities as having their historical data downloaded, with
+        one statement. Returns False if the update failed.
+        """
+        query = "id IN (" + ", ".join(str(int(securityId)) for securityId in securityIds) + ")"
+        numUpdated = dbAccess.update_data(self.securitiesTable, ["fullHistoryDownloaded"],
+                                          [True], query)
+
+        return numUpdated > -1
+
     def reset_daily_prices(self):
         """
         Clean up table so that can run daily price update again. Here, just reset the
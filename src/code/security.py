@@ -277,6 +277,21 @@ class Security:
 
         return changedFields, newValues
 
+    def get_daily_update_fields(self, newPriceInfo, currentDate):
+        """
+        Return every securities table field that a daily price update writes, with its
+        new value, in parallel names and values lists. Unlike get_changed_fields, the
+        list is the same for every security, so that updates can be sent as one batch.
+        Name and symbol are included because a batch update is an upsert.
+        """
+        fieldNames = ["name", "symbol", "currentPrice", "currentPriceDate",
+                      "previousClosePrice", "52WeekLowPrice", "52WeekHighPrice"]
+        newValues = [self.name, self.symbol, newPriceInfo.currentPrice, currentDate,
+                     newPriceInfo.lastClosePrice, newPriceInfo.low52Week,
+                     newPriceInfo.high52Week]
+
+        return fieldNames, newValues
+
     def update_values(self, newPriceInfo):
         """
         Copy given values to appropriate fields in current instance.
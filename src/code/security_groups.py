@@ -110,6 +110,30 @@ class SecurityGroups:
 
         return rating, group
 
+    def get_fetch_priority(self, this_security):
+        """
+        Sort key for deciding which securities to retrieve prices for first, based on
+        the last known price. Buy and sell zones first, then near buy and near sell,
+        then middle. Within buy and sell, furthest into the zone first, otherwise
+        closest to the buy or sell price first. Securities with no price yet, or with
+        no buy-sell range, come before all of them, as can't tell where they are.
+        """
+        if not this_security.currentPrice or this_security.sellPrice <= this_security.buyPrice:
+            return (0, float("-inf"))
+
+        group_code = self._get_group_code(this_security)
+        rating = float(self.rating_methods[group_code](this_security))
+        if group_code in (sprEnums.GroupCodes.buy, sprEnums.GroupCodes.sell):
+            priority = (0, -rating)
+        elif group_code == sprEnums.GroupCodes.near_buy:
+            priority = (1, rating)
+        elif group_code == sprEnums.GroupCodes.near_sell:
+            priority = (1, 1 - rating)
+        else:
+            priority = (2, min(rating, 1 - rating))
+
+        return priority
+
     def _calc_rating_buy(self, this_security):
         """
         Calculate rating for securities in the buy zone: (buy - current) / buy
@@ -4,6 +4,8 @@ V0.01, September 6, 2020, GAW.
 """
 
 import json
+import os
+import tempfile
 
 from singleton import Singleton
 
@@ -26,15 +28,50 @@ class Settings:
         self.srcTab = configData["srctab"]
 
         self.alphaBaseUrl = "https://www.alphavantage.co/query"
-        self.alphaCallDelay = 20			# Number of seconds to wait before
-                                            # calling api (to avoid going over
-                                            # req/min limit.)
+        self.alpha_rate_per_second = 0          # Alpha Vantage free tier limits. 0 = no limit.
+        self.alpha_rate_per_minute = 5
+        self.alpha_rate_per_day = 500
         self.respContName = "Global Quote"  # Name of master container in response.
         self.priceName = "05. price"		# Name of entry containing price.
         self.alphaApiTimeOut = 4
         self.alphaApiKey = self._read_setting_from_file(alphaFile)
 
-        self.yahooCallDelay = 0.5
+        self.http_pool_size = 10                # Connections kept open to each provider host.
+        self.http_retries = 2                   # Retries for connection errors and 429/5xx.
+        self.http_retry_backoff = 0.5           # Retry n waits up to backoff * 2^(n-1) seconds,
+                                                # a random time, to spread retries out.
+        self.breaker_failure_rate = 0.5         # Provider's circuit breaker opens once this
+        self.breaker_window = 20                # fraction of its last breaker_window calls
+        self.breaker_min_calls = 10             # failed, if at least breaker_min_calls made,
+        self.breaker_cool_down = 60             # refusing calls for this many seconds.
+        self.response_cache_enabled = True      # Reuse provider responses from earlier runs.
+        self.response_cache_quotes = False      # Also reuse today's quotes. Off, as prices
+                                                # change during the day, so a later run would
+                                                # get an earlier run's prices.
+        self.response_cache_dir = os.path.join(tempfile.gettempdir(), "sprResponseCache")
+        self.response_cache_ttl = 6 * 60 * 60   # Seconds a cached response stays usable.
+        self.response_cache_max_bytes = 50 * 1024 * 1024    # Least recently used removed past this.
+
+        self.price_provider = "yahoo"           # Where Securities gets prices - yahoo,
+                                                # alphavest or replay. See priceProviders.
+        self.replay_file = ""                   # Recorded responses for the replay provider.
+        self.replay_latency_scale = 1.0         # Replayed responses take recorded time * this.
+        self.fetch_workers = 4                  # Threads fetching daily prices at once. 1 = serial.
+        self.fetch_rate_per_second = 2          # Max price requests started per second, across
+                                                # all threads. 0 = no limit.
+        self.yahoo_rate_per_minute = 0          # Max Yahoo requests per minute. 0 = no limit.
+        self.yahoo_rate_per_day = 0             # Max Yahoo requests per day, per process.
+        self.yahooQuoteUrl = "https://finance.yahoo.com/quote/"
+        self.yahooChartUrl = "https://query1.finance.yahoo.com/v8/finance/chart/"
+        self.yahooBatchQuoteUrl = "https://query1.finance.yahoo.com/v7/finance/quote"
+        self.yahooApiTimeOut = 10               # Seconds to wait for each async request.
+        self.async_fetch = False                # Retrieve daily prices with asyncio, not threads.
+        self.async_fetch_limit = 10             # Max async price requests in flight at once.
+        self.batch_quotes = False               # Retrieve daily prices many symbols per request.
+        self.yahoo_quote_batch_size = 100       # Symbols per multi-symbol quote request.
+        self.benchmark_latency = 0.02           # Seconds each fake provider request takes (-b.)
+        self.benchmark_error_rate = 0.01        # Fraction of fake provider requests that fail.
+        self.benchmark_db_path = ":memory:"     # SQLite db for benchmark. Best left in memory.
         self.errFile = "errors.txt"
 
         self.websiteUrl = self._read_setting_from_file(websiteUrlFile)
@@ -50,6 +87,13 @@ class Settings:
         self.rds_port = "3306"
         self.rds_db_name = dbParams["Parameters"]["DbName"]
         self.rds_user_name = dbParams["Parameters"]["DbUserSR"]
+        self.rds_pool_size = 2                  # Max idle connections kept between invocations.
+        self.rds_token_lifetime = 15 * 60       # IAM auth tokens are valid for 15 minutes.
+        self.rds_token_refresh_margin = 60      # Get a new token this many seconds before expiry.
+        self.db_backend = "mysql"               # "mysql" for RDS, or "sqlite" for a local db.
+        self.sqlite_path = ":memory:"           # SQLite db file, or ":memory:" for in memory.
+        self.db_instrumentation = False         # Time every statement, print summary per run.
+        self.db_slow_query_seconds = 1.0        # With instrumentation, log statements this slow.
 
         self.db_daily_history_code = "DAY"
         self.db_weekly_history_code = "WEEK"
@@ -63,6 +107,15 @@ class Settings:
         # weekly prices for 265 weeks - just over 5 years.
         self.daily_price_days_to_keep = 100
         self.weekly_price_weeks_to_keep = 265
+        self.daily_price_batch_size = 50        # Securities saved per commit in daily update.
+        self.pipeline_queue_size = 100          # Max prices waiting between daily pipeline stages.
+        self.history_batch_size = 20            # Securities saved per commit in history backfill.
+        self.daily_update_stop_margin = 60      # Stop new work with this many seconds left.
+        self.lambda_max_resumes = 3             # Times lambda can invoke itself to finish update.
+        self.daily_update_shards = 8            # Number of shards for sharded update.
+        self.daily_update_shard_workers = 4     # Worker processes for local sharded update.
+        self.shard_queue_timeout = 5            # Seconds worker waits for a shard before stopping.
+        self.shard_wait_timeout = 900           # Seconds reducer waits for each shard's result.
         self.daily_price_code = "1d"
         self.weekly_price_code = "1wk"
 
@@ -0,0 +1,176 @@
+"""
+Sharded daily update. A coordinator splits the securities into shards by symbol, workers
+each run the daily price update for one shard, and a reducer, once they have all reported
+back, does the parts that cover every security - weekly prices, grooming and the email.
+Coordinator, workers and reducer only talk through queues of plain dictionaries, so the
+local queues here can be swapped for a hosted queue to spread workers across machines.
+V0.01, October 18, 2026
+"""
+
+from datetime import date
+import multiprocessing
+import queue
+import zlib
+
+import daily_email
+import rateLimiter
+from securities import Securities
+import settings
+from utilsInterface import UtilsInterface
+
+
+class LocalQueue:
+    """
+    Queue for coordinator, workers and reducer running in one process.
+    """
+
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def put(self, message):
+        self.messages.put(message)
+
+    def get(self, timeout=None):
+        """
+        Return next message, or None if none arrives within timeout seconds.
+        """
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class ProcessQueue(LocalQueue):
+    """
+    Queue shared with worker processes - each process has its own database connection,
+    so workers can run in parallel.
+    """
+
+    def __init__(self, mpContext):
+        self.messages = mpContext.Queue()
+
+
+def get_shard(symbol, numShards):
+    """
+    Shard that given symbol belongs to. Uses crc32 rather than hash, which is salted
+    differently in each process.
+    """
+    return zlib.crc32(symbol.encode()) % numShards
+
+
+def coordinate(taskQueue, numShards, currentDate):
+    """
+    Coordinator - split the securities in the database into shards, and queue a task
+    for each shard that has any securities.
+    Returns: Number of tasks queued.
+    """
+    mySecurities = Securities()
+    mySecurities.utilsInter.connect()
+    mySecurities.load()
+    mySecurities.utilsInter.disconnect()
+
+    shards = [[] for shardNum in range(numShards)]
+    for symbol in mySecurities.securitiesDict:
+        shards[get_shard(symbol, numShards)].append(symbol)
+
+    numTasks = 0
+    for shardNum, symbols in enumerate(shards):
+        if len(symbols) > 0:
+            taskQueue.put({"shard": shardNum,
+                           "currentDate": currentDate.isoformat(),
+                           "symbols": symbols})
+            numTasks += 1
+    print(f"coordinate queued {numTasks} shards of {len(mySecurities.securitiesDict)} securities.")
+
+    return numTasks
+
+
+def work(taskQueue, resultQueue, timeout):
+    """
+    Worker - run the daily price update for each shard taken from taskQueue, reporting
+    each to resultQueue, until taskQueue has been empty for timeout seconds.
+    A shard that fails is reported as not saved, rather than stopping the worker.
+    Returns: Number of shards worked on.
+    """
+    numShards = 0
+    task = taskQueue.get(timeout)
+    while task is not None:
+        result = {"shard": task["shard"], "numUpdated": 0, "allSaved": False}
+        try:
+            mySecurities = Securities()
+            result["numUpdated"] = mySecurities.do_shard_price_update(
+                task["symbols"], date.fromisoformat(task["currentDate"]))
+            result["allSaved"] = mySecurities.dailyPricesAllSaved
+        except Exception as E:
+            print(f"work failed on shard {task['shard']}, {E=}")
+        resultQueue.put(result)
+        numShards += 1
+        task = taskQueue.get(timeout)
+
+    return numShards
+
+
+def reduce(resultQueue, numTasks, currentDate, timeout):
+    """
+    Reducer - wait for every shard's result, then save weekly prices and groom, and
+    send the email, if every shard reported in.
+    Returns: Number of securities updated across all shards, or None if a shard
+    didn't report in time, in which case nothing else is done.
+    """
+    mySettings = settings.Settings.instance()
+    results = []
+    while len(results) < numTasks:
+        result = resultQueue.get(timeout)
+        if result is None:
+            print(f"reduce only received {len(results)} of {numTasks} shards, giving up.")
+            return None
+        results.append(result)
+
+    allSaved = all(result["allSaved"] for result in results)
+    numUpdated = sum(result["numUpdated"] for result in results)
+    mySecurities = Securities()
+    mySecurities.finish_daily_updates(currentDate, allSaved)
+    daily_email.send_for_securities(mySecurities, mySettings.resultsTopicName,
+                                    mySettings.websiteUrl)
+    print(f"reduce finished, {numUpdated} securities updated, allSaved={allSaved}")
+
+    return numUpdated
+
+
+def run_sharded_update(numShards, numWorkers, useProcesses=False, currentDate=None):
+    """
+    Run a whole sharded daily update on this machine. Workers either take turns in
+    this process, or, if useProcesses, run in parallel in numWorkers child processes,
+    which share the price providers' rate limits between them.
+    Returns: Number of securities updated, or None if a shard didn't finish.
+    """
+    mySettings = settings.Settings.instance()
+    if currentDate is None:
+        currentDate = date.today()
+
+    if useProcesses:
+        mpContext = multiprocessing.get_context("fork")
+        taskQueue = ProcessQueue(mpContext)
+        resultQueue = ProcessQueue(mpContext)
+    else:
+        taskQueue = LocalQueue()
+        resultQueue = LocalQueue()
+
+    numTasks = coordinate(taskQueue, numShards, currentDate)
+    if useProcesses:
+        UtilsInterface().close_pool()
+        workers = [mpContext.Process(target=work,
+                                     args=(taskQueue, resultQueue, mySettings.shard_queue_timeout))
+                   for workerNum in range(numWorkers)]
+        # Each worker has its own rate limiters, so each gets its share of the limits.
+        with rateLimiter.split_between(mySettings, numWorkers):
+            for worker in workers:
+                worker.start()
+        numUpdated = reduce(resultQueue, numTasks, currentDate, mySettings.shard_wait_timeout)
+        for worker in workers:
+            worker.join()
+    else:
+        work(taskQueue, resultQueue, 0)
+        numUpdated = reduce(resultQueue, numTasks, currentDate, 0)
+
+    return numUpdated
@@ -25,6 +25,7 @@ import socket
 import matplotlib.pyplot as plt
 import requests
 
+import benchmark
 import daily_email
 import databaseUtils
 from progArgs import ProgArgs
@@ -33,6 +34,7 @@ import retrievePrices
 import securities
 import security_groups
 import settings
+import shardedUpdate
 from sprEnums import Action
 import stockTarget
 import utilsInterface
@@ -194,6 +196,9 @@ def display_help():
     # Not showing this option as it requires an AlphaVest api key.
     # print("\t-l 'stock name' to look up a symbol,")
     print("\t-e to retrieve prices and send email, for symbols in database.")
+    print("\t-s as -e, but with symbols split between several worker processes.")
+    print("\t-b number to benchmark -e for that many made up securities, with a fake")
+    print("\t   price provider and a local database.")
     print("\t-g 'filename' to display results from a file,")
     print("\t-f 'filename' to retrieve and display results for symbols in a file.")
     print("\t-d to create or update structure of tables in database.")
@@ -201,7 +206,7 @@ def display_help():
     print("\t-r to retrieve latest prices for symbols in database.")
     print("\t-c to clear any prices that were updated today, so can re-run daily price update.")
     # Not showing this option as it requires an AlphaVest api key.
-    # print("\t-p yahoo/alpha to specify which provider to retrieve prices from.")
+    # print("\t-p yahoo/alpha/replay to specify which provider to retrieve prices from.")
     print("\t-n no display - don't display graphs after retrieving prices.")
     print("\t-h display this help information.")
     print("0 arguments results in retrieving results for symbols in the default")
@@ -236,6 +241,13 @@ if __name__ == "__main__":
         _reset_daily_prices()
     elif myArgs.action == Action.dailyEmail:
         daily_email.send_from_db(mysettings.resultsTopicName, mysettings.websiteUrl)
+    elif myArgs.action == Action.shardedEmail:
+        shardedUpdate.run_sharded_update(mysettings.daily_update_shards,
+                                         mysettings.daily_update_shard_workers,
+                                         useProcesses=True)
+    elif myArgs.action == Action.benchmark:
+        results, pipelineCounters = benchmark.run_benchmark(myArgs.numSecurities)
+        benchmark.print_benchmark(myArgs.numSecurities, results, pipelineCounters)
     elif myArgs.action == Action.retrieve:
         myResultsFile = resultsFile.ResultsFile(mysettings.bucketName, mysettings.resultsPrefix)
         res_file = retrievePrices.retrieve_prices_from_file(myArgs.srcFile,
@@ -243,7 +255,7 @@ if __name__ == "__main__":
                                                             myArgs.priceProvider,
                                                             mysettings,
                                                             myResultsFile)
-        if myArgs.display:
+        if myArgs.display and res_file is not None:
             display_graphs(res_file, myResultsFile)
     elif myArgs.action == Action.loadNew:
         _load_new_file(myArgs.srcFile, myArgs.srcTab)
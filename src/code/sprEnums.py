@@ -19,6 +19,8 @@ class Action(Enum):
     retrieveDb = 7      # Retrieve prices for symbols in database
     clearDaily = 8      # Reset database so can re-run daily price ipmort.
     dailyEmail = 9      # Download prices and send email.
+    shardedEmail = 10   # As dailyEmail, but with securities split across worker processes.
+    benchmark = 11      # Run daily update against fake provider and local db, report timings.
 
 class PriceProvider(Enum):
     """
@@ -26,6 +28,17 @@ class PriceProvider(Enum):
     """
     alphavest = 1
     yahoo = 2
+    replay = 3          # Recorded responses, from settings.replay_file.
+
+
+class ResultMode(Enum):
+    """
+    Shapes that dbAccess.select_data can return results in.
+    """
+    dicts = 1           # List of dictionaries, one per row, keyed by column name.
+    tuples = 2          # List of tuples, one per row, values in order fields requested.
+    columns = 3         # Dictionary of column name: list of values.
+    arrays = 4          # As columns, but numeric (decimal/float) columns are NumPy arrays.
 
 
 class GroupCodes(Enum):
@@ -49,6 +62,16 @@ class timePeriods(Enum):
     years3 = 365 * 3
     years5 = 365 * 5
 
+
+class BreakerState(Enum):
+    """
+    States of a price provider's circuit breaker.
+    """
+    closed = 1          # Calls go through, failures counted.
+    open = 2            # Too many failures, calls refused until cool down is over.
+    halfOpen = 3        # Cool down over, one trial call allowed through.
+
+
 def get_timePeriod_from_text(timeDesc):
     """
     Convert string describing time period to appropriate enum member.
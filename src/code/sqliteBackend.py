@@ -0,0 +1,222 @@
+"""
+SQLite stand-in for RDS MySQL, used by dbAccess when settings.db_backend is "sqlite".
+Lets the database code run without a live RDS instance - either against a local file,
+or entirely in memory. Connections and cursors here accept the same MySQL flavoured sql
+that dbAccess and the interfaces generate, translating it on the way through, so
+dbAccess only needs to know which backend it has in a handful of places.
+V0.01, October 18, 2026
+"""
+
+from datetime import date
+from decimal import Decimal
+import re
+import sqlite3
+
+memoryPath = ":memory:"
+# In memory databases only live as long as a connection to them is open. To let
+# dbAccess open and close connections as it would with RDS, each in memory connection
+# is to the same named, shared cache database, and this one stays open to keep it alive.
+memoryUri = "file:spr_memory_db?mode=memory&cache=shared"
+keeperConn = None
+
+# Store dates as ISO text, which sorts and compares correctly, and decimals as text,
+# which the NUMERIC affinity of DECIMAL columns turns into numbers. Converters turn
+# both back into the types PyMySQL returns, based on the declared column type.
+sqlite3.register_adapter(date, lambda val: val.isoformat())
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter("DATE", lambda val: date.fromisoformat(val.decode()))
+sqlite3.register_converter("DECIMAL", lambda val: Decimal(val.decode()))
+
+
+class SqliteCursor(sqlite3.Cursor):
+    """
+    Cursor that translates MySQL sql before running it, and records the statement
+    in _last_executed, as PyMySQL's cursors do.
+    """
+
+    _last_executed = None
+
+    def execute(self, sqlCmd, queryParams=None):
+        self._last_executed = translate_sql(sqlCmd)
+        if queryParams is None:
+            return super().execute(self._last_executed)
+        return super().execute(self._last_executed, queryParams)
+
+    def executemany(self, sqlCmd, rows):
+        self._last_executed = translate_sql(sqlCmd)
+        return super().executemany(self._last_executed, rows)
+
+
+class SqliteDictCursor(SqliteCursor):
+    """
+    Returns each row as a dictionary keyed by column name, like PyMySQL's DictCursor.
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self.row_factory = _row_to_dict
+
+
+class SqliteConnection(sqlite3.Connection):
+    """
+    Connection whose cursors are SqliteCursors, with a ping so that dbAccess's
+    connection pool can check it the same way it checks a MySQL connection.
+    """
+
+    def cursor(self, factory=SqliteCursor):
+        return super().cursor(factory)
+
+    def ping(self, reconnect=False):
+        self.execute("SELECT 1")
+
+
+def open_connection(dbPath):
+    """
+    Open a connection to the SQLite database at given path, or to the shared in memory
+    database if path is ":memory:". Connections aren't tied to the thread that opened
+    them - dbAccess only lets one thread use a connection at a time.
+    """
+    global keeperConn
+    connArgs = {"detect_types": sqlite3.PARSE_DECLTYPES,
+                "check_same_thread": False,
+                "factory": SqliteConnection}
+    if dbPath == memoryPath:
+        if keeperConn is None:
+            keeperConn = sqlite3.connect(memoryUri, uri=True, **connArgs)
+        conn = sqlite3.connect(memoryUri, uri=True, **connArgs)
+    else:
+        conn = sqlite3.connect(dbPath, **connArgs)
+
+    return conn
+
+
+def close_memory_database():
+    """
+    Close the connection keeping the in memory database alive. Once any other
+    connections to it are closed, its tables and data are gone.
+    """
+    global keeperConn
+    if keeperConn is not None:
+        keeperConn.close()
+        keeperConn = None
+
+
+def table_exists_sql():
+    """
+    Query returning count of tables with the name given as its only parameter.
+    """
+    return "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = %s"
+
+
+def new_cursor(conn, asDict):
+    """
+    Cursor returning rows as dictionaries or tuples. SQLite cursors already step
+    through results as they are read, so there is no separate streaming version.
+    """
+    if asDict:
+        return SqliteDictCursor(conn)
+    return conn.cursor()
+
+
+def translate_create_table(tableCmd):
+    """
+    Translate a MySQL CREATE TABLE statement, as written in
+    databaseUtils._get_table_definitions, into a list of SQLite statements - the
+    CREATE TABLE itself, followed by a CREATE INDEX for each of its indexes.
+    An AUTO_INCREMENT primary key becomes an INTEGER PRIMARY KEY AUTOINCREMENT column,
+    integer types become INTEGER and table options such as ENGINE are dropped.
+    """
+    tableMatch = re.match(r"\s*CREATE TABLE\s+(`?)(\w+)\1\s*\(", tableCmd, re.IGNORECASE)
+    tableName = tableMatch.group(2)
+    bodyEnd = tableCmd.rindex(")")
+    items = _split_top_level(tableCmd[tableMatch.end():bodyEnd])
+
+    columns = []
+    indexes = []
+    primaryKey = None
+    autoIncrementCol = None
+    for item in items:
+        upperItem = item.upper()
+        if upperItem.startswith("PRIMARY KEY"):
+            primaryKey = item
+        elif upperItem.startswith(("INDEX", "KEY")):
+            indexMatch = re.match(r"(?:INDEX|KEY)\s+`?(\w+)`?\s*\((.*)\)", item, re.IGNORECASE)
+            # Index names are per database in SQLite, rather than per table.
+            indexes.append(f"CREATE INDEX {tableName}_{indexMatch.group(1)} "
+                           f"ON {tableName} ({indexMatch.group(2)})")
+        else:
+            colDef = re.sub(r"\b(TINY|SMALL|MEDIUM|BIG)?INT(EGER)?\b(\s+UNSIGNED)?", "INTEGER",
+                            item, flags=re.IGNORECASE)
+            if re.search(r"\bAUTO_INCREMENT\b", colDef, re.IGNORECASE):
+                colDef = re.sub(r"\s*\bAUTO_INCREMENT\b", "", colDef, flags=re.IGNORECASE)
+                colDef += " PRIMARY KEY AUTOINCREMENT"
+                autoIncrementCol = colDef
+            columns.append(colDef)
+
+    if primaryKey is not None and autoIncrementCol is None:
+        columns.append(primaryKey)
+
+    statements = [f"CREATE TABLE {tableName} (" + ", ".join(columns) + ")"]
+    statements.extend(indexes)
+
+    return statements
+
+
+def translate_sql(sqlCmd):
+    """
+    Translate the MySQL specific parts of sql that dbAccess generates - %s placeholders,
+    identifiers starting with a digit, inserts of an empty record and
+    ON DUPLICATE KEY UPDATE upserts. Columns in a select list are aliased to themselves,
+    since SQLite names result columns as the table declares them, where MySQL uses the
+    case the select was written in. String literals are left alone.
+    """
+    parts = re.split(r"('(?:[^'\\]|\\.|'')*')", sqlCmd)
+    selectMatch = re.match(r"(\s*SELECT\s+)(.*?)(\s+FROM\s)", parts[0], re.IGNORECASE)
+    if selectMatch is not None:
+        fieldNames = [_alias_column(field.strip()) for field in selectMatch.group(2).split(",")]
+        parts[0] = (selectMatch.group(1) + ", ".join(fieldNames) + selectMatch.group(3)
+                    + parts[0][selectMatch.end():])
+    for partNum in range(0, len(parts), 2):
+        part = parts[partNum].replace("%s", "?")
+        part = re.sub(r"(?<![`\w.])(\d+[A-Za-z_]\w*)", r"`\1`", part)
+        part = re.sub(r"\(\s*\)\s*VALUES\s*\(\s*\)", "DEFAULT VALUES", part, flags=re.IGNORECASE)
+        if re.search(r"ON DUPLICATE KEY UPDATE", part, re.IGNORECASE):
+            part = re.sub(r"ON DUPLICATE KEY UPDATE", "ON CONFLICT DO UPDATE SET", part,
+                          flags=re.IGNORECASE)
+            part = re.sub(r"\bVALUES\((`?\w+`?)\)", r"excluded.\1", part, flags=re.IGNORECASE)
+        parts[partNum] = part
+
+    return "".join(parts)
+
+
+def _split_top_level(text):
+    """
+    Split on commas that aren't inside brackets, i.e. not the one in DECIMAL(10,2).
+    """
+    items = []
+    depth = 0
+    current = ""
+    for char in text:
+        if char == "," and depth == 0:
+            items.append(current.strip())
+            current = ""
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        current += char
+    if current.strip() != "":
+        items.append(current.strip())
+
+    return items
+
+
+def _alias_column(field):
+    if re.fullmatch(r"\w+", field):
+        return f"{field} AS `{field}`"
+    return field
+
+
+def _row_to_dict(cursor, row):
+    return {colDesc[0]: value for colDesc, value in zip(cursor.description, row)}
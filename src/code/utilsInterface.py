@@ -49,6 +49,33 @@ class UtilsInterface:
             print("utilsInter is not connected, so not disconnecting.")
         self.we_connected = False
 
+    def transaction(self):
+        """
+        Context manager - database changes made in the with block are committed together
+        when it ends, or all rolled back if any of them fail.
+        """
+        return dbAccess.transaction()
+
+    def last_transaction_committed(self):
+        """
+        Did the most recently finished transaction commit?
+        """
+        return dbAccess.lastTransactionCommitted
+
+    def close_pool(self):
+        """
+        Close all idle pooled connections. Needed before forking worker processes, so
+        that they don't share the parent's connections.
+        """
+        dbAccess.close_pool()
+
+    def print_query_summary(self):
+        """
+        If query instrumentation is turned on in settings, print counts and timings for
+        each statement run since the last summary.
+        """
+        dbAccess.print_query_summary()
+
     def get_last_weekly_update_date(self):
         """
         Assumes already connected to database.
@@ -4,6 +4,8 @@ Includes logic to translate data into dictionary from security and prices.
 V0.01, December 19, 2022, GAW
 """
 
+import numpy as np
+
 from security_groups import SecurityGroups
 
 class WebPriceInfo:
@@ -27,19 +29,41 @@ class WebPriceInfo:
         """
         Convert security and array of date/price pairs to this format.
         """
+        self._populate_security(mySecurity)
+        self.periodPrices = self._get_prices_only(myPrices)
+        self.periodDates = self._get_dates(myPrices)
+        if len(myPrices) > 0:
+            self.periodStartPrice = myPrices[0]["price"]  # Price from first pair.
+            self._set_high_low_prices()
+
+    def populate_from_columns(self, mySecurity, priceColumns):
+        """
+        Convert security and columnar prices - list of dates under "priceDate" and
+        NumPy array of prices under "price", as returned by
+        HistoricalPricesInterface.get_historical_price_columns - to this format.
+        Conversions and min/max are done on whole array, rather than price by price.
+        """
+        self._populate_security(mySecurity)
+        prices = np.nan_to_num(priceColumns["price"], nan=0.0)
+        self.periodPrices = prices.tolist()
+        self.periodDates = list(priceColumns["priceDate"])
+        if len(prices) > 0:
+            self.periodStartPrice = self.periodPrices[0]
+            self.periodLowPrice = float(prices.min())
+            self.periodHighPrice = float(prices.max())
+
+    def _populate_security(self, mySecurity):
+        """
+        Copy values from security, calculate group and rating.
+        """
         self.name = mySecurity.name
         self.currentPrice = mySecurity.currentPrice
         self.lastClosePrice = mySecurity.lastClosePrice
         self.buyPrice = mySecurity.buyPrice
         self.sellPrice = mySecurity.sellPrice
         self.status = mySecurity.status
-        self.periodPrices = self._get_prices_only(myPrices)
-        self.periodDates = self._get_dates(myPrices)
         myGroups = SecurityGroups()
         self.rating, self.group = myGroups.get_values_for_webPriceInfo(self)
-        if len(myPrices) > 0:
-            self.periodStartPrice = myPrices[0]["price"]  # Price from first pair.
-            self._set_high_low_prices()
 
     def getDict(self):
         """
@@ -3,47 +3,106 @@ Retrieving data from yahoo
 V0.01, December 7, 2022, GAW.
 """
 
+import asyncio
+from datetime import date, datetime, timedelta
+import html
+from io import StringIO
 import math
-import sys
-import time
-from urllib.error import HTTPError
+import re
 
-from yahoo_fin.stock_info import get_quote_table, get_data
+import aiohttp
+import pandas as pd
+import requests
 
+import circuitBreaker
+import httpSession
+import rateLimiter
+import responseCache
 import security
+import settings
+
+yahooHeaders = {'User-agent': 'Mozilla/5.0'}
+# Quote page attributes used, and the value cells of the page's own quote summary
+# table that hold them. Json embedded in the page also has quotes for other symbols,
+# such as the indices in the header, so isn't used.
+quoteCellPatterns = {
+    "Previous Close": re.compile(r'<td[^>]*data-test="PREV_CLOSE-value"[^>]*>(.*?)</td>',
+                                 re.DOTALL),
+    "52 Week Range": re.compile(r'<td[^>]*data-test="FIFTY_TWO_WK_RANGE-value"[^>]*>(.*?)</td>',
+                                re.DOTALL)}
+# Label and value cells in a quote page table row, and any tags within them.
+quoteRowPattern = re.compile(r"<td[^>]*>(.*?)</td>\s*<td[^>]*>(.*?)</td>", re.DOTALL)
+tagPattern = re.compile(r"<[^>]+>")
+# PriceInfo fields saved in the response cache.
+priceInfoFields = ["currentPrice", "lastClosePrice", "low52Week", "high52Week"]
 
 
 def retrieve_daily_data(symbol, mysettings):
     """
     Return current price for given stock, 0 if hit an error.
-    Note that am using Yahoo Finance to retrieve prices.
-    Also note that appears that if request a symbol that they don't recognize, they return
-    an empty Global Quote object.
+    Note that am using Yahoo Finance to retrieve prices - previous close and 52 week
+    range from the quote page, and current price from the latest close in the chart,
+    as yahoo_fin's get_quote_table did.
+    Requests go through the shared http session, which keeps connections open, and
+    failures are retried with jittered backoff, unless Yahoo's circuit breaker is open.
+    Safe to call from several threads at once - calls are kept within Yahoo's limits
+    by the shared rate limiter, rather than each sleeping for a fixed delay.
+    Prices retrieved earlier today come from the response cache, if it is on.
     """
-    time.sleep(mysettings.yahooCallDelay)
     yahooSymbol = get_yahoo_ticker(symbol)
+    priceInfo = _get_cached_price(yahooSymbol, mysettings)
+    if priceInfo is not None:
+        return priceInfo
     priceInfo = security.PriceInfo()
+    now = datetime.now()
+    chartParams = _get_chart_params(now - timedelta(days=10), now + timedelta(days=10), "1d")
 
-    # Try up to three times if fail.
-    for i in range(0, 3):
-        try:
-            quote_table = get_quote_table(yahooSymbol)
-            priceInfo.currentPrice = round(float(quote_table['Quote Price']), 2)
-            priceInfo.lastClosePrice = round(float(quote_table['Previous Close']), 2)
-            low, high = _split_price_range(quote_table['52 Week Range'])
-            priceInfo.low52Week = low
-            priceInfo.high52Week = high
-            break
-        except (ValueError, IndexError, ImportError, HTTPError) as E:
-            print("retrieve_daily_data failed to retrieve price for ", yahooSymbol)
-            print(f"{E=}")
-            if E.args[0] == "No tables found" or E.args[0] == "list index out of range":
-                break
-            E = sys.exc_info()[0]
-            print(f"exc_info, {E=}")
+    def fetch():
+        return (_get_text(mysettings.yahooQuoteUrl + yahooSymbol, {"p": yahooSymbol}, mysettings),
+                _get_json(mysettings.yahooChartUrl + yahooSymbol, chartParams, mysettings))
+
+    try:
+        quoteHtml, chartData = httpSession.call_with_retries("yahoo", mysettings, fetch)
+        priceInfo = _get_page_price_info(_parse_quote_page(quoteHtml), chartData)
+        _cache_price(yahooSymbol, priceInfo, mysettings)
+    except (ValueError, IndexError, KeyError, TypeError) as E:
+        # Page or data not in expected format, generally means symbol not found.
+        print("retrieve_daily_data failed to retrieve price for ", yahooSymbol)
+        print(f"{E=}")
+    except (requests.exceptions.RequestException, circuitBreaker.CircuitOpenError) as E:
+        print("retrieve_daily_data failed to retrieve price for ", yahooSymbol)
+        print(f"{E=}")
 
     return priceInfo
 
+def retrieve_daily_data_many(symbols, mysettings):
+    """
+    Return current prices for all given symbols, asking Yahoo's multi-symbol quote api
+    for up to yahoo_quote_batch_size symbols per request. Any symbol missing from the
+    response, or in a batch whose request failed, falls back to retrieve_daily_data.
+    Symbols in the response cache aren't requested at all.
+    Returns list of (symbol, PriceInfo) pairs, in the same order as symbols.
+    """
+    batchSize = mysettings.yahoo_quote_batch_size
+    prices = {}
+    for symbol in symbols:
+        priceInfo = _get_cached_price(get_yahoo_ticker(symbol), mysettings)
+        if priceInfo is not None:
+            prices[symbol] = priceInfo
+    numCached = len(prices)
+    toRequest = [symbol for symbol in symbols if symbol not in prices]
+    for start in range(0, len(toRequest), batchSize):
+        batch = toRequest[start:start + batchSize]
+        prices.update(_retrieve_quote_batch(batch, mysettings))
+
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    print(f"retrieve_daily_data_many got {numCached} of {len(symbols)} prices from the cache, "
+          f"{len(prices) - numCached} from batch quotes, retrieving {len(missing)} one at a time.")
+    for symbol in missing:
+        prices[symbol] = retrieve_daily_data(symbol, mysettings)
+
+    return [(symbol, prices[symbol]) for symbol in symbols]
+
 def retrieve_historical_prices(symbol, oldestDate, newestDate, priceFrequency):
     """
     Retrieve historical prices for requested symbol, over requested time period,
@@ -55,38 +114,145 @@ def retrieve_historical_prices(symbol, oldestDate, newestDate, priceFrequency):
     last 5 days, will get the price for the previous day plus the price for the previous
     Monday, as the interval includes the thursday and Friday from the previous week.
     Returns list of date/price pairs.
+    Safe to call from several threads at once - shares the rate limiter and http
+    session with retrieve_daily_data. Uses the response cache, if it is on.
     """
+    mysettings = settings.Settings.instance()
     yahooSymbol = get_yahoo_ticker(symbol)
+    cacheKey = responseCache.make_key("yahoo", yahooSymbol, priceFrequency, oldestDate, newestDate)
+    pairs = _get_cached_history(cacheKey, mysettings)
+    if pairs is not None:
+        return pairs
     srcData = None
-    for i in range(0, 2):
+    chartParams = _get_chart_params(oldestDate, newestDate, priceFrequency)
+    try:
+        srcData = httpSession.call_with_retries(
+            "yahoo", mysettings,
+            lambda: _get_json(mysettings.yahooChartUrl + yahooSymbol, chartParams, mysettings))
+    except (requests.exceptions.RequestException, circuitBreaker.CircuitOpenError,
+            ValueError) as E:
+        # Includes symbol not found.
+        print("retrieve_historical_prices failed to retrieve price for ", yahooSymbol)
+        print(f"{E=}")
+
+    pairs = []
+    if not (srcData is None):
+        pairs = _get_chart_pairs(srcData, yahooSymbol)
+        _cache_history(cacheKey, pairs, mysettings)
+        print(f"retrieve_historical_prices is returning {len(pairs)} prices.")
+
+    return pairs
+
+async def retrieve_daily_data_many_async(symbols, mysettings):
+    """
+    Retrieve current prices for all given symbols, with up to async_fetch_limit
+    requests in flight at once, so that time spent waiting on Yahoo overlaps.
+    Returns list of (symbol, PriceInfo) pairs, in the same order as symbols.
+    """
+    semaphore = asyncio.Semaphore(mysettings.async_fetch_limit)
+    timeout = aiohttp.ClientTimeout(total=mysettings.yahooApiTimeOut)
+    async with aiohttp.ClientSession(timeout=timeout, headers=yahooHeaders) as session:
+        pending = [retrieve_daily_data_async(session, semaphore, symbol, mysettings)
+                   for symbol in symbols]
+        prices = await asyncio.gather(*pending)
+
+    return list(zip(symbols, prices))
+
+async def retrieve_daily_data_async(session, semaphore, symbol, mysettings):
+    """
+    Async version of retrieve_daily_data, using given aiohttp session. Semaphore
+    limits how many requests are in flight at once, the shared rate limiter how
+    often each of its two requests starts. Connection errors, and responses that mean
+    try again later, are retried up to http_retries times, with jittered backoff,
+    unless Yahoo's circuit breaker opens. Returns PriceInfo, with currentPrice of 0 if
+    hit an error.
+    """
+    yahooSymbol = get_yahoo_ticker(symbol)
+    priceInfo = _get_cached_price(yahooSymbol, mysettings)
+    if priceInfo is not None:
+        return priceInfo
+    priceInfo = security.PriceInfo()
+    # Current price is the latest close in the chart, as in yahoo_fin's get_live_price,
+    # but only asking for the last few days.
+    now = datetime.now()
+    chartParams = _get_chart_params(now - timedelta(days=10), now + timedelta(days=10), "1d")
+
+    for retryNum in range(0, mysettings.http_retries + 1):
+        await _backoff_async(retryNum, mysettings)
         try:
-            srcData = get_data(yahooSymbol, start_date=oldestDate,
-                               end_date=newestDate, interval=priceFrequency)
+            async with semaphore:
+                quoteHtml = await _get_text_async(session, mysettings.yahooQuoteUrl + yahooSymbol,
+                                                  {"p": yahooSymbol}, mysettings)
+                chartData = await _get_json_async(session, mysettings.yahooChartUrl + yahooSymbol,
+                                                  chartParams, mysettings)
+            priceInfo = _get_page_price_info(_parse_quote_page(quoteHtml), chartData)
+            _cache_price(yahooSymbol, priceInfo, mysettings)
             break
-        except (AssertionError, KeyError) as E:
-            # Generally means symbol not found, so no point retrying.
-            print("retrieve_historical_prices failed to retrieve price for ", yahooSymbol)
+        except (ValueError, IndexError, KeyError, TypeError) as E:
+            # Page or data not in expected format, generally means symbol not found,
+            # so no point retrying.
+            print("retrieve_daily_data_async failed to retrieve price for ", yahooSymbol)
             print(f"{E=}")
-            E = sys.exc_info()[0]
-            print(f"exc_info, {E=}")
+            priceInfo = security.PriceInfo()
             break
-        except (IndexError, ImportError, HTTPError) as E:
-            print("retrieve_historical_prices failed to retrieve price for ", yahooSymbol)
-            print(E)
-            E = sys.exc_info()[0]
-            print(E)
+        except (aiohttp.ClientError, asyncio.TimeoutError, circuitBreaker.CircuitOpenError) as E:
+            print("retrieve_daily_data_async failed to retrieve price for ", yahooSymbol)
+            print(f"{E=}")
+            if not _is_retryable(E):
+                break
+
+    return priceInfo
+
+async def retrieve_historical_prices_async(session, semaphore, symbol, oldestDate, newestDate,
+                                           priceFrequency, mysettings):
+    """
+    Async version of retrieve_historical_prices, using given aiohttp session and
+    semaphore, retrying as retrieve_daily_data_async does. Returns list of date/price
+    pairs, in the same format.
+    """
+    yahooSymbol = get_yahoo_ticker(symbol)
+    cacheKey = responseCache.make_key("yahoo", yahooSymbol, priceFrequency, oldestDate, newestDate)
+    pairs = _get_cached_history(cacheKey, mysettings)
+    if pairs is not None:
+        return pairs
+    srcData = None
+    for retryNum in range(0, mysettings.http_retries + 1):
+        await _backoff_async(retryNum, mysettings)
+        try:
+            async with semaphore:
+                srcData = await _get_json_async(session, mysettings.yahooChartUrl + yahooSymbol,
+                                                _get_chart_params(oldestDate, newestDate,
+                                                                  priceFrequency),
+                                                mysettings)
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, circuitBreaker.CircuitOpenError) as E:
+            # A response error generally means symbol not found, so no point retrying.
+            print("retrieve_historical_prices_async failed to retrieve price for ", yahooSymbol)
+            print(f"{E=}")
+            if not _is_retryable(E):
+                break
 
     pairs = []
     if not (srcData is None):
-        for dateVal in srcData.index:
-            # If the Monday is a holiday, interface appears to return a record, but
-            # with nan as the value - don't want to save.
-            if not (math.isnan(srcData.adjclose[dateVal])):
-                pairs.append((dateVal, srcData.adjclose[dateVal]))
-        print(f"retrieve_historical_prices is returning {len(pairs)} prices.")
+        pairs = _get_chart_pairs(srcData, yahooSymbol)
+        _cache_history(cacheKey, pairs, mysettings)
+        print(f"retrieve_historical_prices_async is returning {len(pairs)} prices.")
 
     return pairs
 
+def get_limiter(mysettings):
+    """
+    Return the rate limiter shared by all threads and coroutines calling Yahoo, so the
+    rate limit is global.
+    """
+    return rateLimiter.get_limiter("yahoo", mysettings)
+
+def get_breaker(mysettings):
+    """
+    Return the circuit breaker shared by all threads and coroutines calling Yahoo.
+    """
+    return circuitBreaker.get_breaker("yahoo", mysettings)
+
 def get_yahoo_ticker(symbol):
     """
     Convert from Alphavest symbol to Yahoo symbol.
@@ -102,6 +268,265 @@ def get_yahoo_ticker(symbol):
     return yTicker
 
 
+def _retrieve_quote_batch(symbols, mysettings):
+    """
+    One request to the multi-symbol quote api.
+    Returns dictionary of symbol: PriceInfo, for just the symbols that came back with
+    all the fields needed, or empty if the request failed.
+    """
+    yahooSymbols = {get_yahoo_ticker(symbol): symbol for symbol in symbols}
+    prices = {}
+    quoteParams = {"symbols": ",".join(yahooSymbols)}
+    try:
+        response = httpSession.call_with_retries(
+            "yahoo", mysettings,
+            lambda: _get_json(mysettings.yahooBatchQuoteUrl, quoteParams, mysettings))
+        quotes = response["quoteResponse"]["result"]
+    except (requests.exceptions.RequestException, circuitBreaker.CircuitOpenError,
+            ValueError, KeyError, TypeError) as E:
+        print(f"_retrieve_quote_batch failed to retrieve {len(symbols)} prices.")
+        print(f"{E=}")
+        return prices
+
+    for quote in quotes:
+        symbol = yahooSymbols.get(quote.get("symbol"))
+        if symbol is not None:
+            priceInfo = _get_quote_price_info(quote)
+            if priceInfo is not None:
+                prices[symbol] = priceInfo
+                _cache_price(quote["symbol"], priceInfo, mysettings)
+
+    return prices
+
+
+def _get_quote_price_info(quote):
+    """
+    PriceInfo from one result from the multi-symbol quote api, or None if any of the
+    fields needed are missing.
+    """
+    try:
+        priceInfo = security.PriceInfo()
+        priceInfo.currentPrice = round(float(quote["regularMarketPrice"]), 2)
+        priceInfo.lastClosePrice = round(float(quote["regularMarketPreviousClose"]), 2)
+        priceInfo.low52Week = round(float(quote["fiftyTwoWeekLow"]), 2)
+        priceInfo.high52Week = round(float(quote["fiftyTwoWeekHigh"]), 2)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+    return priceInfo
+
+
+def _get_cached_price(yahooSymbol, mysettings):
+    """
+    Today's PriceInfo for symbol from the response cache, or None if not there, or
+    quotes aren't being cached.
+    """
+    myCache = responseCache.get_quote_cache(mysettings)
+    if myCache is None:
+        return None
+    value = myCache.get(responseCache.make_key("yahoo", yahooSymbol, "quote", date.today()))
+    if value is None:
+        return None
+    priceInfo = security.PriceInfo()
+    for fieldName in priceInfoFields:
+        setattr(priceInfo, fieldName, value[fieldName])
+
+    return priceInfo
+
+
+def _cache_price(yahooSymbol, priceInfo, mysettings):
+    """
+    Save today's PriceInfo for symbol in the response cache, if caching quotes.
+    Failures aren't saved, so they are tried again.
+    """
+    myCache = responseCache.get_quote_cache(mysettings)
+    if myCache is not None and priceInfo.currentPrice > 0:
+        myCache.put(responseCache.make_key("yahoo", yahooSymbol, "quote", date.today()),
+                    {fieldName: getattr(priceInfo, fieldName) for fieldName in priceInfoFields})
+
+
+def _get_cached_history(cacheKey, mysettings):
+    """
+    Date/price pairs from the response cache, or None if not there, or the cache is off.
+    """
+    myCache = responseCache.get_cache(mysettings)
+    if myCache is None:
+        return None
+    value = myCache.get(cacheKey)
+    if value is None:
+        return None
+
+    return [(pd.Timestamp(priceDate), price) for priceDate, price in value]
+
+
+def _cache_history(cacheKey, pairs, mysettings):
+    myCache = responseCache.get_cache(mysettings)
+    if myCache is not None and len(pairs) > 0:
+        myCache.put(cacheKey, [(priceDate.isoformat(), float(price)) for priceDate, price in pairs])
+
+
+def _get_chart_params(oldestDate, newestDate, priceFrequency):
+    """
+    Query parameters for Yahoo's chart api, as yahoo_fin builds them.
+    """
+    return {"period1": int(pd.Timestamp(oldestDate).timestamp()),
+            "period2": int(pd.Timestamp(newestDate).timestamp()),
+            "interval": priceFrequency.lower(),
+            "events": "div,splits"}
+
+
+async def _backoff_async(retryNum, mysettings):
+    if retryNum > 0:
+        await asyncio.sleep(circuitBreaker.get_backoff_delay(retryNum,
+                                                             mysettings.http_retry_backoff))
+
+
+def _is_retryable(E):
+    """
+    Is exception from an async request worth retrying - a connection error, timeout
+    or response meaning try again later, rather than a bad symbol or open breaker?
+    """
+    if isinstance(E, aiohttp.ClientResponseError):
+        return E.status in circuitBreaker.failureStatuses
+
+    return isinstance(E, (aiohttp.ClientError, asyncio.TimeoutError))
+
+
+def _get_text(url, params, mysettings):
+    r = httpSession.get("yahoo", mysettings, url, params=params, headers=yahooHeaders,
+                        timeout=mysettings.yahooApiTimeOut)
+    r.raise_for_status()
+    return r.text
+
+
+def _get_json(url, params, mysettings):
+    r = httpSession.get("yahoo", mysettings, url, params=params, headers=yahooHeaders,
+                        timeout=mysettings.yahooApiTimeOut)
+    r.raise_for_status()
+    return r.json()
+
+
+async def _get_text_async(session, url, params, mysettings):
+    return await _get_async(session, url, params, mysettings, lambda x: x.text())
+
+
+async def _get_json_async(session, url, params, mysettings):
+    return await _get_async(session, url, params, mysettings,
+                            lambda x: x.json(content_type=None))
+
+
+async def _get_async(session, url, params, mysettings, readResponse):
+    """
+    Async GET through given aiohttp session, as httpSession.get does for the shared
+    session - only if Yahoo's circuit breaker allows it, after waiting for the rate
+    limiter, recording whether Yahoo answered. readResponse gets the body from the
+    response.
+    """
+    breaker = get_breaker(mysettings)
+    breaker.reject_if_open()
+    await get_limiter(mysettings).wait_async()
+    if not breaker.allow_request():
+        raise circuitBreaker.CircuitOpenError("yahoo circuit breaker is open.")
+    try:
+        async with session.get(url, params=params, raise_for_status=True) as response:
+            body = await readResponse(response)
+    except aiohttp.ClientResponseError as E:
+        breaker.record(E.status not in circuitBreaker.failureStatuses)
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        breaker.record(False)
+        raise
+    breaker.record(True)
+
+    return body
+
+
+def _get_page_price_info(quoteTable, chartData):
+    """
+    PriceInfo from a parsed quote page and chart data - current price is the latest
+    close in the chart.
+    """
+    priceInfo = security.PriceInfo()
+    closes = chartData["chart"]["result"][0]["indicators"]["quote"][0]["close"]
+    priceInfo.currentPrice = round(float(closes[-1]), 2)
+    priceInfo.lastClosePrice = round(float(str(quoteTable['Previous Close']).replace(",", "")), 2)
+    low, high = _split_price_range(str(quoteTable['52 Week Range']))
+    priceInfo.low52Week = low
+    priceInfo.high52Week = high
+
+    return priceInfo
+
+
+def _get_chart_pairs(srcData, yahooSymbol):
+    """
+    Date/price pairs from chart data, using adjusted closes, with dates floored to the
+    day, as yahoo_fin's get_data did.
+    """
+    pairs = []
+    try:
+        chartResult = srcData["chart"]["result"][0]
+        dates = pd.to_datetime(chartResult["timestamp"], unit="s").floor("D")
+        adjCloses = chartResult["indicators"]["adjclose"][0]["adjclose"]
+    except (KeyError, IndexError, TypeError) as E:
+        print("_get_chart_pairs received unexpected data for ", yahooSymbol)
+        print(f"{E=}")
+        dates, adjCloses = [], []
+    for dateVal, price in zip(dates, adjCloses):
+        # Holidays can come back as a record with no price - don't want to save.
+        if price is not None and not math.isnan(price):
+            pairs.append((dateVal, price))
+
+    return pairs
+
+
+def _parse_quote_page(quoteHtml):
+    """
+    Given html for a Yahoo quote page, return dictionary with the two attributes used
+    from it - Previous Close and 52 Week Range - as strings. Looks for them in the
+    value cells of the quote summary table, then in table rows labelled with them,
+    stopping once both are found, rather than having pandas build every table on the
+    page. Only if that fails, maybe because the page layout has changed, falls back to
+    _parse_quote_tables. Raises ValueError if the page has neither.
+    """
+    quoteTable = {}
+    for attribute, pattern in quoteCellPatterns.items():
+        match = pattern.search(quoteHtml)
+        if match is not None:
+            quoteTable[attribute] = _get_cell_text(match.group(1))
+
+    if len(quoteTable) < len(quoteCellPatterns):
+        for match in quoteRowPattern.finditer(quoteHtml):
+            attribute = _get_cell_text(match.group(1))
+            if attribute in quoteCellPatterns and attribute not in quoteTable:
+                quoteTable[attribute] = _get_cell_text(match.group(2))
+                if len(quoteTable) == len(quoteCellPatterns):
+                    break
+
+    if len(quoteTable) < len(quoteCellPatterns):
+        quoteTable = _parse_quote_tables(quoteHtml)
+
+    return quoteTable
+
+
+def _get_cell_text(cellHtml):
+    return html.unescape(tagPattern.sub("", cellHtml)).strip()
+
+
+def _parse_quote_tables(quoteHtml):
+    """
+    Given html for a Yahoo quote page, return dictionary of the attribute/value pairs
+    in its first two tables, as yahoo_fin's get_quote_table does. Raises ValueError
+    if the page has no tables.
+    """
+    tables = pd.read_html(StringIO(quoteHtml))
+    quoteTable = {}
+    for table in tables[0:2]:
+        for attribute, value in zip(table.iloc[:, 0], table.iloc[:, 1]):
+            quoteTable[attribute] = value
+
+    return quoteTable
+
+
 def _split_price_range(priceRangeStr):
     """
     Given a 52-week price range, in the format '99.99 - 99.99', where 99.99 can be any reasonable
@@ -3,11 +3,236 @@ File to test retrieving the data required for web site, via the Securities class
 V0.01, December 16, 2022, GAW
 """
 
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
 from . import addSrcToPath
 
+import circuitBreaker
+import databaseUtils
+import dbAccess
+import rateLimiter
+import responseCache
+import sqliteBackend
+
 def adjust_settings_for_tests(mySettings):
     """
     Change table names during testing so that tests hit tables that are identical
     to live but which start with "test_".
     """
     mySettings.use_test_tables()
+
+
+@contextmanager
+def sqlite_database(mySettings, dbPath=sqliteBackend.memoryPath):
+    """
+    Switch dbAccess to an empty SQLite database with all tables created, using test
+    table names, for the duration of a with block. In memory unless given a file path.
+    """
+    tableNames = {"db_securities_table_name": "securities",
+                  "db_daily_table_name": "dailyPriceHistory",
+                  "db_weekly_table_name": "weeklyPriceHistory",
+                  "db_admin_table_name": "admin"}
+    origNames = {attr: getattr(mySettings, attr) for attr in tableNames}
+    origBackend, origPath = mySettings.db_backend, mySettings.sqlite_path
+    # Other tests may have left table names part way through a change, so start again.
+    for attr, tableName in tableNames.items():
+        setattr(mySettings, attr, tableName)
+    adjust_settings_for_tests(mySettings)
+    dbAccess.close_pool()
+    mySettings.db_backend = "sqlite"
+    mySettings.sqlite_path = dbPath
+    databaseUtils.create_tables()
+    try:
+        yield mySettings
+    finally:
+        # A connection left open would keep the in memory database alive for the next test.
+        if dbAccess.connected_status:
+            dbAccess.disconnect()
+        dbAccess.close_pool()
+        mySettings.db_backend, mySettings.sqlite_path = origBackend, origPath
+        for attr, tableName in origNames.items():
+            setattr(mySettings, attr, tableName)
+
+
+class StubYahooHandler(BaseHTTPRequestHandler):
+    """
+    Serves quote pages and chart json for the symbols in server.quotes, multi-symbol
+    quotes from server.batchQuotes, and 404s for anything else, after answering the
+    first server.numFailures requests with 503s. Each response waits server.delay
+    seconds first. Keeps connections open between requests.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.record_start()
+        time.sleep(self.server.delay)
+        url = urlparse(self.path)
+        path = url.path
+        symbol = path.rsplit("/", 1)[-1]
+        quote = self.server.quotes.get(symbol)
+        if self.server.numRequests <= self.server.numFailures:
+            self._send(503, "text/plain", "Service unavailable")
+        elif path == "/batchquote":
+            self._send_batch_quotes(parse_qs(url.query)["symbols"][0].split(","))
+        elif quote is None:
+            self._send(404, "text/plain", "Not found")
+        elif path.startswith("/quote/"):
+            self._send(200, "text/html", _get_quote_html(quote))
+        else:
+            self._send(200, "application/json", json.dumps(_get_chart_data(quote)))
+        self.server.record_end()
+
+    def _send_batch_quotes(self, symbols):
+        """
+        Just the results in server.batchQuotes, a recorded response, for the symbols
+        asked for, like Yahoo's multi-symbol quote api.
+        """
+        self.server.batchRequests.append(symbols)
+        results = [quote for quote in self.server.batchQuotes["quoteResponse"]["result"]
+                   if quote["symbol"] in symbols]
+        self._send(200, "application/json",
+                   json.dumps({"quoteResponse": {"result": results, "error": None}}))
+
+    def _send(self, status, contentType, body):
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(body.encode())))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubYahooServer(ThreadingHTTPServer):
+    """
+    Local stand in for Yahoo. Quotes is a dictionary of symbol to
+    (price, previousClose, low52Week, high52Week), batchQuotes a recorded multi-symbol
+    quote response. Tracks how many requests it has had, the most it had in progress
+    at once, and the symbols asked for in each multi-symbol request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, quotes, delay, batchQuotes=None):
+        super().__init__(("127.0.0.1", 0), StubYahooHandler)
+        self.quotes = quotes
+        self.delay = delay
+        self.batchQuotes = batchQuotes
+        self.batchRequests = []
+        self.numFailures = 0
+        self.numRequests = 0
+        self.inProgress = 0
+        self.maxInProgress = 0
+        self.lock = threading.Lock()
+
+    def record_start(self):
+        with self.lock:
+            self.numRequests += 1
+            self.inProgress += 1
+            self.maxInProgress = max(self.maxInProgress, self.inProgress)
+
+    def record_end(self):
+        with self.lock:
+            self.inProgress -= 1
+
+
+# Prices in chart data from the stub server - the second is a holiday, with no price.
+stubPriceDates = [datetime(2023, 1, 9, tzinfo=timezone.utc),
+                  datetime(2023, 1, 10, tzinfo=timezone.utc),
+                  datetime(2023, 1, 11, tzinfo=timezone.utc)]
+
+
+@contextmanager
+def stub_yahoo_server(mySettings, quotes, delay=0, batchQuotes=None):
+    """
+    Point yahooInterface's requests at a local stub server, with no rate limit, no
+    response cache and a new circuit breaker, for the duration of a with block.
+    Yields the server.
+    """
+    server = StubYahooServer(quotes, delay, batchQuotes)
+    serverThread = threading.Thread(target=server.serve_forever, daemon=True)
+    serverThread.start()
+    origUrls = mySettings.yahooQuoteUrl, mySettings.yahooChartUrl, mySettings.yahooBatchQuoteUrl
+    origRate = mySettings.fetch_rate_per_second
+    baseUrl = f"http://127.0.0.1:{server.server_address[1]}"
+    mySettings.yahooQuoteUrl = baseUrl + "/quote/"
+    mySettings.yahooChartUrl = baseUrl + "/chart/"
+    mySettings.yahooBatchQuoteUrl = baseUrl + "/batchquote"
+    mySettings.fetch_rate_per_second = 0
+    rateLimiter.reset_limiters()
+    circuitBreaker.reset_breakers()
+    origCacheEnabled = mySettings.response_cache_enabled
+    mySettings.response_cache_enabled = False
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        mySettings.yahooQuoteUrl, mySettings.yahooChartUrl, mySettings.yahooBatchQuoteUrl = \
+            origUrls
+        mySettings.fetch_rate_per_second = origRate
+        mySettings.response_cache_enabled = origCacheEnabled
+        rateLimiter.reset_limiters()
+        circuitBreaker.reset_breakers()
+
+
+@contextmanager
+def response_cache(mySettings, cacheDir, entries=None, quotes=False):
+    """
+    Turn the response cache on, in given directory, seeded with entries, a dictionary
+    of responseCache key: value, for the duration of a with block. Caches quotes too,
+    if quotes is True. Yields the cache.
+    """
+    origSettings = (mySettings.response_cache_enabled, mySettings.response_cache_dir,
+                    mySettings.response_cache_quotes)
+    mySettings.response_cache_enabled = True
+    mySettings.response_cache_dir = str(cacheDir)
+    mySettings.response_cache_quotes = quotes
+    responseCache.reset_cache()
+    myCache = responseCache.get_cache(mySettings)
+    for key, value in (entries or {}).items():
+        myCache.put(key, value)
+    try:
+        yield myCache
+    finally:
+        (mySettings.response_cache_enabled, mySettings.response_cache_dir,
+         mySettings.response_cache_quotes) = origSettings
+        responseCache.reset_cache()
+
+
+def load_fixture(fileName):
+    """
+    Recorded provider response, from the fixtures directory - parsed if json,
+    otherwise as text.
+    """
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", fileName), "r") as f:
+        if fileName.endswith(".json"):
+            return json.load(f)
+        return f.read()
+
+
+def _get_quote_html(quote):
+    price, previousClose, low, high = quote
+    return ("<html><body><table>"
+            f"<tr><td>Previous Close</td><td>{previousClose}</td></tr>"
+            f"<tr><td>Open</td><td>{price}</td></tr>"
+            "</table><table>"
+            f"<tr><td>52 Week Range</td><td>{low:,.2f} - {high:,.2f}</td></tr>"
+            "</table></body></html>")
+
+
+def _get_chart_data(quote):
+    price = quote[0]
+    closes = [price - 2, None, price]
+    return {"chart": {"result": [{
+        "timestamp": [int(priceDate.timestamp()) for priceDate in stubPriceDates],
+        "indicators": {"quote": [{"close": closes}],
+                       "adjclose": [{"adjclose": closes}]}}]}}
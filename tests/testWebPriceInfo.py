@@ -4,6 +4,7 @@ V0.01, December 19, 2022, GAW
 """
 
 from datetime import date, timedelta
+import numpy as np
 import pytest
 
 from . import addSrcToPath
@@ -19,6 +20,8 @@ What to test:
     First element is lowest, last item is highest
     first element is highest, last item is lowest
     All items same price.
+    Columnar prices give same results as dictionaries
+    Missing prices in columns
 
 """
 
@@ -212,3 +215,62 @@ class TestWebPriceInfo():
                                / (mySec.sellPrice - mySec.buyPrice), 2)
         assert myInfo.group == "4.near sell"
         assert myInfo.rating == expectedRating
+
+
+@pytest.mark.unit
+class TestWebPriceInfoColumns():
+    """
+    populate_from_columns, with prices as returned by get_historical_price_columns.
+    """
+
+    @pytest.fixture()
+    def appleSec(self):
+        mySec = Security()
+        mySec.pop("Apple", "AAPL", 123.45, 543.21, 200.33)
+        mySec.id = 3
+        return mySec
+
+    def test_no_prices(self, appleSec):
+        """
+        Verify that don't crash if have empty columns.
+        """
+        myInfo = WebPriceInfo()
+        myInfo.populate_from_columns(appleSec, {"priceDate": [], "price": np.array([])})
+
+        assert myInfo.currentPrice == appleSec.currentPrice
+        assert myInfo.periodStartPrice == 0
+        assert myInfo.periodLowPrice == 0
+        assert myInfo.periodHighPrice == 0
+        assert myInfo.periodPrices == []
+
+    def test_matches_dicts(self, appleSec):
+        """
+        Verify that get same values from columns as from the equivalent dictionaries.
+        """
+        curDate = date(2021, 12, 19)
+        pricesOnly = [201.3, 191.32, 193.3, 234.56, 203.3]
+        datesOnly = [curDate + timedelta(i) for i in range(len(pricesOnly))]
+        prices = [{"priceDate": myDate, "price": myPrice}
+                  for myDate, myPrice in zip(datesOnly, pricesOnly)]
+        dictInfo = WebPriceInfo()
+        dictInfo.populate(appleSec, prices)
+
+        colInfo = WebPriceInfo()
+        colInfo.populate_from_columns(appleSec, {"priceDate": datesOnly,
+                                                 "price": np.array(pricesOnly)})
+
+        assert colInfo.getDict() == dictInfo.getDict()
+        assert type(colInfo.periodPrices[0]) is float
+
+    def test_missing_price(self, appleSec):
+        """
+        NULL prices arrive as nan, should be treated as zero, same as dictionary version.
+        """
+        myDates = [date(2021, 12, 19), date(2021, 12, 20)]
+        myInfo = WebPriceInfo()
+        myInfo.populate_from_columns(appleSec, {"priceDate": myDates,
+                                                "price": np.array([12.5, np.nan])})
+
+        assert myInfo.periodPrices == [12.5, 0.0]
+        assert myInfo.periodLowPrice == 0
+        assert myInfo.periodHighPrice == 12.5
@@ -0,0 +1,103 @@
+"""
+File to test benchmark - fake provider, synthetic portfolio and runner.
+V0.01, October 18, 2026
+"""
+
+from datetime import date
+import pytest
+
+from . import addSrcToPath
+from . import helperMethods
+
+import benchmark
+import dbAccess
+import priceProviders
+import settings
+
+mySettings = settings.Settings.instance()
+
+
+@pytest.mark.unit
+class TestFakePriceProvider():
+
+    def test_deterministic(self):
+        """
+        Same symbol and seed should give the same prices, different seed different ones.
+        """
+        first = benchmark.FakePriceProvider(seed=1).retrieve_daily_data("BM00001", mySettings)
+        again = benchmark.FakePriceProvider(seed=1).retrieve_daily_data("BM00001", mySettings)
+        other = benchmark.FakePriceProvider(seed=2).retrieve_daily_data("BM00001", mySettings)
+
+        assert first.currentPrice > 0
+        assert first.currentPrice == again.currentPrice
+        assert first.currentPrice != other.currentPrice
+        assert first.low52Week < first.lastClosePrice < first.high52Week
+
+    def test_error_rate(self):
+        """
+        About errorRate of symbols should fail, returning no prices.
+        """
+        provider = benchmark.FakePriceProvider(errorRate=0.2)
+        symbols = [f"BM{num:05d}" for num in range(500)]
+        numFailed = sum(provider.retrieve_daily_data(symbol, mySettings).currentPrice == 0
+                        for symbol in symbols)
+
+        assert 60 < numFailed < 140
+        assert benchmark.FakePriceProvider(errorRate=1).retrieve_historical_prices(
+            "BM00001", date(2023, 1, 2), date(2023, 1, 13), mySettings.daily_price_code) == []
+
+    def test_historical_prices(self):
+        """
+        Daily prices for every weekday, weekly for every Monday.
+        """
+        provider = benchmark.FakePriceProvider()
+        daily = provider.retrieve_historical_prices("BM00001", date(2023, 1, 1),
+                                                    date(2023, 1, 14), mySettings.daily_price_code)
+        weekly = provider.retrieve_historical_prices("BM00001", date(2023, 1, 1), date(2023, 1, 31),
+                                                     mySettings.weekly_price_code)
+
+        assert len(daily) == 10
+        assert [x[0] for x in weekly] == [date(2023, 1, 2), date(2023, 1, 9), date(2023, 1, 16),
+                                          date(2023, 1, 23), date(2023, 1, 30)]
+
+
+@pytest.mark.unit
+def test_generate_portfolio():
+    portfolio = benchmark.generate_portfolio(20)
+
+    assert len(portfolio) == 20
+    assert all(x.buyPrice < x.sellPrice for x in portfolio.values())
+    assert [x.symbol for x in portfolio.values()] == \
+        [x.symbol for x in benchmark.generate_portfolio(20).values()]
+
+
+@pytest.mark.unit
+def test_run_benchmark():
+    """
+    Small run should report every stage, save prices, and put settings and provider back.
+    """
+    origProvider = mySettings.price_provider
+    origBackend = mySettings.db_backend
+
+    results, pipelineCounters = benchmark.run_benchmark(10, latency=0, errorRate=0)
+
+    assert [x.name for x in results] == ["load list and histories", "daily update", "email"]
+    assert results[0].numStatements > 0
+    assert results[1].numStatements > 0
+    assert all(x.wallSeconds > 0 and x.peakBytes > 0 for x in results)
+    assert pipelineCounters[2].numOut == 10
+    assert mySettings.price_provider == origProvider
+    assert "benchmark" not in priceProviders.providers
+    assert mySettings.db_backend == origBackend
+    assert not dbAccess.connected_status
+
+
+@pytest.mark.unit
+def test_compare_quote_parsers():
+    page = helperMethods.load_fixture("yahoo_quote_page_synthetic.html")
+
+    timings, agree = benchmark.compare_quote_parsers([page], 2)
+
+    assert set(timings) == {"read_html", "single pass"}
+    assert all(x > 0 for x in timings.values())
+    assert agree
@@ -0,0 +1,100 @@
+"""
+File to test circuitBreaker - breaker states and backoff.
+V0.01, October 18, 2026
+"""
+
+import time
+import pytest
+
+from . import addSrcToPath
+
+import circuitBreaker
+from circuitBreaker import CircuitBreaker, CircuitOpenError
+import settings
+from sprEnums import BreakerState
+
+
+def _record_calls(breaker, outcomes):
+    for succeeded in outcomes:
+        assert breaker.allow_request()
+        breaker.record(succeeded)
+
+
+@pytest.mark.unit
+class TestCircuitBreaker():
+
+    def test_opens_at_failure_rate(self):
+        """
+        Shouldn't open until minCalls are in, then should open once half have failed,
+        refusing calls.
+        """
+        breaker = CircuitBreaker("test", 0.5, 10, 4, 60)
+        _record_calls(breaker, [False, False, False])
+        assert breaker.state == BreakerState.closed
+
+        _record_calls(breaker, [True])
+        assert breaker.state == BreakerState.open
+        assert not breaker.allow_request()
+        with pytest.raises(CircuitOpenError):
+            breaker.reject_if_open()
+        assert breaker.numCalls == 4
+        assert breaker.numFailures == 3
+        assert breaker.numRejected == 2
+        assert breaker.numOpened == 1
+
+    def test_stays_closed_below_rate(self):
+        """
+        Failures spread among successes, below the rate in every window, shouldn't
+        open it, however many there are in total.
+        """
+        breaker = CircuitBreaker("test", 0.5, 4, 4, 60)
+        _record_calls(breaker, [False, True, True, True, False, True, True, True, False])
+
+        assert breaker.state == BreakerState.closed
+        breaker.reject_if_open()
+
+    def test_half_open_trial(self):
+        """
+        After cool down, should let one trial call through. Failure should open it
+        again, success close it.
+        """
+        breaker = CircuitBreaker("test", 0.5, 10, 2, 0.05)
+        _record_calls(breaker, [False, False])
+        time.sleep(0.06)
+
+        breaker.reject_if_open()
+        assert breaker.allow_request()
+        assert breaker.state == BreakerState.halfOpen
+        assert not breaker.allow_request()
+        breaker.record(False)
+        assert breaker.state == BreakerState.open
+        assert breaker.numOpened == 2
+
+        time.sleep(0.06)
+        assert breaker.allow_request()
+        breaker.record(True)
+        assert breaker.state == BreakerState.closed
+        assert breaker.allow_request()
+        assert breaker.numRejected == 1
+
+    def test_shared_per_provider(self):
+        mySettings = settings.Settings.instance()
+        circuitBreaker.reset_breakers()
+        yahoo = circuitBreaker.get_breaker("yahoo", mySettings)
+
+        assert circuitBreaker.get_breaker("yahoo", mySettings) is yahoo
+        assert circuitBreaker.get_breaker("alpha", mySettings) is not yahoo
+        assert yahoo.coolDownSeconds == mySettings.breaker_cool_down
+        circuitBreaker.reset_breakers()
+
+
+@pytest.mark.unit
+def test_backoff_delay():
+    """
+    Delays should be random, up to backoff * 2^(retryNum-1), capped at maxBackoff.
+    """
+    delays = [circuitBreaker.get_backoff_delay(3, 0.5) for i in range(200)]
+
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert len(set(delays)) > 1
+    assert circuitBreaker.get_backoff_delay(30, 0.5) <= circuitBreaker.maxBackoff
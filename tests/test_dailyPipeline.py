@@ -0,0 +1,122 @@
+"""
+File to test dailyPipeline.
+V0.01, October 18, 2026
+"""
+
+import threading
+import time
+import pytest
+
+from . import addSrcToPath
+
+from dailyPipeline import DailyPricePipeline
+
+
+def get_pipeline(fetchPrice, writeBatch, numWorkers=2, batchSize=2, queueSize=2,
+                 outOfTime=lambda: False):
+    return DailyPricePipeline(fetchPrice,
+                              lambda symbol, price: None if price is None else (symbol, price),
+                              writeBatch, outOfTime, numWorkers, batchSize, queueSize)
+
+
+@pytest.mark.unit
+class TestDailyPricePipeline():
+
+    def test_all_written_in_batches(self):
+        """
+        Every fetched price should be written, in batches, from the calling thread,
+        and counted by each stage.
+        """
+        batches = []
+        writeThreads = set()
+
+        def write(batch):
+            writeThreads.add(threading.current_thread().name)
+            batches.append(batch)
+            return len(batch)
+
+        pipeline = get_pipeline(lambda symbol: len(symbol), write)
+        numSaved, allSaved = pipeline.run(["A", "BB", "CCC", "DDDD", "EEEEE"])
+
+        assert numSaved == 5
+        assert allSaved
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        assert sorted(sum(batches, [])) == [("A", 1), ("BB", 2), ("CCC", 3), ("DDDD", 4),
+                                            ("EEEEE", 5)]
+        assert writeThreads == {threading.current_thread().name}
+        assert [(x.numIn, x.numOut) for x in pipeline.counters] == [(5, 5), (5, 5), (5, 5)]
+
+    def test_failed_fetch_and_write(self):
+        """
+        A fetch that raises should only lose that price, and a batch that doesn't all
+        save should be reported.
+        """
+        def fetch(symbol):
+            if symbol == "B":
+                raise ConnectionError("Connection reset")
+            return 1
+
+        pipeline = get_pipeline(fetch, lambda batch: len(batch) - 1, batchSize=10)
+        numSaved, allSaved = pipeline.run(["A", "B", "C"])
+
+        assert numSaved == 1
+        assert not allSaved
+        assert pipeline.counters[1].numOut == 2
+
+    def test_failed_diff(self):
+        """
+        A diff that raises should only lose that price, rather than leave the writer
+        waiting forever, and should be reported as not all saved.
+        """
+        def diff(symbol, price):
+            if symbol == "B":
+                raise ValueError("Bad price")
+            return symbol, price
+
+        pipeline = DailyPricePipeline(lambda symbol: 1, diff, lambda batch: len(batch),
+                                      lambda: False, 2, 2, 2)
+        numSaved, allSaved = pipeline.run(["A", "B", "C", "D"])
+
+        assert numSaved == 3
+        assert not allSaved
+        assert pipeline.numDiffFailed == 1
+
+    def test_backpressure(self):
+        """
+        With a slow writer, fetchers should be held back by the bounded queues, rather
+        than fetching everything up front.
+        """
+        fetched = []
+        maxAhead = []
+
+        def write(batch):
+            maxAhead.append(len(fetched) - len(sum(writtenBatches, [])))
+            writtenBatches.append(batch)
+            time.sleep(0.02)
+            return len(batch)
+
+        writtenBatches = []
+        pipeline = get_pipeline(lambda symbol: fetched.append(symbol) or 1, write,
+                                numWorkers=2, batchSize=1, queueSize=1)
+        numSaved, allSaved = pipeline.run([str(num) for num in range(20)])
+
+        assert numSaved == 20
+        # Queue of one between each stage, plus one item held by each stage.
+        assert max(maxAhead) <= 2 + 2 + 2
+
+    def test_out_of_time_and_prefetched(self):
+        """
+        Fetchers shouldn't start once out of time. Already fetched prices should just
+        be passed on.
+        """
+        fetched = []
+        pipeline = get_pipeline(lambda symbol: fetched.append(symbol) or 1, len,
+                                numWorkers=1, outOfTime=lambda: len(fetched) >= 2)
+        numSaved, allSaved = pipeline.run(["A", "B", "C"])
+
+        prefetched = get_pipeline(None, len)
+        numPrefetched, prefetchedAllSaved = prefetched.run(newPrices=[("A", 1), ("B", None)])
+
+        assert fetched == ["A", "B"]
+        assert numSaved == 2
+        assert numPrefetched == 1
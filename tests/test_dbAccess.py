@@ -5,6 +5,9 @@ V0.01, November 10, 2022, GAW
 
 from datetime import date
 from decimal import Decimal
+from unittest.mock import MagicMock, patch
+import numpy as np
+from pymysql.constants import FIELD_TYPE
 import pytest
 
 from . import addSrcToPath
@@ -12,6 +15,7 @@ from . import helperMethods
 
 import dbAccess
 import settings
+from sprEnums import ResultMode
 
 
 @pytest.mark.integration
@@ -592,3 +596,426 @@ class TestDbAccess():
 
         assert executeResult == 1
         assert data[0]["currentPrice"] == Decimal('299.32')
+
+    def test_select_iter(self):
+        """
+        Stream records back in chunks, should get same records as select_data.
+        """
+        table = self.securitiesTable
+        fields = ("Name", "Symbol", "BuyPrice", "SellPrice")
+        values = [("Amazon", "AMZN31", 150.01, 300.21),
+                  ("Amazon", "AMZN32", 150.01, 300.21),
+                  ("Amazon", "AMZN33", 150.01, 300.21)]
+
+        if not dbAccess.connect():
+            assert False, "unable to connect to database"
+
+        assertMsg = "Failed to insert records"
+        assert dbAccess.insert_data(table, fields, values), assertMsg
+
+        query = "Symbol LIKE 'AMZN3%' ORDER BY Symbol"
+        chunks = list(dbAccess.select_iter(table, ("Symbol",), query, chunkSize=2))
+        rows = list(dbAccess.select_iter(table, ("Symbol",), query, asDict=False))
+        dbAccess.delete_data(table, "Symbol LIKE 'AMZN3%'")
+        dbAccess.disconnect()
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        assert chunks[0][0]["Symbol"] == "AMZN31"
+        assert rows == [("AMZN31",), ("AMZN32",), ("AMZN33",)]
+
+    def test_upsert_many(self):
+        """
+        Upsert two records - one that exists and one that doesn't. Existing one should be
+        updated, other should be inserted.
+        """
+        table = self.securitiesTable
+        fields = ("Name", "Symbol", "BuyPrice", "SellPrice")
+        values = [("Amazon", "AMZN21", 150.01, 300.21), ]
+
+        if not dbAccess.connect():
+            assert False, "unable to connect to database"
+
+        assertMsg = "Failed to insert a single record"
+        assert dbAccess.insert_data(table, fields, values), assertMsg
+        existingId = dbAccess.select_data(table, ("id",), "Symbol='AMZN21'")[0]["id"]
+
+        upsertFields = ("Name", "Symbol", "BuyPrice")
+        rows = [(existingId, "Amazon", "AMZN21", 160.5),
+                (existingId + 1000, "Apple", "AMZN22", 99.1)]
+        numAffected = dbAccess.upsert_many(table, ("id",), upsertFields, rows)
+        data = dbAccess.select_data(table, ("Symbol", "BuyPrice"),
+                                    "Symbol IN ('AMZN21', 'AMZN22') ORDER BY Symbol")
+
+        dbAccess.delete_data(table, "Symbol IN ('AMZN21', 'AMZN22')")
+        dbAccess.disconnect()
+
+        # MySQL counts an update as two affected rows, an insert as one.
+        assert numAffected == 3
+        assert len(data) == 2
+        assert data[0]["BuyPrice"] == Decimal('160.50')
+        assert data[1]["BuyPrice"] == Decimal('99.10')
+
+
+@pytest.mark.unit
+class TestDbAccessPool():
+    """
+    Connection pool and auth token caching - mocks the connector and rds client.
+    """
+
+    @pytest.fixture(autouse=True)
+    def emptyPool(self):
+        dbAccess.disconnect()
+        dbAccess.close_pool()
+        yield
+        dbAccess.disconnect()
+        dbAccess.close_pool()
+
+    def test_reconnect_reuses_connection(self):
+        """
+        Connecting, disconnecting and connecting again should only open one connection
+        and only generate one token.
+        """
+        with patch('dbAccess.pymysql.connect', return_value=MagicMock()) as mock_connect, \
+                patch('dbAccess.client.generate_db_auth_token', return_value="token") as mock_token:
+            assert dbAccess.connect()
+            firstConn = dbAccess.dbConn
+            dbAccess.disconnect()
+            assert dbAccess.connect()
+
+            assert dbAccess.dbConn is firstConn
+            mock_connect.assert_called_once()
+            mock_token.assert_called_once()
+
+    def test_dead_connection_replaced(self):
+        """
+        If pooled connection fails its ping, should be discarded and a new one opened.
+        """
+        deadConn = MagicMock()
+        deadConn.ping.side_effect = dbAccess.pymysql.err.OperationalError(2006, "gone away")
+        liveConn = MagicMock()
+        with patch('dbAccess.pymysql.connect', side_effect=[deadConn, liveConn]), \
+                patch('dbAccess.client.generate_db_auth_token', return_value="token"):
+            with dbAccess.pooled_connection() as conn:
+                assert conn is deadConn
+            with dbAccess.pooled_connection() as conn:
+                assert conn is liveConn
+
+            deadConn.close.assert_called_once()
+
+    def test_token_regenerated_near_expiry(self):
+        """
+        Cached token should be reused until within the refresh margin of its expiry.
+        """
+        mySettings = settings.Settings.instance()
+        with patch('dbAccess.pymysql.connect', return_value=MagicMock()), \
+                patch('dbAccess.client.generate_db_auth_token', side_effect=["t1", "t2"]), \
+                patch('dbAccess.time.time', return_value=1000):
+            assert dbAccess._get_auth_token() == "t1"
+            assert dbAccess._get_auth_token() == "t1"
+
+        nearExpiry = 1000 + mySettings.rds_token_lifetime - mySettings.rds_token_refresh_margin
+        with patch('dbAccess.client.generate_db_auth_token', return_value="t2"), \
+                patch('dbAccess.time.time', return_value=nearExpiry):
+            assert dbAccess._get_auth_token() == "t2"
+
+    def test_pool_size_limited(self):
+        """
+        Connections released beyond the pool size should be closed.
+        """
+        mySettings = settings.Settings.instance()
+        numConns = mySettings.rds_pool_size + 1
+        conns = [MagicMock() for i in range(numConns)]
+        with patch('dbAccess.pymysql.connect', side_effect=conns), \
+                patch('dbAccess.client.generate_db_auth_token', return_value="token"):
+            held = [dbAccess._acquire_connection() for i in range(numConns)]
+            for conn in held:
+                dbAccess._release_connection(conn)
+
+        assert len(dbAccess.idleConnections) == mySettings.rds_pool_size
+        conns[-1].close.assert_called_once()
+
+
+@pytest.mark.unit
+class TestDbAccessTransaction():
+    """
+    Transaction scopes - uses a mocked connection.
+    """
+
+    @pytest.fixture()
+    def mockConn(self):
+        origConn, origStatus = dbAccess.dbConn, dbAccess.connected_status
+        dbAccess.dbConn = MagicMock()
+        dbAccess.connected_status = True
+        yield dbAccess.dbConn
+        dbAccess.dbConn, dbAccess.connected_status = origConn, origStatus
+
+    def test_single_commit(self, mockConn):
+        """
+        Several statements in a transaction should result in one commit, at the end.
+        """
+        with dbAccess.transaction():
+            dbAccess.insert_data("table1", ["field1"], [(1,), (2,)])
+            dbAccess.update_data("table1", ["field1"], [3], "id=1")
+            dbAccess.delete_data("table1", "id=2")
+            mockConn.commit.assert_not_called()
+
+        mockConn.commit.assert_called_once()
+        mockConn.rollback.assert_not_called()
+        assert dbAccess.lastTransactionCommitted
+
+    def test_failed_statement_rolls_back(self, mockConn):
+        """
+        If a statement fails, nothing in the transaction should be committed.
+        """
+        failingCursor = MagicMock()
+        failingCursor.execute.side_effect = dbAccess.pymysql.err.OperationalError(1054, "bad")
+        mockConn.cursor.side_effect = [MagicMock(), failingCursor]
+        with dbAccess.transaction():
+            dbAccess.insert_data("table1", ["field1"], [(1,)])
+            assert dbAccess.update_data("table1", ["badField"], [3], "id=1") == -1
+
+        mockConn.commit.assert_not_called()
+        mockConn.rollback.assert_called_once()
+        assert not dbAccess.lastTransactionCommitted
+
+    def test_exception_rolls_back(self, mockConn):
+        """
+        If the with block raises, should roll back and let exception through.
+        """
+        with pytest.raises(ValueError):
+            with dbAccess.transaction():
+                dbAccess.insert_data("table1", ["field1"], [(1,)])
+                raise ValueError("test")
+
+        mockConn.commit.assert_not_called()
+        mockConn.rollback.assert_called_once()
+        assert dbAccess.transactionDepth == 0
+
+    def test_nested_joins_outer(self, mockConn):
+        """
+        Inner transaction shouldn't commit - outer one does, once.
+        """
+        with dbAccess.transaction():
+            with dbAccess.transaction():
+                dbAccess.insert_data("table1", ["field1"], [(1,)])
+            mockConn.commit.assert_not_called()
+            dbAccess.insert_data("table1", ["field1"], [(2,)])
+
+        mockConn.commit.assert_called_once()
+
+    def test_disconnect_abandons(self, mockConn):
+        """
+        Disconnecting inside a transaction should roll it back, not commit it, and
+        leave no transaction open for the next connection.
+        """
+        with patch('dbAccess._release_connection') as mockRelease:
+            with dbAccess.transaction():
+                with dbAccess.transaction():
+                    dbAccess.insert_data("table1", ["field1"], [(1,)])
+                    dbAccess.disconnect()
+                assert dbAccess.transactionDepth == 0
+
+        mockRelease.assert_called_once_with(mockConn)
+        mockConn.commit.assert_not_called()
+        assert not dbAccess.lastTransactionCommitted
+        assert not dbAccess.transactionFailed
+        assert dbAccess.transactionDepth == 0
+
+    def test_no_transaction_commits_each(self, mockConn):
+        """
+        Outside a transaction, each statement still commits.
+        """
+        dbAccess.insert_data("table1", ["field1"], [(1,)])
+        dbAccess.delete_data("table1", "id=2")
+
+        assert mockConn.commit.call_count == 2
+
+
+@pytest.mark.unit
+class TestDbAccessSelectIter():
+    """
+    Streaming selects - uses a mocked unbuffered cursor.
+    """
+
+    @pytest.fixture()
+    def mockCursor(self):
+        origConn, origStatus = dbAccess.dbConn, dbAccess.connected_status
+        dbAccess.dbConn = MagicMock()
+        dbAccess.connected_status = True
+        rows = [{"id": i} for i in range(5)]
+        cursor = MagicMock()
+        cursor.fetchone.side_effect = rows + [None]
+        cursor.fetchmany.side_effect = \
+            lambda size: [rows.pop(0) for i in range(min(size, len(rows)))]
+        with patch('dbAccess.pymysql.cursors.SSDictCursor', return_value=cursor):
+            yield cursor
+        dbAccess.dbConn, dbAccess.connected_status = origConn, origStatus
+
+    def test_yields_rows(self, mockCursor):
+        """
+        Without a chunk size, should get one row at a time.
+        """
+        rows = list(dbAccess.select_iter("table1", ["id"], "1=1"))
+
+        assert rows == [{"id": i} for i in range(5)]
+        mockCursor.close.assert_called_once()
+
+    def test_yields_chunks(self, mockCursor):
+        """
+        With a chunk size, should get lists of up to that many rows.
+        """
+        chunks = list(dbAccess.select_iter("table1", ["id"], "1=1", chunkSize=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        mockCursor.close.assert_called_once()
+
+    def test_early_exit_closes_cursor(self, mockCursor):
+        """
+        If caller stops reading part way through, cursor should still be closed.
+        """
+        rows = dbAccess.select_iter("table1", ["id"], "1=1")
+        assert next(rows) == {"id": 0}
+        rows.close()
+
+        mockCursor.close.assert_called_once()
+
+
+@pytest.mark.unit
+class TestDbAccessResultModes():
+    """
+    Tuple and columnar results from select_data - uses a mocked cursor.
+    """
+
+    @pytest.fixture()
+    def mockCursor(self):
+        origConn, origStatus = dbAccess.dbConn, dbAccess.connected_status
+        dbAccess.dbConn = MagicMock()
+        dbAccess.connected_status = True
+        cursor = dbAccess.dbConn.cursor.return_value
+        cursor.fetchall.return_value = ((date(2022, 12, 1), Decimal("10.50")),
+                                        (date(2022, 12, 2), None),
+                                        (date(2022, 12, 5), Decimal("11.25")))
+        cursor.description = (("priceDate", FIELD_TYPE.DATE), ("price", FIELD_TYPE.NEWDECIMAL))
+        yield cursor
+        dbAccess.dbConn, dbAccess.connected_status = origConn, origStatus
+
+    def test_tuples(self, mockCursor):
+        """
+        Tuples mode should return rows as cursor provided them.
+        """
+        results = dbAccess.select_data("table1", ["priceDate", "price"], "1=1",
+                                       resultMode=ResultMode.tuples)
+
+        assert results == mockCursor.fetchall.return_value
+
+    def test_columns(self, mockCursor):
+        """
+        Columns mode should return a list of values per column, unconverted.
+        """
+        results = dbAccess.select_data("table1", ["priceDate", "price"], "1=1",
+                                       resultMode=ResultMode.columns)
+
+        assert list(results.keys()) == ["priceDate", "price"]
+        assert results["priceDate"][2] == date(2022, 12, 5)
+        assert results["price"] == [Decimal("10.50"), None, Decimal("11.25")]
+
+    def test_arrays(self, mockCursor):
+        """
+        Arrays mode should convert decimal column to float64 array, with NULL as nan,
+        but leave date column as a list.
+        """
+        results = dbAccess.select_data("table1", ["priceDate", "price"], "1=1",
+                                       resultMode=ResultMode.arrays)
+
+        assert isinstance(results["priceDate"], list)
+        assert results["price"].dtype == np.float64
+        assert results["price"][0] == 10.5
+        assert np.isnan(results["price"][1])
+
+
+@pytest.mark.unit
+class TestDbAccessInstrumentation():
+    """
+    Statement timing and summaries - uses a mocked connection.
+    """
+
+    @pytest.fixture()
+    def mockConn(self):
+        origConn, origStatus = dbAccess.dbConn, dbAccess.connected_status
+        mySettings = dbAccess.mysettings
+        origOn, origSlow = mySettings.db_instrumentation, mySettings.db_slow_query_seconds
+        dbAccess.dbConn = MagicMock()
+        dbAccess.dbConn.cursor.return_value.rowcount = 1
+        dbAccess.connected_status = True
+        mySettings.db_instrumentation = True
+        dbAccess.queryStats = {}
+        yield dbAccess.dbConn
+        dbAccess.dbConn, dbAccess.connected_status = origConn, origStatus
+        mySettings.db_instrumentation, mySettings.db_slow_query_seconds = origOn, origSlow
+        dbAccess.queryStats = {}
+
+    def test_same_shape_counted_together(self, mockConn):
+        """
+        Updates that only differ in literal values should be one statement in summary.
+        """
+        for secId in range(3):
+            dbAccess.update_data("table1", ["price"], [secId], f"id={secId}")
+        dbAccess.delete_data("table1", "id=%s", (4,))
+
+        summary = dbAccess.get_query_summary()
+
+        assert len(summary) == 2
+        updates = [x for x in summary if x["sql"].startswith("UPDATE")][0]
+        assert updates["sql"] == "UPDATE table1 SET price = ? WHERE id=?"
+        assert updates["count"] == 3
+        assert updates["rows"] == 3
+        assert list(updates["callers"].values()) == [3]
+        assert list(updates["callers"].keys())[0].startswith("test_dbAccess.py:")
+
+    def test_slow_query_logged(self, mockConn, capsys):
+        """
+        Statements slower than threshold should be printed as they happen.
+        """
+        dbAccess.mysettings.db_slow_query_seconds = 0
+        dbAccess.delete_data("table1", "id=%s", (4,))
+
+        assert "Slow query" in capsys.readouterr().out
+
+    def test_summary_printed_and_cleared(self, mockConn, capsys):
+        """
+        Summary should include totals, then start again for next run.
+        """
+        dbAccess.delete_data("table1", "id=%s", (4,))
+        dbAccess.delete_data("table1", "id=%s", (5,))
+        dbAccess.print_query_summary()
+
+        assert "Query summary: 2 statements, 1 distinct" in capsys.readouterr().out
+        assert dbAccess.get_query_summary() == []
+
+    def test_off_records_nothing(self, mockConn):
+        """
+        With instrumentation turned off in settings, shouldn't collect anything.
+        """
+        dbAccess.mysettings.db_instrumentation = False
+        dbAccess.delete_data("table1", "id=%s", (4,))
+
+        assert dbAccess.get_query_summary() == []
+
+    def test_normalize_sql(self):
+        """
+        Literals, placeholders and lists of them should be replaced.
+        """
+        sqlCmd = "SELECT  id FROM t\n WHERE symbol = 'AB''C' AND id IN (1, 2, 3) AND x > %s"
+
+        assert dbAccess._normalize_sql(sqlCmd) == \
+            "SELECT id FROM t WHERE symbol = ? AND id IN (?, ...) AND x > ?"
+
+    def test_percentile(self):
+        """
+        Nearest rank percentiles.
+        """
+        vals = [float(x) for x in range(1, 21)]
+
+        assert dbAccess._percentile(vals, 50) == 10
+        assert dbAccess._percentile(vals, 95) == 19
+        assert dbAccess._percentile([], 95) == 0
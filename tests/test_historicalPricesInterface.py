@@ -12,6 +12,8 @@ from . import addSrcToPath
 from . import helperMethods
 
 import unittest
+from unittest.mock import patch
+import numpy as np
 import pytest
 
 import dbAccess
@@ -32,6 +34,8 @@ save_weekly_historical_prices
     Correctly saves multiple prices - up to 250
 get_historical_prices
     Emits correct query, returns expected values
+iter_historical_prices
+    Returns same values as get_historical_prices, in chunks
 remove_old_prices
     Emits expected queries
 delete_security
@@ -123,6 +127,57 @@ class TestHistoricalPricesInterface(unittest.TestCase):
         assert numDailyDeleted == 1
         assert numWeeklyDeleted == 1
 
+    def test_iter_historical_prices(self):
+        """
+        Streaming prices in chunks should give same records, oldest first, as
+        get_historical_prices.
+        """
+        secId = self.baseSecurityId + 3
+        today = date.today()
+        dataPairs = [(today - timedelta(days=i), Decimal(20 + i)) for i in range(5)]
+
+        utilsInterface = UtilsInterface()
+        utilsInterface.connect()
+        historyInterface = HistoricalPricesInterface()
+        historyInterface.save_daily_historical_prices(secId, dataPairs)
+
+        tableName = self.dailyPricesTable
+        chunks = list(historyInterface.iter_historical_prices(secId, tableName, 10, chunkSize=2))
+        records = historyInterface.get_historical_prices(secId, tableName, 10)
+
+        dbAccess.delete_data(tableName, "securityId=%s", (secId,))
+        utilsInterface.disconnect()
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        streamed = [record for chunk in chunks for record in chunk]
+        assert sorted(streamed, key=lambda x: x["priceDate"]) == \
+            sorted(records, key=lambda x: x["priceDate"])
+        assert streamed[0]["priceDate"] == today - timedelta(days=4)
+
+    def test_get_historical_price_columns(self):
+        """
+        Columnar prices should match get_historical_prices, oldest first, with prices
+        as float64 array.
+        """
+        secId = self.baseSecurityId + 4
+        today = date.today()
+        dataPairs = [(today - timedelta(days=i), Decimal(20 + i)) for i in range(5)]
+
+        utilsInterface = UtilsInterface()
+        utilsInterface.connect()
+        historyInterface = HistoricalPricesInterface()
+        historyInterface.save_daily_historical_prices(secId, dataPairs)
+
+        tableName = self.dailyPricesTable
+        columns = historyInterface.get_historical_price_columns(secId, tableName, 10)
+
+        dbAccess.delete_data(tableName, "securityId=%s", (secId,))
+        utilsInterface.disconnect()
+
+        assert columns["priceDate"] == [today - timedelta(days=i) for i in range(4, -1, -1)]
+        assert columns["price"].dtype == np.float64
+        assert columns["price"].tolist() == [24.0, 23.0, 22.0, 21.0, 20.0]
+
     """
     Testing removing old prices.
     first, need to verify whether want to delete for date < thresh or > thresh.
@@ -429,3 +484,93 @@ class TestHistoricalPricesInterface(unittest.TestCase):
         numWeeks = math.ceil(days/7)
 
         return numWeeks
+
+
+@pytest.mark.unit
+class TestHistoricalPricesForAll():
+    """
+    Grouping of get_historical_prices_for_all - mocks dbAccess.select_data.
+    """
+
+    def test_grouped_by_security(self):
+        """
+        Each security should get its own slice of the one result, in date order, and
+        securities with no prices should get empty columns.
+        """
+        day1, day2, day3 = date(2023, 1, 6), date(2023, 1, 13), date(2023, 1, 20)
+        columns = {"securityId": [3, 3, 3, 5, 8, 8],
+                   "priceDate": [day1, day2, day3, day2, day1, day3],
+                   "price": np.array([10.0, 11.0, 12.0, 50.0, 80.0, 81.0])}
+        historyInterface = HistoricalPricesInterface()
+        with patch('dbAccess.select_data', return_value=columns) as mock_select:
+            pricesById = historyInterface.get_historical_prices_for_all("prices", 30)
+
+        assert mock_select.call_count == 1
+        assert pricesById[3]["priceDate"] == [day1, day2, day3]
+        assert pricesById[3]["price"].tolist() == [10.0, 11.0, 12.0]
+        assert pricesById[5]["price"].tolist() == [50.0]
+        assert pricesById[8]["priceDate"] == [day1, day3]
+        assert pricesById[9]["priceDate"] == []
+        assert len(pricesById[9]["price"]) == 0
+
+    def test_query_failed(self):
+        """
+        If the select fails, every security should get empty columns.
+        """
+        historyInterface = HistoricalPricesInterface()
+        with patch('dbAccess.select_data', return_value=None):
+            pricesById = historyInterface.get_historical_prices_for_all("prices", 30)
+
+        assert pricesById[3]["priceDate"] == []
+
+
+@pytest.mark.unit
+class TestSaveWeeklyPricesForAll():
+    """
+    Set based weekly rollup - runs on an in memory SQLite database.
+    """
+
+    @pytest.fixture()
+    def historyInterface(self):
+        with helperMethods.sqlite_database(settings.Settings.instance()):
+            utilsInterface = UtilsInterface()
+            utilsInterface.connect()
+            yield HistoricalPricesInterface()
+            utilsInterface.disconnect()
+
+    def test_rollup(self, historyInterface):
+        """
+        Friday price used if there is one, otherwise latest earlier in the week. Security
+        without a price that week, or only in the previous week, shouldn't get one.
+        """
+        friday = date(2023, 1, 13)
+        historyInterface.save_daily_historical_prices(
+            1, [(friday - timedelta(days=1), Decimal("10.50")), (friday, Decimal("11.25"))])
+        historyInterface.save_daily_historical_prices(
+            2, [(friday - timedelta(days=3), Decimal("20.00")),
+                (friday - timedelta(days=1), Decimal("21.00"))])
+        historyInterface.save_daily_historical_prices(3, [(friday - timedelta(days=7),
+                                                           Decimal("30.00"))])
+
+        numAdded = historyInterface.save_weekly_prices_for_all(friday)
+        records = dbAccess.select_data(historyInterface.weeklyPricesTable,
+                                       ["securityId", "priceDate", "price"],
+                                       "1=1 ORDER BY securityId")
+
+        assert numAdded == 2
+        assert records == [{"securityId": 1, "priceDate": friday, "price": Decimal("11.25")},
+                           {"securityId": 2, "priceDate": friday, "price": Decimal("21.00")}]
+
+    def test_rerun_adds_nothing(self, historyInterface):
+        """
+        Running again for same date shouldn't duplicate weekly prices.
+        """
+        friday = date(2023, 1, 13)
+        historyInterface.save_daily_price_for_security(1, Decimal("11.25"), friday)
+
+        historyInterface.save_weekly_prices_for_all(friday)
+        numAdded = historyInterface.save_weekly_prices_for_all(friday)
+        records = dbAccess.select_data(historyInterface.weeklyPricesTable, ["id"], "1=1")
+
+        assert numAdded == 0
+        assert len(records) == 1
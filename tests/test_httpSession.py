@@ -0,0 +1,168 @@
+"""
+File to test httpSession - connection reuse and retries.
+V0.01, October 18, 2026
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+from unittest.mock import patch
+import pytest
+import requests
+
+from . import addSrcToPath
+
+import circuitBreaker
+import httpSession
+import settings
+
+mySettings = settings.Settings.instance()
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    Answers 503 to the first server.numFailures requests, then 200.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.numRequests += 1
+        status = 503 if self.server.numRequests <= self.server.numFailures else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def flakyServer():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.daemon_threads = True
+    server.numRequests = 0
+    server.numFailures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    origBackoff = mySettings.http_retry_backoff
+    mySettings.http_retry_backoff = 0
+    httpSession.close_session()
+    with patch('rateLimiter.get_limiter') as mockGetLimiter:
+        server.limiter = mockGetLimiter.return_value
+        yield server
+    httpSession.close_session()
+    mySettings.http_retry_backoff = origBackoff
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.unit
+class TestHttpSession():
+
+    def test_reuses_connection(self, flakyServer):
+        """
+        Requests to the same host should share one connection.
+        """
+        url = f"http://127.0.0.1:{flakyServer.server_address[1]}/"
+        for i in range(5):
+            httpSession.get_session(mySettings).get(url, timeout=5)
+
+        assert httpSession.get_session(mySettings) is httpSession.get_session(mySettings)
+        assert httpSession.stats.numRequests == 5
+        assert httpSession.stats.numNewConnections == 1
+        assert httpSession.stats.get_num_reused() == 4
+
+    def test_session_doesnt_retry(self, flakyServer):
+        """
+        Retries are left to call_with_retries, so the session should make one request.
+        """
+        url = f"http://127.0.0.1:{flakyServer.server_address[1]}/"
+        flakyServer.numFailures = 1
+        failed = httpSession.get_session(mySettings).get(url, timeout=5)
+
+        assert failed.status_code == 503
+        assert flakyServer.numRequests == 1
+
+    def test_retries(self, flakyServer):
+        """
+        503s should be retried, up to http_retries times, each retry counted by the
+        breaker. A 404 shouldn't be retried.
+        """
+        url = f"http://127.0.0.1:{flakyServer.server_address[1]}/"
+        circuitBreaker.reset_breakers()
+
+        def fetch():
+            return httpSession.get("test", mySettings, url, timeout=5)
+
+        flakyServer.numFailures = mySettings.http_retries
+        ok = httpSession.call_with_retries("test", mySettings, fetch)
+        flakyServer.numRequests = 0
+        flakyServer.numFailures = mySettings.http_retries + 1
+        with pytest.raises(requests.exceptions.HTTPError):
+            httpSession.call_with_retries("test", mySettings, fetch)
+        numFailedRequests = flakyServer.numRequests
+        notFound = requests.exceptions.HTTPError(response=requests.Response())
+        notFound.response.status_code = 404
+        numCalls = 0
+
+        def fetchNotFound():
+            nonlocal numCalls
+            numCalls += 1
+            raise notFound
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            httpSession.call_with_retries("test", mySettings, fetchNotFound)
+        breaker = circuitBreaker.get_breaker("test", mySettings)
+        circuitBreaker.reset_breakers()
+
+        assert ok.status_code == 200
+        assert numFailedRequests == mySettings.http_retries + 1
+        assert numCalls == 1
+        assert breaker.numCalls == 2 * mySettings.http_retries + 2
+        assert breaker.numFailures == 2 * mySettings.http_retries + 1
+
+    def test_limiter_per_request(self, flakyServer):
+        """
+        Every request should wait for the rate limiter, including each of several
+        made by one fetch, and each retry.
+        """
+        url = f"http://127.0.0.1:{flakyServer.server_address[1]}/"
+        circuitBreaker.reset_breakers()
+
+        def fetch():
+            return [httpSession.get("test", mySettings, url, timeout=5) for i in range(2)]
+
+        flakyServer.numFailures = 1
+        httpSession.call_with_retries("test", mySettings, fetch)
+        circuitBreaker.reset_breakers()
+
+        assert flakyServer.numRequests == 3
+        assert flakyServer.limiter.wait.call_count == 3
+
+    def test_get_records_with_breaker(self, flakyServer):
+        """
+        503s should raise and count as failures, other statuses not, and an open
+        breaker should stop requests being made.
+        """
+        url = f"http://127.0.0.1:{flakyServer.server_address[1]}/"
+        origMinCalls = mySettings.breaker_min_calls
+        mySettings.breaker_min_calls = 3
+        circuitBreaker.reset_breakers()
+        httpSession.get("test", mySettings, url, timeout=5)
+        flakyServer.numRequests = 0
+        flakyServer.numFailures = 100
+        for i in range(2):
+            with pytest.raises(requests.exceptions.HTTPError):
+                httpSession.get("test", mySettings, url, timeout=5)
+        numRequests = flakyServer.numRequests
+        with pytest.raises(circuitBreaker.CircuitOpenError):
+            httpSession.get("test", mySettings, url, timeout=5)
+        breaker = circuitBreaker.get_breaker("test", mySettings)
+        circuitBreaker.reset_breakers()
+        mySettings.breaker_min_calls = origMinCalls
+
+        assert numRequests == 2
+        assert flakyServer.numRequests == numRequests
+        assert breaker.numCalls == 3
+        assert breaker.numFailures == 2
+        assert breaker.numRejected == 1
+        assert flakyServer.limiter.wait.call_count == 3
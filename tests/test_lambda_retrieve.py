@@ -0,0 +1,52 @@
+"""
+File to test lambda_retrieve - resuming the daily update.
+V0.01, October 18, 2026
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+
+from . import addSrcToPath
+
+import lambda_retrieve
+
+mySettings = lambda_retrieve.mysettings
+context = SimpleNamespace(function_name="stock-retriever-retrieve")
+
+
+@pytest.mark.unit
+class TestResumeLater():
+
+    def test_resumes(self):
+        """
+        Should invoke itself asynchronously, counting the resume in the event.
+        """
+        with patch.object(lambda_retrieve, "client") as mockClient:
+            lambda_retrieve._resume_later("", context)
+            lambda_retrieve._resume_later({"resumeCount": 1}, context)
+
+        calls = mockClient.invoke.call_args_list
+        assert len(calls) == 2
+        assert calls[0].kwargs["FunctionName"] == context.function_name
+        assert calls[0].kwargs["InvocationType"] == "Event"
+        assert json.loads(calls[0].kwargs["Payload"]) == {"resumeCount": 1}
+        assert json.loads(calls[1].kwargs["Payload"]) == {"resumeCount": 2}
+
+    def test_stops_at_max_resumes(self):
+        """
+        Once resumed lambda_max_resumes times, shouldn't invoke itself again.
+        """
+        origMaxResumes = mySettings.lambda_max_resumes
+        mySettings.lambda_max_resumes = 2
+        with patch.object(lambda_retrieve, "client") as mockClient:
+            event = {"resumeCount": 0}
+            for i in range(4):
+                lambda_retrieve._resume_later(event, context)
+                if mockClient.invoke.called:
+                    event = json.loads(mockClient.invoke.call_args.kwargs["Payload"])
+        mySettings.lambda_max_resumes = origMaxResumes
+
+        assert mockClient.invoke.call_count == 2
+        assert event == {"resumeCount": 2}
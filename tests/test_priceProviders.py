@@ -0,0 +1,173 @@
+"""
+File to test priceProviders - registry, replay and recording.
+V0.01, October 18, 2026
+"""
+
+import asyncio
+from datetime import date, datetime
+import os
+import time
+from unittest.mock import patch
+import pytest
+
+from . import addSrcToPath
+
+import priceProviders
+from priceProviders import RecordingProvider, ReplayProvider
+from security import PriceInfo
+import settings
+
+mySettings = settings.Settings.instance()
+replayFile = os.path.join(os.path.dirname(__file__), "fixtures", "replay_prices.json")
+
+
+@pytest.mark.unit
+class TestRegistry():
+
+    def test_selected_from_settings(self):
+        """
+        Default should be yahoo, switching the setting should switch provider.
+        """
+        origSettings = mySettings.price_provider, mySettings.replay_file
+        priceProviders.reset_providers()
+        yahoo = priceProviders.get_provider(mySettings)
+        mySettings.price_provider = "replay"
+        mySettings.replay_file = replayFile
+        replay = priceProviders.get_provider(mySettings)
+        mySettings.price_provider, mySettings.replay_file = origSettings
+        priceProviders.reset_providers()
+
+        assert yahoo.name == "yahoo"
+        assert yahoo.supportsBatchQuotes and yahoo.supportsAsync
+        assert isinstance(replay, ReplayProvider)
+        assert priceProviders.get_provider(mySettings, "alphavest").supportsHistory is False
+        with pytest.raises(KeyError):
+            priceProviders.get_provider(mySettings, "nobody")
+
+    def test_register(self):
+        provider = priceProviders.AlphavestProvider()
+        priceProviders.register_provider("test", lambda x: provider)
+
+        assert priceProviders.get_provider(mySettings, "test") is provider
+        priceProviders.unregister_provider("test")
+        assert "test" not in priceProviders.providers
+
+    def test_abstract(self):
+        """
+        Base provider, or one missing a method, shouldn't be creatable.
+        """
+        class NoHistoryProvider(priceProviders.BasePriceProvider):
+            def retrieve_daily_data(self, symbol, mysettings):
+                return PriceInfo()
+
+        with pytest.raises(TypeError):
+            priceProviders.BasePriceProvider()
+        with pytest.raises(TypeError):
+            NoHistoryProvider()
+
+    def test_replay_needs_file(self):
+        """
+        Replay without a recording configured should say so.
+        """
+        origFile = mySettings.replay_file
+        mySettings.replay_file = ""
+        priceProviders.reset_providers()
+        with pytest.raises(ValueError, match="replay_file"):
+            priceProviders.get_provider(mySettings, "replay")
+        mySettings.replay_file = origFile
+        priceProviders.reset_providers()
+
+    def test_yahoo_delegates(self):
+        with patch('yahooInterface.retrieve_daily_data_many',
+                   return_value=[("MSFT", PriceInfo())]) as mockMany:
+            prices = priceProviders.YahooProvider().retrieve_daily_data_many(["MSFT"],
+                                                                             mySettings)
+
+        assert prices[0][0] == "MSFT"
+        mockMany.assert_called_once_with(["MSFT"], mySettings)
+
+
+@pytest.mark.unit
+class TestReplayProvider():
+    """
+    Replaying the recorded fixture. Latencies are scaled down, to keep tests quick.
+    """
+
+    def test_daily(self):
+        provider = ReplayProvider.from_file(replayFile, 0.1)
+        startTime = time.perf_counter()
+        microsoft = provider.retrieve_daily_data("MSFT", mySettings)
+        elapsed = time.perf_counter() - startTime
+        missing = provider.retrieve_daily_data("NOPE", mySettings)
+
+        assert microsoft.currentPrice == 238.51
+        assert microsoft.high52Week == 315.95
+        assert elapsed >= 0.021
+        assert missing.currentPrice == 0
+        assert provider.medianLatency == 0.2418
+
+    def test_historical(self):
+        """
+        Only prices in the range asked for, however the dates are given.
+        """
+        provider = ReplayProvider.from_file(replayFile, 0)
+        daily = provider.retrieve_historical_prices("MSFT", datetime(2023, 1, 5),
+                                                    date(2023, 1, 9), "1d")
+        weekly = provider.retrieve_historical_prices("MSFT", date(2023, 1, 1),
+                                                     date(2023, 1, 11), "1wk")
+
+        assert daily == [(date(2023, 1, 5), 222.31), (date(2023, 1, 6), 224.93),
+                         (date(2023, 1, 9), 227.12)]
+        assert [priceDate for priceDate, price in weekly] == [date(2023, 1, 2), date(2023, 1, 9)]
+        assert provider.retrieve_historical_prices("AAPL", date(2023, 1, 1),
+                                                   date(2023, 1, 11), "1d") == []
+
+    def test_batch_and_async_overlap(self):
+        """
+        A batch should wait for its slowest response, and async requests should
+        overlap, rather than both taking the sum of the latencies.
+        """
+        provider = ReplayProvider.from_file(replayFile, 0.5)
+        symbols = ["MSFT", "AAPL", "TSX:SHOP"]
+        startTime = time.perf_counter()
+        batch = provider.retrieve_daily_data_many(symbols, mySettings)
+        batchTime = time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        overlapped = asyncio.run(provider.retrieve_daily_data_many_async(symbols, mySettings))
+        asyncTime = time.perf_counter() - startTime
+
+        assert [priceInfo.currentPrice for symbol, priceInfo in batch] == [238.51, 133.41, 55.19]
+        assert [symbol for symbol, priceInfo in overlapped] == symbols
+        # Slowest is 0.15 seconds, sum 0.35.
+        assert 0.15 <= batchTime < 0.3
+        assert 0.15 <= asyncTime < 0.3
+
+
+@pytest.mark.unit
+def test_record_then_replay(tmp_path):
+    """
+    Replaying a recording should give back the same prices.
+    """
+    class SlowProvider(priceProviders.BasePriceProvider):
+        name = "slow"
+
+        def retrieve_daily_data(self, symbol, mysettings):
+            time.sleep(0.01)
+            priceInfo = PriceInfo()
+            priceInfo.currentPrice = len(symbol)
+            return priceInfo
+
+        def retrieve_historical_prices(self, symbol, oldestDate, newestDate, priceFrequency):
+            return [(oldestDate, 1.5), (newestDate, 2.5)]
+
+    recorder = RecordingProvider(SlowProvider())
+    recorder.retrieve_daily_data_many(["AB", "CDE"], mySettings)
+    recorder.retrieve_historical_prices("AB", date(2023, 1, 2), date(2023, 1, 9), "1wk")
+    recorder.save(tmp_path / "recording.json")
+    provider = ReplayProvider.from_file(tmp_path / "recording.json")
+
+    assert provider.retrieve_daily_data("CDE", mySettings).currentPrice == 3
+    assert provider.quotes["AB"]["latency"] >= 0.01
+    assert provider.retrieve_historical_prices("AB", date(2023, 1, 1), date(2023, 1, 31),
+                                               "1wk") == [(date(2023, 1, 2), 1.5),
+                                                          (date(2023, 1, 9), 2.5)]
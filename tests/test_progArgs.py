@@ -101,8 +101,31 @@ def test_retrieveWithProvider():
     assert myArgs.priceProvider == PriceProvider.yahoo
 
 
+def test_retrieveReplayProvider():
+    args = ["spr.py", "-p", "replay"]
+    myArgs = ProgArgs()
+    myArgs.parse_args(args, defltFile, defltTab)
+    assert myArgs.action == Action.retrieve
+    assert myArgs.priceProvider == PriceProvider.replay
+
+
 def test_noDisplay():
     args = ["spr.py", "-n"]
     myArgs = ProgArgs()
     myArgs.parse_args(args, defltFile, defltTab)
     assert myArgs.display is False
+
+
+def test_benchmark():
+    args = ["spr.py", "-b", "500"]
+    myArgs = ProgArgs()
+    myArgs.parse_args(args, defltFile, defltTab)
+    assert myArgs.action == Action.benchmark
+    assert myArgs.numSecurities == 500
+
+
+def test_benchmarkNotNumber():
+    args = ["spr.py", "-b", "many"]
+    myArgs = ProgArgs()
+    myArgs.parse_args(args, defltFile, defltTab)
+    assert myArgs.action == Action.help
@@ -0,0 +1,155 @@
+"""
+File to test rateLimiter.
+V0.01, October 18, 2026
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+import pytest
+
+from . import addSrcToPath
+
+import rateLimiter
+from rateLimiter import RateLimiter
+import settings
+
+
+@pytest.mark.unit
+class TestRateLimiter():
+
+    def test_spaces_calls(self):
+        """
+        Five calls at 20 per second should take at least four intervals.
+        """
+        limiter = RateLimiter(20)
+        startTime = time.monotonic()
+        for i in range(5):
+            limiter.wait()
+
+        assert time.monotonic() - startTime >= 4 * 0.05 - 0.01
+
+    def test_shared_across_threads(self):
+        """
+        Limit applies to all threads together, not to each thread.
+        """
+        limiter = RateLimiter(20)
+        startTimes = []
+        lock = threading.Lock()
+
+        def worker():
+            for i in range(2):
+                limiter.wait()
+                with lock:
+                    startTimes.append(time.monotonic())
+
+        threads = [threading.Thread(target=worker) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        startTimes.sort()
+        gaps = [later - earlier for earlier, later in zip(startTimes, startTimes[1:])]
+        assert len(startTimes) == 6
+        assert startTimes[-1] - startTimes[0] >= 5 * 0.05 - 0.01
+        assert min(gaps) >= 0.05 - 0.01
+
+    def test_no_limit(self):
+        """
+        Rate of zero shouldn't wait at all.
+        """
+        limiter = RateLimiter(0)
+        startTime = time.monotonic()
+        for i in range(100):
+            limiter.wait()
+
+        assert time.monotonic() - startTime < 0.05
+
+    def test_minute_and_day_budgets(self):
+        """
+        Whole minute budget should be available at once, then callers should wait for
+        it to refill. Same for the day.
+        """
+        minuteLimiter = RateLimiter(0, ratePerMinute=5)
+        dayLimiter = RateLimiter(0, ratePerDay=2)
+        startTime = time.monotonic()
+        for i in range(5):
+            minuteLimiter.wait()
+        elapsed = time.monotonic() - startTime
+        dayDelays = [dayLimiter._book_slot() for i in range(3)]
+
+        assert elapsed < 0.05
+        assert minuteLimiter._book_slot() == pytest.approx(12, abs=0.1)
+        assert dayDelays[:2] == [0, 0]
+        assert dayDelays[2] == pytest.approx(12 * 60 * 60, abs=1)
+
+    def test_async_shares_with_threads(self):
+        """
+        Coroutines should be spaced out too, and share the limit with threads.
+        """
+        limiter = RateLimiter(20)
+        limiter.wait()
+        startTimes = []
+
+        async def request():
+            await limiter.wait_async()
+            startTimes.append(time.monotonic())
+
+        async def run_requests():
+            await asyncio.gather(*[request() for i in range(3)])
+
+        startTime = time.monotonic()
+        asyncio.run(run_requests())
+
+        assert max(startTimes) - startTime >= 3 * 0.05 - 0.01
+
+    def test_limiter_per_provider(self):
+        """
+        Each provider should have one limiter, with its own limits from settings.
+        """
+        mySettings = settings.Settings.instance()
+        rateLimiter.reset_limiters()
+        yahoo = rateLimiter.get_limiter("yahoo", mySettings)
+        alpha = rateLimiter.get_limiter("alpha", mySettings)
+
+        assert rateLimiter.get_limiter("yahoo", mySettings) is yahoo
+        assert alpha is not yahoo
+        assert alpha.buckets[0].capacity == mySettings.alpha_rate_per_minute
+        rateLimiter.reset_limiters()
+
+
+def _wait_in_process(numRequests, startTimes):
+    mySettings = settings.Settings.instance()
+    for i in range(numRequests):
+        rateLimiter.get_limiter("yahoo", mySettings).wait()
+        startTimes.put(time.monotonic())
+
+
+@pytest.mark.unit
+def test_split_between_processes():
+    """
+    Processes forked within split_between should together stay within the limit,
+    rather than each getting all of it, and the limit should be back afterwards.
+    """
+    mySettings = settings.Settings.instance()
+    origRate = mySettings.fetch_rate_per_second
+    mySettings.fetch_rate_per_second = 20
+    mpContext = multiprocessing.get_context("fork")
+    startTimes = mpContext.Queue()
+    numProcesses, numRequests = 2, 6
+    processes = [mpContext.Process(target=_wait_in_process, args=(numRequests, startTimes))
+                 for i in range(numProcesses)]
+    with rateLimiter.split_between(mySettings, numProcesses):
+        for process in processes:
+            process.start()
+    times = sorted(startTimes.get(timeout=5) for i in range(numProcesses * numRequests))
+    for process in processes:
+        process.join()
+    restoredRate = mySettings.fetch_rate_per_second
+    mySettings.fetch_rate_per_second = origRate
+
+    # Each process's first request is straight away, the rest at 20 per second overall.
+    assert times[-1] - times[0] >= (numProcesses * numRequests - numProcesses) / 20 - 0.02
+    assert restoredRate == 20
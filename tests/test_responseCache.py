@@ -0,0 +1,100 @@
+"""
+File to test responseCache.
+V0.01, October 18, 2026
+"""
+
+import gzip
+import os
+import time
+from unittest.mock import patch
+import pytest
+
+from . import addSrcToPath
+
+import responseCache
+from responseCache import ResponseCache
+import settings
+
+
+@pytest.mark.unit
+class TestResponseCache():
+
+    def test_put_and_get(self, tmp_path):
+        """
+        Saved value should come back, from a compressed file, and different keys shouldn't
+        clash.
+        """
+        myCache = ResponseCache(str(tmp_path), 60, 1024 * 1024)
+        key = responseCache.make_key("yahoo", "MSFT", "1d", "2023-01-01", "2023-01-13")
+        myCache.put(key, [["2023-01-02", 239.58]])
+
+        fileNames = os.listdir(tmp_path)
+        with gzip.open(tmp_path / fileNames[0], "rt") as f:
+            contents = f.read()
+
+        assert myCache.get(key) == [["2023-01-02", 239.58]]
+        assert myCache.get(responseCache.make_key("yahoo", "MSFT", "1wk")) is None
+        assert len(fileNames) == 1
+        assert "MSFT" in contents
+        assert (myCache.numHits, myCache.numMisses) == (1, 1)
+
+    def test_expires(self, tmp_path):
+        """
+        Entry older than the time to live shouldn't be used, and should be removed.
+        """
+        myCache = ResponseCache(str(tmp_path), 0.05, 1024 * 1024)
+        myCache.put("key", 1)
+        time.sleep(0.1)
+
+        assert myCache.get("key") is None
+        assert os.listdir(tmp_path) == []
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """
+        Once over the size limit, least recently used entries should go first.
+        """
+        myCache = ResponseCache(str(tmp_path), 60, 1024 * 1024)
+        for num in range(3):
+            myCache.put(f"key{num}", "x" * 100)
+            time.sleep(0.02)
+        entrySize = max(entry.stat().st_size for entry in os.scandir(tmp_path))
+        myCache.maxBytes = entrySize * 3
+        myCache.get("key0")
+        time.sleep(0.02)
+        myCache.put("key3", "x" * 100)
+
+        assert myCache.get("key1") is None
+        assert myCache.get("key0") is not None
+        assert myCache.get("key2") is not None
+        assert myCache.get("key3") is not None
+
+    def test_index_from_directory(self, tmp_path):
+        """
+        Directory should only be scanned once, when first used, not on every put. A new
+        cache in the same directory should pick up existing entries and their sizes.
+        """
+        myCache = ResponseCache(str(tmp_path), 60, 1024 * 1024)
+        with patch.object(ResponseCache, '_list_entries',
+                          wraps=myCache._list_entries) as mockList:
+            for num in range(5):
+                myCache.put(f"key{num}", "x" * 100)
+            myCache.get("key0")
+        totalBytes = sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+        sameDir = ResponseCache(str(tmp_path), 60, 1024 * 1024)
+        sameDir.put("key5", "x" * 100)
+
+        assert mockList.call_count == 1
+        assert myCache.totalBytes == totalBytes
+        assert len(sameDir.entries) == 6
+        assert sameDir.totalBytes == sum(entry.stat().st_size for entry in os.scandir(tmp_path))
+
+    def test_opt_out(self, tmp_path):
+        """
+        With the cache turned off, get_cache should return None.
+        """
+        mySettings = settings.Settings.instance()
+        origEnabled = mySettings.response_cache_enabled
+        mySettings.response_cache_enabled = False
+
+        assert responseCache.get_cache(mySettings) is None
+        mySettings.response_cache_enabled = origEnabled
@@ -3,11 +3,20 @@
 # V0.01, May 2, 2021, GAW
 """
 
+import asyncio
 from datetime import date, timedelta, datetime
+import os
+import time
+from unittest.mock import patch
+import aiohttp
 import pytest
 
 from . import addSrcToPath
+from . import helperMethods
 
+import httpSession
+import responseCache
+from security import PriceInfo
 import settings
 import yahooInterface
 
@@ -152,3 +161,349 @@ class TestRetrievePrices():
                                                            badFrequency)
 
         assert len(prices) == 0
+
+
+@pytest.mark.unit
+class TestRetrievePricesAsync():
+    """
+    Async retrieval, against a local stub server rather than Yahoo.
+    """
+    quotes = {"AMZN": (1500.5, 1490.25, 1012.0, 2345.99),
+              "XOM": (110.0, 108.5, 80.0, 120.0),
+              "CNR.TO": (150.0, 149.0, 130.0, 160.0)}
+
+    def test_daily_many(self):
+        """
+        Prices should be parsed from quote page and chart, in order of symbols,
+        with zero price for symbol the server doesn't know.
+        """
+        symbols = [symbolAmazon, symbolBad, "TSX:CNR", symbolExxon]
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes):
+            prices = asyncio.run(yahooInterface.retrieve_daily_data_many_async(symbols, mysettings))
+
+        assert [symbol for symbol, priceInfo in prices] == symbols
+        amazon = prices[0][1]
+        assert amazon.currentPrice == 1500.5
+        assert amazon.lastClosePrice == 1490.25
+        assert amazon.low52Week == 1012.0
+        assert amazon.high52Week == 2345.99
+        assert prices[1][1].currentPrice == 0
+        assert prices[2][1].currentPrice == 150.0
+        assert prices[3][1].lastClosePrice == 108.5
+
+    def test_daily_requests_overlap(self):
+        """
+        With slow responses, requests should be in flight together, up to the limit.
+        """
+        symbols = [f"S{num}" for num in range(8)]
+        quotes = {symbol: (10.0, 9.0, 5.0, 15.0) for symbol in symbols}
+        origLimit = mysettings.async_fetch_limit
+        mysettings.async_fetch_limit = 4
+        with helperMethods.stub_yahoo_server(mysettings, quotes, delay=0.2) as server:
+            startTime = time.monotonic()
+            prices = asyncio.run(yahooInterface.retrieve_daily_data_many_async(symbols, mysettings))
+            elapsed = time.monotonic() - startTime
+        mysettings.async_fetch_limit = origLimit
+
+        assert all(priceInfo.currentPrice == 10.0 for symbol, priceInfo in prices)
+        assert server.numRequests == 16
+        assert server.maxInProgress == 4
+        # Serially, would be 16 requests * 0.2 seconds.
+        assert elapsed < 2.0
+
+    def test_historical(self):
+        """
+        Should get date/price pairs, skipping the holiday with no price.
+        """
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes):
+            prices = asyncio.run(self._get_history(symbolExxon))
+
+        assert [priceDate.date() for priceDate, price in prices] == [date(2023, 1, 9),
+                                                                     date(2023, 1, 11)]
+        assert [price for priceDate, price in prices] == [108.0, 110.0]
+
+    def test_historical_bad_symbol(self):
+        """
+        Symbol the server doesn't know should return no prices.
+        """
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes) as server:
+            prices = asyncio.run(self._get_history(symbolBad))
+
+        assert prices == []
+        assert server.numRequests == 1
+
+    def test_daily_retries(self):
+        """
+        503s should be retried, up to http_retries times, then give up.
+        """
+        origBackoff = mysettings.http_retry_backoff
+        mysettings.http_retry_backoff = 0
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes) as server:
+            server.numFailures = mysettings.http_retries
+            prices = asyncio.run(yahooInterface.retrieve_daily_data_many_async([symbolExxon],
+                                                                               mysettings))
+            numRetried = server.numRequests
+            server.numFailures = 100
+            failed = asyncio.run(self._get_history(symbolExxon))
+            numFailed = server.numRequests - numRetried
+        mysettings.http_retry_backoff = origBackoff
+
+        assert prices[0][1].currentPrice == 110.0
+        # Failed quote page requests, then quote page and chart.
+        assert numRetried == mysettings.http_retries + 2
+        assert failed == []
+        assert numFailed == mysettings.http_retries + 1
+
+    async def _get_history(self, symbol):
+        async with aiohttp.ClientSession() as session:
+            return await yahooInterface.retrieve_historical_prices_async(
+                session, asyncio.Semaphore(2), symbol, date(2023, 1, 9), date(2023, 1, 12),
+                mysettings.daily_price_code, mysettings)
+
+
+@pytest.mark.unit
+class TestRetrievePricesSession():
+    """
+    Retrieval through the shared http session, against a local stub server.
+    """
+    quotes = TestRetrievePricesAsync.quotes
+
+    def test_daily(self):
+        """
+        Prices should come from quote page and chart, with zero price for a symbol the
+        server doesn't know, and requests should share a connection.
+        """
+        httpSession.close_session()
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes):
+            amazon = yahooInterface.retrieve_daily_data(symbolAmazon, mysettings)
+            bad = yahooInterface.retrieve_daily_data(symbolBad, mysettings)
+            canadian = yahooInterface.retrieve_daily_data("TSX:CNR", mysettings)
+
+        assert amazon.currentPrice == 1500.5
+        assert amazon.lastClosePrice == 1490.25
+        assert amazon.low52Week == 1012.0
+        assert amazon.high52Week == 2345.99
+        assert bad.currentPrice == 0
+        assert canadian.currentPrice == 150.0
+        assert httpSession.stats.numRequests == 5
+        assert httpSession.stats.numNewConnections == 1
+
+    def test_historical(self):
+        """
+        Same date/price pairs as the async version.
+        """
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes):
+            prices = yahooInterface.retrieve_historical_prices(
+                symbolExxon, date(2023, 1, 9), date(2023, 1, 12), mysettings.daily_price_code)
+            badPrices = yahooInterface.retrieve_historical_prices(
+                symbolBad, date(2023, 1, 9), date(2023, 1, 12), mysettings.daily_price_code)
+
+        assert [priceDate.date() for priceDate, price in prices] == [date(2023, 1, 9),
+                                                                     date(2023, 1, 11)]
+        assert [price for priceDate, price in prices] == [108.0, 110.0]
+        assert badPrices == []
+
+    def test_breaker_opens(self):
+        """
+        Once enough calls fail, remaining symbols should fail without any requests,
+        until the cool down is over.
+        """
+        origSettings = (mysettings.http_retries, mysettings.breaker_min_calls,
+                        mysettings.breaker_cool_down)
+        mysettings.http_retries = 0
+        mysettings.breaker_min_calls = 2
+        mysettings.breaker_cool_down = 0.2
+        httpSession.close_session()
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes) as server:
+            server.numFailures = 2
+            failed = [yahooInterface.retrieve_daily_data(symbol, mysettings)
+                      for symbol in [symbolAmazon, symbolExxon, "TSX:CNR", symbolExxon]]
+            numRequests = server.numRequests
+            breaker = yahooInterface.get_breaker(mysettings)
+            numRejected = breaker.numRejected
+            time.sleep(0.25)
+            recovered = yahooInterface.retrieve_daily_data(symbolExxon, mysettings)
+        httpSession.close_session()
+        mysettings.http_retries, mysettings.breaker_min_calls, mysettings.breaker_cool_down = \
+            origSettings
+
+        assert all(priceInfo.currentPrice == 0 for priceInfo in failed)
+        assert numRequests == 2
+        assert numRejected == 2
+        assert recovered.currentPrice == 110.0
+        assert breaker.state.name == "closed"
+
+    def test_daily_retries(self):
+        """
+        503s should be retried, up to http_retries times, as the async version does.
+        """
+        origBackoff = mysettings.http_retry_backoff
+        mysettings.http_retry_backoff = 0
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes) as server:
+            server.numFailures = mysettings.http_retries
+            exxon = yahooInterface.retrieve_daily_data(symbolExxon, mysettings)
+            numRetried = server.numRequests
+            server.numFailures = 100
+            failed = yahooInterface.retrieve_historical_prices(
+                symbolExxon, date(2023, 1, 9), date(2023, 1, 12), mysettings.daily_price_code)
+            numFailed = server.numRequests - numRetried
+        mysettings.http_retry_backoff = origBackoff
+
+        assert exxon.currentPrice == 110.0
+        # Failed quote page requests, then quote page and chart.
+        assert numRetried == mysettings.http_retries + 2
+        assert failed == []
+        assert numFailed == mysettings.http_retries + 1
+
+    def test_cached(self, tmp_path):
+        """
+        Prices in a seeded cache shouldn't be requested. Prices requested should be
+        saved, so the next call doesn't request them again.
+        """
+        seeded = {responseCache.make_key("yahoo", symbolAmazon, "quote", date.today()):
+                  {"currentPrice": 1.5, "lastClosePrice": 1.25, "low52Week": 1.0,
+                   "high52Week": 2.0}}
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes) as server, \
+                helperMethods.response_cache(mysettings, tmp_path, seeded, True) as myCache:
+            amazon = yahooInterface.retrieve_daily_data(symbolAmazon, mysettings)
+            numAfterSeeded = server.numRequests
+            for i in range(2):
+                prices = yahooInterface.retrieve_historical_prices(
+                    symbolExxon, date(2023, 1, 9), date(2023, 1, 12), mysettings.daily_price_code)
+            numAfterHistory = server.numRequests
+
+        assert amazon.currentPrice == 1.5
+        assert amazon.high52Week == 2.0
+        assert numAfterSeeded == 0
+        assert numAfterHistory == 1
+        assert [price for priceDate, price in prices] == [108.0, 110.0]
+        assert prices[0][0].date() == date(2023, 1, 9)
+        assert myCache.numHits == 2
+
+    def test_quotes_not_cached(self, tmp_path):
+        """
+        Unless response_cache_quotes is on, quotes should be requested every time,
+        as they change during the day, and shouldn't be saved.
+        """
+        with helperMethods.stub_yahoo_server(mysettings, self.quotes) as server, \
+                helperMethods.response_cache(mysettings, tmp_path) as myCache:
+            amazon = yahooInterface.retrieve_daily_data(symbolAmazon, mysettings)
+            numFirst = server.numRequests
+            yahooInterface.retrieve_daily_data(symbolAmazon, mysettings)
+
+        assert amazon.currentPrice > 0
+        assert numFirst > 0
+        assert server.numRequests == 2 * numFirst
+        assert myCache.numHits == 0
+        assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.unit
+class TestRetrieveQuoteBatch():
+    """
+    Multi-symbol quotes, from a recorded response served by a local stub server. The
+    per-symbol fallback is mocked, to record which symbols needed it.
+    """
+    batchQuotes = helperMethods.load_fixture("yahoo_quote_batch.json")
+
+    def _get_fallback(self, symbol, mysettings):
+        priceInfo = PriceInfo()
+        priceInfo.currentPrice = 1.0
+        return priceInfo
+
+    def test_daily_many(self):
+        """
+        Prices for symbols in the response should come from it, in batches, in order of
+        symbols. Missing symbols, or ones without all fields, should fall back.
+        """
+        symbols = ["MSFT", "TSX:SHOP", symbolBad, "AAPL", "XIU.TRT"]
+        origBatchSize = mysettings.yahoo_quote_batch_size
+        mysettings.yahoo_quote_batch_size = 3
+        with helperMethods.stub_yahoo_server(mysettings, {}, batchQuotes=self.batchQuotes) \
+                as server, \
+                patch('yahooInterface.retrieve_daily_data',
+                      side_effect=self._get_fallback) as mockFallback:
+            prices = yahooInterface.retrieve_daily_data_many(symbols, mysettings)
+        mysettings.yahoo_quote_batch_size = origBatchSize
+
+        assert [symbol for symbol, priceInfo in prices] == symbols
+        microsoft = prices[0][1]
+        assert microsoft.currentPrice == 238.51
+        assert microsoft.lastClosePrice == 239.63
+        assert microsoft.low52Week == 213.43
+        assert microsoft.high52Week == 315.95
+        assert prices[1][1].high52Week == 1368.99
+        assert prices[3][1].currentPrice == 133.41
+        assert server.batchRequests == [["MSFT", "SHOP.TO", symbolBad], ["AAPL", "XIU.TO"]]
+        assert [x.args[0] for x in mockFallback.call_args_list] == [symbolBad, "XIU.TRT"]
+
+    def test_failed_batch_falls_back(self):
+        """
+        If the batch request fails, every symbol should fall back.
+        """
+        origUrl = mysettings.yahooBatchQuoteUrl
+        mysettings.yahooBatchQuoteUrl = "http://127.0.0.1:9/batchquote"
+        with patch('yahooInterface.retrieve_daily_data',
+                   side_effect=self._get_fallback) as mockFallback:
+            prices = yahooInterface.retrieve_daily_data_many(["MSFT", "AAPL"], mysettings)
+        mysettings.yahooBatchQuoteUrl = origUrl
+
+        assert [priceInfo.currentPrice for symbol, priceInfo in prices] == [1.0, 1.0]
+        assert mockFallback.call_count == 2
+
+
+@pytest.mark.unit
+class TestParseQuotePage():
+    """
+    Single pass quote page parser, against the read_html parser. The page is synthetic,
+    laid out like a Yahoo quote page, with the header and embedded json it has.
+    """
+    quotePage = helperMethods.load_fixture("yahoo_quote_page_synthetic.html")
+
+    def _get_fields(self, quoteTable):
+        return (float(str(quoteTable["Previous Close"]).replace(",", "")),
+                yahooInterface._split_price_range(str(quoteTable["52 Week Range"])))
+
+    def test_value_cells(self):
+        quoteTable = yahooInterface._parse_quote_page(self.quotePage)
+
+        assert self._get_fields(quoteTable) == (239.63, (213.43, 315.95))
+        assert self._get_fields(quoteTable) == \
+            self._get_fields(yahooInterface._parse_quote_tables(self.quotePage))
+
+    def test_other_symbol_first(self):
+        """
+        Another symbol's quote data earlier in the page, in json or in a header table
+        without value cells, shouldn't be used.
+        """
+        otherQuote = ('<script>{"^GSPC":{"regularMarketPreviousClose":{"raw":3999.09},'
+                      '"fiftyTwoWeekRange":{"raw":"3491.58 - 4818.62"},"symbol":"^GSPC"}}'
+                      '</script><table><tr><td>Previous Close</td><td>3,999.09</td></tr>'
+                      '</table>')
+        pageHtml = self.quotePage.replace("<body>", "<body>" + otherQuote, 1)
+        quoteTable = yahooInterface._parse_quote_page(pageHtml)
+
+        assert self._get_fields(quoteTable) == (239.63, (213.43, 315.95))
+
+    def test_label_rows(self):
+        """
+        Without the value cells, should find the same values in the table rows.
+        """
+        pageHtml = self.quotePage.replace('-value"', '-other"')
+        with patch('yahooInterface._parse_quote_tables') as mockTables:
+            quoteTable = yahooInterface._parse_quote_page(pageHtml)
+
+        assert self._get_fields(quoteTable) == (239.63, (213.43, 315.95))
+        assert not mockTables.called
+
+    def test_falls_back_to_read_html(self):
+        """
+        Page layout that neither finds should go to read_html.
+        """
+        pageHtml = "<html><body><p>Previous Close 1.00</p></body></html>"
+        with patch('yahooInterface._parse_quote_tables',
+                   return_value={"Previous Close": "1.00"}) as mockTables:
+            quoteTable = yahooInterface._parse_quote_page(pageHtml)
+
+        assert quoteTable == {"Previous Close": "1.00"}
+        mockTables.assert_called_once_with(pageHtml)
@@ -19,6 +19,9 @@ get_securities
     No records
     One record
     Multiple records
+update_securities_bulk
+    Upsert succeeds
+    Upsert fails
 update_security
     No matching security in table
     No fields to update
@@ -97,6 +100,18 @@ class TestSecuritiesInterface():
             assert len(results) == 2
             mock_select.assert_called_once()
 
+    def test_iter_securities(self):
+        """
+        Streaming version should pass chunk size through to select_iter.
+        """
+        with patch('securitiesInterface.dbAccess.select_iter', return_value=Mock()) as mock_iter:
+            mock_iter.return_value = iter([[{"id": 1}, {"id": 3}]])
+            myInterface = SecuritiesInterface()
+            chunks = list(myInterface.iter_securities(chunkSize=2))
+            assert chunks == [[{"id": 1}, {"id": 3}]]
+            mock_iter.assert_called_once_with(myInterface.securitiesTable,
+                                              myInterface.fieldNames, "1=1", chunkSize=2)
+
     def test_add_security_already_exists(self):
         """
         Try inserting a security when symbol already exists - expect to fail.
@@ -145,6 +160,29 @@ class TestSecuritiesInterface():
             assert not wasUpdated
             mock_update.assert_called_once()
 
+    def test_update_securities_bulk(self):
+        """
+        Bulk update should send all rows in a single upsert, keyed on id.
+        """
+        with patch('securitiesInterface.dbAccess.upsert_many', return_value=Mock()) as mock_upsert:
+            mock_upsert.return_value = 4
+            myInterface = SecuritiesInterface()
+            fields = ["name", "symbol", "currentPrice"]
+            rows = [[1, "Apple", "AAPL", 154.2], [3, "Meta", "FBOOK", 55.1]]
+            wasUpdated = myInterface.update_securities_bulk(fields, rows)
+            assert wasUpdated
+            mock_upsert.assert_called_once_with(myInterface.securitiesTable, ["id"], fields, rows)
+
+    def test_update_securities_bulk_fails(self):
+        """
+        Bulk update should report failure if upsert fails.
+        """
+        with patch('securitiesInterface.dbAccess.upsert_many', return_value=Mock()) as mock_upsert:
+            mock_upsert.return_value = -1
+            myInterface = SecuritiesInterface()
+            wasUpdated = myInterface.update_securities_bulk(["name"], [[1, "Apple"]])
+            assert not wasUpdated
+
     def test_delete_security_match(self):
         """
         Try deleting a security that exists.
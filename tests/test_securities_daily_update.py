@@ -3,19 +3,24 @@ File to test daily update parts of the Securities class.
 V0.01, December 11, 2022, GAW
 """
 
+import asyncio
 from datetime import date, timedelta
 from decimal import Decimal
+import json
 import pytest
+import threading
 from unittest.mock import Mock, patch
 
 from . import addSrcToPath
 from . import helperMethods
 
 import dbAccess
+import priceProviders
 import securities
 import securitiesInterface
-from security import Security
+from security import PriceInfo, Security
 import settings
+from targetSecurity import TargetSecurity
 import utilsInterface
 from yahooInterface import retrieve_daily_data
 
@@ -425,3 +430,299 @@ class TestSecurities():
         print(f"_get_latest_weekday is returning {latest}")
 
         return latest
+
+
+@pytest.mark.unit
+class TestDailyUpdateBatches():
+    """
+    Batched saving of daily prices - runs on an in memory SQLite database, with
+    price retrieval mocked.
+    """
+
+    @pytest.fixture()
+    def batchSecurities(self):
+        with helperMethods.sqlite_database(mySettings):
+            origBatchSize = mySettings.daily_price_batch_size
+            origWorkers = mySettings.fetch_workers
+            mySettings.daily_price_batch_size = 2
+            mySettings.fetch_workers = 1
+            mySecurities = securities.Securities()
+            mySecurities.utilsInter.connect()
+            for num in range(5):
+                target = TargetSecurity()
+                target.name, target.symbol = f"Security {num}", f"SEC{num}"
+                target.buyPrice, target.sellPrice = 10, 20
+                mySecurities.securitiesInter.add_security(target)
+            mySecurities.load()
+            yield mySecurities
+            mySecurities.utilsInter.disconnect()
+            mySettings.daily_price_batch_size = origBatchSize
+            mySettings.fetch_workers = origWorkers
+
+    def _get_price_info(self, symbol, mySettings):
+        priceInfo = PriceInfo()
+        priceInfo.currentPrice = 15 + int(symbol[-1])
+        priceInfo.lastClosePrice = 14
+        priceInfo.low52Week = 9
+        priceInfo.high52Week = 21
+        return priceInfo
+
+    def test_saved_in_batches(self, batchSecurities):
+        """
+        Five securities with batch size two should be three inserts, one price each.
+        """
+        currentDate = date(2023, 1, 11)
+        symbols = list(batchSecurities.securitiesDict.keys())
+        with patch('yahooInterface.retrieve_daily_data', side_effect=self._get_price_info), \
+                patch('dbAccess.insert_data', wraps=dbAccess.insert_data) as mock_insert:
+            numUpdated = batchSecurities._update_daily_prices(symbols, currentDate, False, None)
+
+        prices = dbAccess.select_data(mySettings.db_daily_table_name,
+                                      ["securityId", "price"], "priceDate = %s", (currentDate,))
+        batchSecurities.load()
+
+        assert numUpdated == 5
+        assert mock_insert.call_count == 3
+        assert len(prices) == 5
+        assert batchSecurities.securitiesDict["SEC3"].currentPrice == 18
+        assert batchSecurities.securitiesDict["SEC3"].currentPriceDate == currentDate
+
+    def test_resave_is_idempotent(self, batchSecurities):
+        """
+        Saving the same prices twice shouldn't duplicate them.
+        """
+        currentDate = date(2023, 1, 11)
+        priceRows = [(1, currentDate, Decimal("15.00")), (2, currentDate, Decimal("16.00"))]
+
+        batchSecurities.historyInter.save_daily_prices(priceRows)
+        batchSecurities.historyInter.save_daily_prices(priceRows)
+        prices = dbAccess.select_data(mySettings.db_daily_table_name, ["id"], "1=1")
+
+        assert len(prices) == 2
+
+    def test_failed_batch(self, batchSecurities):
+        """
+        If a batch fails, just its securities should be left unchanged, and the weekly
+        update shouldn't be marked as done.
+        """
+        currentDate = date(2023, 1, 13)
+        symbols = list(batchSecurities.securitiesDict.keys())
+        origBulk = batchSecurities.securitiesInter.update_securities_bulk
+        calls = []
+
+        def fail_second_batch(fieldNames, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                dbAccess.update_data("noSuchTable", ["x"], [1], "1=1")
+            return origBulk(fieldNames, rows)
+
+        with patch('yahooInterface.retrieve_daily_data', side_effect=self._get_price_info), \
+                patch.object(batchSecurities.securitiesInter, 'update_securities_bulk',
+                             side_effect=fail_second_batch):
+            numUpdated = batchSecurities._update_daily_prices(symbols, currentDate, True,
+                                                              currentDate)
+
+        weeklyPrices = dbAccess.select_data(mySettings.db_weekly_table_name, ["id"], "1=1")
+
+        assert numUpdated == 3
+        assert batchSecurities.securitiesDict["SEC2"].currentPrice == 0
+        assert batchSecurities.securitiesDict["SEC4"].currentPrice == 19
+        assert len(weeklyPrices) == 3
+        assert batchSecurities.utilsInter.get_last_weekly_update_date() is None
+
+    def test_concurrent_fetch(self, batchSecurities):
+        """
+        With several workers, prices should be fetched on pool threads, but all saved
+        from the calling thread, with same results as fetching one at a time.
+        """
+        currentDate = date(2023, 1, 11)
+        symbols = list(batchSecurities.securitiesDict.keys())
+        fetchThreads = set()
+        saveThreads = set()
+        origSave = batchSecurities.historyInter.save_daily_prices
+
+        def fetch(symbol, mySettings):
+            fetchThreads.add(threading.current_thread().name)
+            return self._get_price_info(symbol, mySettings)
+
+        def save(priceRows):
+            saveThreads.add(threading.current_thread().name)
+            return origSave(priceRows)
+
+        mySettings.fetch_workers = 3
+        with patch('yahooInterface.retrieve_daily_data', side_effect=fetch), \
+                patch.object(batchSecurities.historyInter, 'save_daily_prices', side_effect=save):
+            numUpdated = batchSecurities._update_daily_prices(symbols, currentDate, False, None)
+
+        prices = dbAccess.select_data(mySettings.db_daily_table_name, ["securityId", "price"],
+                                      "1=1 ORDER BY securityId")
+
+        assert numUpdated == 5
+        assert [x["price"] for x in prices] == [15, 16, 17, 18, 19]
+        assert threading.current_thread().name not in fetchThreads
+        assert saveThreads == {threading.current_thread().name}
+
+    def test_async_update(self, batchSecurities):
+        """
+        Async update should fetch prices from the (stub) server and save them, in
+        batches, the same as the threaded update.
+        """
+        currentDate = date(2023, 1, 11)
+        quotes = {f"SEC{num}": (15.0 + num, 14.0, 9.0, 21.0) for num in range(5)}
+
+        with helperMethods.stub_yahoo_server(mySettings, quotes) as server, \
+                patch.object(batchSecurities, '_are_all_downloaded', return_value=True), \
+                patch.object(batchSecurities, '_is_weekly_price_update_due', return_value=False):
+            numUpdated = asyncio.run(batchSecurities.do_daily_price_update_async(currentDate))
+
+        prices = dbAccess.select_data(mySettings.db_daily_table_name, ["securityId", "price"],
+                                      "1=1 ORDER BY securityId")
+
+        assert numUpdated == 5
+        assert server.numRequests == 10
+        assert [x["price"] for x in prices] == [15, 16, 17, 18, 19]
+        assert batchSecurities.securitiesDict["SEC4"].currentPrice == 19
+
+    def test_batch_quotes(self, batchSecurities):
+        """
+        With batch_quotes on, prices should all come from the batch call, not one at a
+        time, and be saved the same way.
+        """
+        currentDate = date(2023, 1, 11)
+
+        def fetch_many(symbols, mySettings):
+            return [(symbol, self._get_price_info(symbol, mySettings)) for symbol in symbols]
+
+        mySettings.batch_quotes = True
+        with patch('yahooInterface.retrieve_daily_data_many',
+                   side_effect=fetch_many) as mockMany, \
+                patch('yahooInterface.retrieve_daily_data') as mockSingle, \
+                patch.object(batchSecurities, '_are_all_downloaded', return_value=True), \
+                patch.object(batchSecurities, '_is_weekly_price_update_due', return_value=False):
+            numUpdated = batchSecurities.do_daily_price_update(currentDate)
+        mySettings.batch_quotes = False
+
+        assert numUpdated == 5
+        mockMany.assert_called_once()
+        mockSingle.assert_not_called()
+        assert batchSecurities.securitiesDict["SEC4"].currentPrice == 19
+
+    def test_batch_quotes_not_deferred(self, batchSecurities):
+        """
+        With batch_quotes on, many symbols share a request, so time for one request
+        should be enough for all five, rather than deferring four.
+        """
+        currentDate = date(2023, 1, 11)
+
+        def fetch_many(symbols, mySettings):
+            return [(symbol, self._get_price_info(symbol, mySettings)) for symbol in symbols]
+
+        origSettings = mySettings.batch_quotes, mySettings.fetch_rate_per_second
+        mySettings.batch_quotes = True
+        mySettings.fetch_rate_per_second = 2
+        batchSecurities.timeLeft = lambda: mySettings.daily_update_stop_margin + 0.5
+        with patch('yahooInterface.retrieve_daily_data_many',
+                   side_effect=fetch_many) as mockMany, \
+                patch.object(batchSecurities, '_are_all_downloaded', return_value=True), \
+                patch.object(batchSecurities, '_is_weekly_price_update_due', return_value=False):
+            numUpdated = batchSecurities.do_daily_price_update(currentDate)
+        mySettings.batch_quotes, mySettings.fetch_rate_per_second = origSettings
+
+        assert numUpdated == 5
+        assert len(mockMany.call_args[0][0]) == 5
+        assert not batchSecurities.symbolsDeferred
+
+    def test_replay_provider(self, batchSecurities, tmp_path):
+        """
+        With price_provider set to replay, prices should come from the recording,
+        without patching anything, and a symbol missing from it should be left alone.
+        """
+        currentDate = date(2023, 1, 11)
+        quotes = {f"SEC{num}": {"currentPrice": 15 + num, "lastClosePrice": 14,
+                                "low52Week": 9, "high52Week": 21, "latency": 0.01}
+                  for num in range(4)}
+        replayFile = tmp_path / "recording.json"
+        replayFile.write_text(json.dumps({"quotes": quotes, "histories": {}}))
+        origSettings = mySettings.price_provider, mySettings.replay_file
+        mySettings.price_provider = "replay"
+        mySettings.replay_file = str(replayFile)
+        priceProviders.reset_providers()
+        replaySecurities = securities.Securities()
+        replaySecurities.load()
+        mySettings.price_provider, mySettings.replay_file = origSettings
+        priceProviders.reset_providers()
+        with patch.object(replaySecurities, '_are_all_downloaded', return_value=True), \
+                patch.object(replaySecurities, '_is_weekly_price_update_due', return_value=False):
+            numUpdated = replaySecurities.do_daily_price_update(currentDate)
+
+        assert replaySecurities.provider.name == "replay"
+        assert numUpdated == 4
+        assert replaySecurities.securitiesDict["SEC3"].currentPrice == 18
+        assert replaySecurities.securitiesDict["SEC4"].currentPrice != 19
+
+    def test_resumes_after_deadline(self, batchSecurities):
+        """
+        Running out of time after two securities should save them, and leave weekly
+        and grooming. Next run should only fetch the other three, then do the rest.
+        """
+        fetchedSymbols = []
+
+        def fetch(symbol, mySettings):
+            fetchedSymbols.append(symbol)
+            return self._get_price_info(symbol, mySettings)
+
+        with patch('yahooInterface.retrieve_daily_data', side_effect=fetch), \
+                patch.object(batchSecurities, '_are_all_downloaded', return_value=True), \
+                patch.object(batchSecurities, '_is_weekly_price_update_due', return_value=True):
+            batchSecurities.do_daily_updates(lambda: 300 if len(fetchedSymbols) < 2 else 30)
+            firstRun = list(fetchedSymbols)
+            firstFinished = batchSecurities.daily_update_finished()
+            firstWeekly = batchSecurities.utilsInter.get_last_weekly_update_date()
+            firstGroom = batchSecurities.utilsInter.get_last_groom_date()
+
+            fetchedSymbols.clear()
+            batchSecurities.do_daily_updates(lambda: 300)
+
+        prices = dbAccess.select_data(mySettings.db_daily_table_name, ["securityId"], "1=1")
+
+        assert firstRun == ["SEC0", "SEC1"]
+        assert not firstFinished
+        assert firstWeekly is None
+        assert firstGroom is None
+        assert fetchedSymbols == ["SEC2", "SEC3", "SEC4"]
+        assert batchSecurities.daily_update_finished()
+        assert len(prices) == 5
+        assert batchSecurities.utilsInter.get_last_weekly_update_date() == date.today()
+        assert batchSecurities.utilsInter.get_last_groom_date() == date.today()
+
+    def test_priority_and_deferral(self, batchSecurities):
+        """
+        With only time for three fetches, of two requests each, should fetch buy and
+        sell zones, then near buy, and defer the rest, leaving weekly prices for the
+        next run.
+        """
+        currentDate = date(2023, 1, 11)
+        # Buy 10, sell 20 for all. SEC0 middle, SEC1 near sell, SEC2 sell, SEC3 buy,
+        # SEC4 near buy.
+        for symbol, lastPrice in zip(["SEC0", "SEC1", "SEC2", "SEC3", "SEC4"],
+                                     [15, 19, 25, 8, 10.5]):
+            batchSecurities.securitiesDict[symbol].currentPrice = lastPrice
+        fetchedSymbols = []
+
+        def fetch(symbol, mySettings):
+            fetchedSymbols.append(symbol)
+            return self._get_price_info(symbol, mySettings)
+
+        origRate = mySettings.fetch_rate_per_second
+        mySettings.fetch_rate_per_second = 2
+        batchSecurities.timeLeft = lambda: mySettings.daily_update_stop_margin + 3.5
+        with patch('yahooInterface.retrieve_daily_data', side_effect=fetch), \
+                patch.object(batchSecurities, '_are_all_downloaded', return_value=True), \
+                patch.object(batchSecurities, '_is_weekly_price_update_due', return_value=True):
+            numUpdated = batchSecurities.do_daily_price_update(currentDate)
+        mySettings.fetch_rate_per_second = origRate
+
+        assert fetchedSymbols == ["SEC2", "SEC3", "SEC4"]
+        assert numUpdated == 3
+        assert not batchSecurities.daily_update_finished()
+        assert batchSecurities.utilsInter.get_last_weekly_update_date() is None
@@ -3,7 +3,10 @@ File to test loading security price histories via the Securities class
 V0.01, December 7, 2022, GAW
 """
 
+from datetime import date, timedelta
 from decimal import Decimal
+import threading
+from unittest.mock import patch
 import pytest
 
 from . import addSrcToPath
@@ -13,6 +16,7 @@ import dbAccess
 import securities
 from security import Security
 import settings
+from targetSecurity import TargetSecurity
 import utilsInterface
 import yahooInterface
 
@@ -209,3 +213,98 @@ class TestSecuritiesLoadHistory():
         for tmpSecurity in secsDict.values():
             dbAccess.delete_data(self.dailyDbName, query, tmpSecurity.id)
             dbAccess.delete_data(self.weeklyDbName, query, tmpSecurity.id)
+
+
+@pytest.mark.unit
+class TestParallelBackfill():
+    """
+    Backfilling histories with several workers - runs on an in memory SQLite database,
+    with price retrieval mocked.
+    """
+
+    @pytest.fixture()
+    def backfillSecurities(self):
+        with helperMethods.sqlite_database(mySettings):
+            origBatchSize = mySettings.history_batch_size
+            origWorkers = mySettings.fetch_workers
+            mySettings.history_batch_size = 2
+            mySettings.fetch_workers = 3
+            mySecurities = securities.Securities()
+            mySecurities.utilsInter.connect()
+            for symbol in ["SEC1", "SEC2", "BAD", "BOOM", "SEC3", "SEC4", "SEC5"]:
+                target = TargetSecurity()
+                target.name, target.symbol = f"Security {symbol}", symbol
+                target.buyPrice, target.sellPrice = 10, 20
+                mySecurities.securitiesInter.add_security(target)
+            # add_security stores "N", which MySQL turns into 0, but SQLite keeps as text.
+            dbAccess.update_data(mySettings.db_securities_table_name, ["fullHistoryDownloaded"],
+                                 [False], "1=1")
+            mySecurities.load()
+            yield mySecurities
+            mySecurities.utilsInter.disconnect()
+            mySettings.history_batch_size = origBatchSize
+            mySettings.fetch_workers = origWorkers
+
+    def _get_history(self, symbol, oldestDate, newestDate, priceFrequency):
+        """
+        Stand in for retrieve_historical_prices - three prices per security, none for
+        BAD, and an exception for BOOM.
+        """
+        if symbol == "BOOM":
+            raise RuntimeError("Connection reset")
+        if symbol == "BAD":
+            return []
+        self.fetchThreads.add(threading.current_thread().name)
+        return [(date(2023, 1, 9) + timedelta(days=i), 10 + i) for i in range(3)]
+
+    def test_backfill(self, backfillSecurities):
+        """
+        Good securities should be saved and marked, in batches, bad ones skipped.
+        """
+        self.fetchThreads = set()
+        with patch('yahooInterface.retrieve_historical_prices', side_effect=self._get_history), \
+                patch.object(backfillSecurities.historyInter, 'save_full_histories',
+                             wraps=backfillSecurities.historyInter.save_full_histories) as saveMock:
+            numDownloaded = backfillSecurities.retrieve_full_price_histories()
+
+        dailyPrices = dbAccess.select_data(mySettings.db_daily_table_name, ["securityId"], "1=1")
+        weeklyPrices = dbAccess.select_data(mySettings.db_weekly_table_name, ["securityId"], "1=1")
+        backfillSecurities.load()
+        downloaded = {symbol for symbol, tmpSecurity in backfillSecurities.securitiesDict.items()
+                      if tmpSecurity.fullHistoryDownloaded}
+
+        assert numDownloaded == 5
+        assert saveMock.call_count == 3
+        assert len(dailyPrices) == 15
+        assert len(weeklyPrices) == 15
+        assert downloaded == {"SEC1", "SEC2", "SEC3", "SEC4", "SEC5"}
+        assert threading.current_thread().name not in self.fetchThreads
+
+    def test_failed_batch(self, backfillSecurities):
+        """
+        Securities in a batch that fails to save shouldn't be marked as downloaded,
+        the rest should.
+        """
+        self.fetchThreads = set()
+        origSave = backfillSecurities.historyInter.save_full_histories
+        callCount = {"num": 0}
+
+        def fail_first_batch(histories):
+            callCount["num"] += 1
+            if callCount["num"] == 1:
+                dbAccess.insert_data("noSuchTable", ["price"], [(1,)])
+                return False
+            return origSave(histories)
+
+        mySettings.fetch_workers = 1
+        with patch('yahooInterface.retrieve_historical_prices', side_effect=self._get_history), \
+                patch.object(backfillSecurities.historyInter, 'save_full_histories',
+                             side_effect=fail_first_batch):
+            numDownloaded = backfillSecurities.retrieve_full_price_histories()
+
+        backfillSecurities.load()
+        downloaded = {symbol for symbol, tmpSecurity in backfillSecurities.securitiesDict.items()
+                      if tmpSecurity.fullHistoryDownloaded}
+
+        assert numDownloaded == 3
+        assert downloaded == {"SEC3", "SEC4", "SEC5"}
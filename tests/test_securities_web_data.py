@@ -4,14 +4,15 @@ V0.01, December 19, 2022, GAW
 """
 
 from datetime import date, timedelta
-from decimal import Decimal
 import random
 from unittest.mock import Mock, patch
+import numpy as np
 import pytest
 
 from . import addSrcToPath
 from . import helperMethods
 
+import historicalPricesInterface
 import securities
 from security import Security
 import settings
@@ -98,16 +99,16 @@ class TestSecuritiesWebData():
         mySec = self.secsDict["AAPL"]
         mySecs = getSecurities
         mySecs.securitiesDict = {"AAPL": mySec}
-        with patch('historicalPricesInterface.HistoricalPricesInterface.get_historical_prices',
-                   return_value=Mock()) as mock_get:
-            mock_get.return_value = self._get_historical_prices(numDays)
+        with patch.object(historicalPricesInterface.HistoricalPricesInterface,
+                          'get_historical_prices_for_all', return_value=Mock()) as mock_get:
+            mock_get.return_value = self._get_prices_for_all(mySecs, numDays)
 
             myPi = mySecs.get_web_data("1day")
             print(f"myPi={myPi}")
 
             assert len(myPi) == 1
             assert len(myPi[0].periodPrices) == numDays
-            mock_get.assert_called_once_with(mySec.id, self.dailyDbName, numDays)
+            mock_get.assert_called_once_with(self.dailyDbName, numDays)
 
     def test_30Days_two_item(self, getSecurities):
         """
@@ -118,15 +119,15 @@ class TestSecuritiesWebData():
         msftSec = self.secsDict["MSFT"]
         mySecs = getSecurities
         mySecs.securitiesDict = {"AAPL": applSec, "MSFT": msftSec}
-        with patch('historicalPricesInterface.HistoricalPricesInterface.get_historical_prices',
-                   return_value=Mock()) as mock_get:
-            mock_get.return_value = self._get_historical_prices(numDays)
+        with patch.object(historicalPricesInterface.HistoricalPricesInterface,
+                          'get_historical_prices_for_all', return_value=Mock()) as mock_get:
+            mock_get.return_value = self._get_prices_for_all(mySecs, numDays)
 
             myPi = mySecs.get_web_data("30days")
 
             assert len(myPi) == 2
             assert myPi[0].periodDates[0] == date.today() - timedelta(numDays)
-            mock_get.assert_called_with(msftSec.id, self.dailyDbName, numDays)
+            mock_get.assert_called_once_with(self.dailyDbName, numDays)
 
     def test_90Days_three_item(self, getSecurities):
         """
@@ -135,15 +136,15 @@ class TestSecuritiesWebData():
         numDays = 93
         mySecs = getSecurities
         mySecs.securitiesDict = self.secsDict
-        with patch('historicalPricesInterface.HistoricalPricesInterface.get_historical_prices',
-                   return_value=Mock()) as mock_get:
-            mock_get.return_value = self._get_historical_prices(numDays)
+        with patch.object(historicalPricesInterface.HistoricalPricesInterface,
+                          'get_historical_prices_for_all', return_value=Mock()) as mock_get:
+            mock_get.return_value = self._get_prices_for_all(mySecs, numDays)
 
             myPi = mySecs.get_web_data("3months")
 
             assert len(myPi) == 3
             assert myPi[0].periodDates[0] == date.today() - timedelta(numDays)
-            mock_get.assert_called_with(self.secsDict["GOOGL"].id, self.dailyDbName, numDays)
+            mock_get.assert_called_once_with(self.dailyDbName, numDays)
 
 
     @pytest.mark.parametrize("numDays, timePeriod",
@@ -156,22 +157,34 @@ class TestSecuritiesWebData():
         """
         mySecs = getSecurities
         mySecs.securitiesDict = self.secsDict
-        with patch('historicalPricesInterface.HistoricalPricesInterface.get_historical_prices',
-                   return_value=Mock()) as mock_get:
-            mock_get.return_value = self._get_historical_prices(numDays)
+        with patch.object(historicalPricesInterface.HistoricalPricesInterface,
+                          'get_historical_prices_for_all', return_value=Mock()) as mock_get:
+            mock_get.return_value = self._get_prices_for_all(mySecs, numDays)
 
             myPi = mySecs.get_web_data(timePeriod)
 
             assert len(myPi) == 3
             assert myPi[0].periodDates[0] == date.today() - timedelta(numDays)
-            mock_get.assert_called_with(self.secsDict["GOOGL"].id, self.weeklyDbName, numDays)
+            mock_get.assert_called_once_with(self.weeklyDbName, numDays)
+
+    def _get_prices_for_all(self, mySecs, numDays):
+        """
+        Simulate data returned by get_historical_prices_for_all, for securities
+        currently in given Securities.
+        """
+        pricesById = {}
+        for tmpSec in mySecs.securitiesDict.values():
+            pricesById[tmpSec.id] = self._get_historical_prices(numDays)
+
+        return pricesById
 
     def _get_historical_prices(self, numDays):
         """
-        Create list of priceDate/price dictionaries, to simulate data returned by
-        get_historical_prices.
+        Create columns of priceDates and prices, to simulate data returned by
+        get_historical_price_columns.
         """
         startDate = date.today() - timedelta(numDays)
+        dates = []
         prices = []
         startPrice = 65.43
         randRange = 0.45 * startPrice
@@ -181,8 +194,8 @@ class TestSecuritiesWebData():
             myDelta = timedelta(7)
         for i in range(numDays):
             priceDelta = random.uniform(-randRange, randRange)
-            newPrice = round(Decimal(startPrice + priceDelta), 2)
-            prices.append({"priceDate": newDate, "price": newPrice})
+            dates.append(newDate)
+            prices.append(round(startPrice + priceDelta, 2))
             newDate += myDelta
 
-        return prices
+        return {"priceDate": dates, "price": np.array(prices, dtype=np.float64)}
@@ -39,6 +39,24 @@ class Test_security_groups:
         assert buys[0].rating == 1/15
         assert buys[0].security.symbol == "SU"
 
+    def test_fetch_priority(self):
+        """
+        Buy and sell zones first, furthest in first, then near buy/sell, closest to the
+        edge first, then middle. Securities with no price yet before everything.
+        """
+        secList = [self.createSecurity("Middle", "MID", 30, 60, 45),
+                   self.createSecurity("Near sell", "NS", 30, 60, 55),
+                   self.createSecurity("Sell", "SELL", 30, 60, 63),
+                   self.createSecurity("Deep buy", "DBUY", 30, 60, 20),
+                   self.createSecurity("Near buy", "NB", 30, 60, 32),
+                   self.createSecurity("New", "NEW", 30, 60, 0),
+                   self.createSecurity("Off middle", "OMID", 30, 60, 38)]
+
+        ordered = sorted(secList, key=self.groups.get_fetch_priority)
+
+        assert [sec.symbol for sec in ordered] == ["NEW", "DBUY", "SELL", "NB", "NS", "OMID",
+                                                   "MID"]
+
     def test_single_near_buy(self):
         """
         Test that get one security in near_buy group.
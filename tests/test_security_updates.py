@@ -16,6 +16,9 @@ get_changed_fields
     Verify unchanged fields don't change
     Verify get nothing back if no values change.
 
+get_daily_update_fields
+    Verify every field comes back, even if unchanged.
+
 update_values
     Verify correct values get to correct fields.
 """
@@ -115,6 +118,22 @@ class TestSecurity2():
         assert len(changedFieldNames) == 0
         assert len(newValues) == 0
 
+    def test_get_daily_update_fields_unchanged(self):
+        """
+        Test that every field is returned, even when values haven't changed.
+        """
+        newInfo = self._create_priceInfo()
+        testSecurity = Security()
+        testSecurity.pop_with_priceInfo("TEST4", "TST4", 85, 110, newInfo)
+        today = date.today()
+
+        fieldNames, newValues = testSecurity.get_daily_update_fields(newInfo, today)
+
+        assert fieldNames == ["name", "symbol", "currentPrice", "currentPriceDate",
+                              "previousClosePrice", "52WeekLowPrice", "52WeekHighPrice"]
+        assert newValues == ["TEST4", "TST4", newInfo.currentPrice, today,
+                             newInfo.lastClosePrice, newInfo.low52Week, newInfo.high52Week]
+
     def test_update_values_all_fields(self):
         """
         Test updating all fields.
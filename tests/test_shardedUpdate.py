@@ -0,0 +1,159 @@
+"""
+File to test shardedUpdate - coordinator, workers and reducer.
+V0.01, October 18, 2026
+"""
+
+from datetime import date
+from unittest.mock import patch
+import pytest
+
+from . import addSrcToPath
+from . import helperMethods
+
+import dbAccess
+import rateLimiter
+from security import PriceInfo
+import settings
+from securitiesInterface import SecuritiesInterface
+from securities import Securities
+import shardedUpdate
+from targetSecurity import TargetSecurity
+from utilsInterface import UtilsInterface
+
+"""
+To Test
+    get_shard
+        Same shard every time, in range.
+    run_sharded_update
+        In process - every shard's prices saved, weekly prices and dates done once,
+        email sent.
+        Shard that fails - others saved, weekly not marked as done.
+        Worker processes - prices saved by several processes.
+"""
+
+mySettings = settings.Settings.instance()
+symbols = [f"SEC{num}" for num in range(8)]
+
+
+def get_price_info(symbol, mySettings):
+    priceInfo = PriceInfo()
+    priceInfo.currentPrice = 10 + int(symbol[-1])
+    priceInfo.lastClosePrice = 9
+    priceInfo.low52Week = 5
+    priceInfo.high52Week = 25
+    return priceInfo
+
+
+origShardUpdate = Securities.do_shard_price_update
+
+
+def fail_shard_with_sec5(self, symbols, currentDate):
+    """
+    The daily price pipeline only loses the one price if a fetch fails, so fail the
+    whole shard containing SEC5.
+    """
+    if "SEC5" in symbols:
+        raise ConnectionError("Connection reset")
+    return origShardUpdate(self, symbols, currentDate)
+
+
+def add_securities():
+    myUtils = UtilsInterface()
+    myUtils.connect()
+    securitiesInter = SecuritiesInterface()
+    for symbol in symbols:
+        target = TargetSecurity()
+        target.name, target.symbol = f"Security {symbol}", symbol
+        target.buyPrice, target.sellPrice = 10, 20
+        securitiesInter.add_security(target)
+    # add_security stores "N", which MySQL turns into 0, but SQLite keeps as text. Mark
+    # all as downloaded, so that workers don't try to get histories.
+    dbAccess.update_data(mySettings.db_securities_table_name, ["fullHistoryDownloaded"],
+                         [True], "1=1")
+    myUtils.disconnect()
+
+
+def get_saved_prices():
+    myUtils = UtilsInterface()
+    myUtils.connect()
+    daily = dbAccess.select_data(mySettings.db_daily_table_name, ["securityId", "price"],
+                                 "1=1 ORDER BY securityId")
+    weekly = dbAccess.select_data(mySettings.db_weekly_table_name, ["securityId"], "1=1")
+    lastWeekly = myUtils.get_last_weekly_update_date()
+    lastGroom = myUtils.get_last_groom_date()
+    myUtils.disconnect()
+    return daily, weekly, lastWeekly, lastGroom
+
+
+@pytest.mark.unit
+def test_get_shard():
+    """
+    Each symbol should always go to the same shard, and shards should be in range.
+    """
+    shards = [shardedUpdate.get_shard(symbol, 3) for symbol in symbols]
+
+    assert shards == [shardedUpdate.get_shard(symbol, 3) for symbol in symbols]
+    assert set(shards) == {0, 1, 2}
+
+
+@pytest.mark.unit
+class TestShardedUpdate():
+    """
+    Runs on a SQLite database, with price retrieval and the email mocked. Runs on a
+    Friday, so that weekly prices are due.
+    """
+    currentDate = date(2023, 1, 13)
+
+    def _run(self, useProcesses=False):
+        # All shards are queued before workers start, so they needn't wait long for more.
+        with patch('yahooInterface.retrieve_daily_data', side_effect=get_price_info), \
+                patch.object(Securities, 'do_shard_price_update', fail_shard_with_sec5), \
+                patch('securities.date') as mockDate, \
+                patch('daily_email._generate_and_send') as mockSend, \
+                patch.object(mySettings, 'shard_queue_timeout', 0.2):
+            mockDate.today.return_value = self.currentDate
+            numUpdated = shardedUpdate.run_sharded_update(3, 2, useProcesses, self.currentDate)
+        return numUpdated, mockSend
+
+    def _get_expected_prices(self):
+        """
+        Prices expected to be saved - those in every shard but the failing one.
+        """
+        failedShard = shardedUpdate.get_shard("SEC5", 3)
+        return sorted(10 + int(symbol[-1]) for symbol in symbols
+                      if shardedUpdate.get_shard(symbol, 3) != failedShard)
+
+    def test_in_process(self):
+        """
+        Every shard but the failing one should be saved, weekly prices copied, grooming
+        run and email sent. Weekly update not marked as done, because of the failed shard.
+        """
+        with helperMethods.sqlite_database(mySettings):
+            add_securities()
+            numUpdated, mockSend = self._run()
+            daily, weekly, lastWeekly, lastGroom = get_saved_prices()
+
+        assert sorted(x["price"] for x in daily) == self._get_expected_prices()
+        assert numUpdated == len(daily)
+        assert len(weekly) == len(daily)
+        assert lastWeekly is None
+        assert lastGroom == date.today()
+        mockSend.assert_called_once()
+
+    def test_worker_processes(self, tmp_path):
+        """
+        Workers in separate processes should all save their prices to the shared
+        database file, splitting the rate limits between them.
+        """
+        with helperMethods.sqlite_database(mySettings, str(tmp_path / "spr.db")), \
+                patch('rateLimiter.split_between',
+                      wraps=rateLimiter.split_between) as mockSplit:
+            add_securities()
+            numUpdated, mockSend = self._run(useProcesses=True)
+            daily, weekly, lastWeekly, lastGroom = get_saved_prices()
+
+        assert sorted(x["price"] for x in daily) == self._get_expected_prices()
+        assert numUpdated == len(daily)
+        assert len(weekly) == len(daily)
+        mockSend.assert_called_once()
+        mockSplit.assert_called_once_with(mySettings, 2)
@@ -0,0 +1,190 @@
+"""
+File to test sqliteBackend, and running dbAccess and the interfaces on SQLite.
+V0.01, October 18, 2026
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+import pytest
+
+from . import addSrcToPath
+from . import helperMethods
+
+import databaseUtils
+import dbAccess
+from historicalPricesInterface import HistoricalPricesInterface
+from securitiesInterface import SecuritiesInterface
+import settings
+import sqliteBackend
+from targetSecurity import TargetSecurity
+from utilsInterface import UtilsInterface
+
+"""
+To Test
+    translate_create_table
+        Auto increment primary key, integer types, indexes, engine.
+        Each of the real table definitions creates a table.
+    translate_sql
+        Placeholders, identifiers starting with digits, empty insert, upsert.
+        String literals unchanged.
+    Interfaces on in memory database
+        Admin record created, dates round trip.
+        Securities added, bulk updated, decimals round trip.
+        Historical prices saved, weekly price copied, columns returned.
+        Failed statement rolls back transaction.
+    File database keeps data between connections.
+"""
+
+
+@pytest.fixture()
+def sqliteSettings():
+    """
+    Switch dbAccess to an empty in memory SQLite database, with all tables created.
+    """
+    with helperMethods.sqlite_database(settings.Settings.instance()) as mySettings:
+        yield mySettings
+
+
+@pytest.mark.unit
+class TestSqliteTranslation():
+
+    def test_translate_create_table(self):
+        """
+        Auto increment id should become the rowid, indexes separate statements.
+        """
+        tableCmd = databaseUtils._get_table_definitions()["dailyPriceHistory"] % ("prices",)
+        statements = sqliteBackend.translate_create_table(tableCmd)
+
+        assert statements[0] == ("CREATE TABLE prices (`id` INTEGER NOT NULL PRIMARY KEY "
+                                 "AUTOINCREMENT, securityId INTEGER, price DECIMAL(10,2), "
+                                 "priceDate DATE)")
+        assert statements[1:] == ["CREATE INDEX prices_securityIdIdx ON prices (securityId)",
+                                  "CREATE INDEX prices_priceDateIdx ON prices (priceDate)"]
+
+    def test_translate_sql(self):
+        """
+        MySQL only syntax should be translated, outside string literals.
+        """
+        sqlCmd = ("INSERT INTO t (id, 52WeekLowPrice) VALUES (%s, %s) ON DUPLICATE KEY "
+                  "UPDATE 52WeekLowPrice = VALUES(52WeekLowPrice)")
+
+        assert sqliteBackend.translate_sql(sqlCmd) == \
+            ("INSERT INTO t (id, `52WeekLowPrice`) VALUES (?, ?) ON CONFLICT DO UPDATE SET "
+             "`52WeekLowPrice` = excluded.`52WeekLowPrice`")
+        assert sqliteBackend.translate_sql("INSERT INTO admin () VALUES ()") == \
+            "INSERT INTO admin DEFAULT VALUES"
+        assert sqliteBackend.translate_sql("symbol = '1AB %s'") == "symbol = '1AB %s'"
+
+
+@pytest.mark.unit
+class TestSqliteInterfaces():
+
+    def test_all_tables_created(self, sqliteSettings):
+        """
+        Every table definition should translate to a working table.
+        """
+        dbAccess.connect()
+        for tableName in databaseUtils._get_table_definitions():
+            assert dbAccess.does_table_exist(sqliteSettings.test_table_prefix + tableName)
+        dbAccess.disconnect()
+
+    def test_admin_dates(self, sqliteSettings):
+        """
+        UtilsInterface should create its record, and dates should come back as dates.
+        """
+        myUtils = UtilsInterface()
+        myUtils.connect()
+        myUtils.set_last_weekly_update_date()
+        lastWeekly = myUtils.get_last_weekly_update_date()
+        myUtils.disconnect()
+
+        assert myUtils.recId == 1
+        assert lastWeekly == date.today()
+
+    def test_securities_round_trip(self, sqliteSettings):
+        """
+        Add a security, bulk update its prices, read back as decimals.
+        """
+        myUtils = UtilsInterface()
+        myUtils.connect()
+        securitiesInter = SecuritiesInterface()
+        target = TargetSecurity()
+        target.name, target.symbol, target.buyPrice, target.sellPrice = "Apple", "aapl", 100, 200
+        securitiesInter.add_security(target)
+        secId = securitiesInter.get_securities()[0]["id"]
+        fieldNames = ["name", "symbol", "currentPrice", "currentPriceDate",
+                      "previousClosePrice", "52WeekLowPrice", "52WeekHighPrice"]
+        updatedOk = securitiesInter.update_securities_bulk(
+            fieldNames, [[secId, "Apple", "AAPL", Decimal("150.25"), date.today(), 149, 90, 190]])
+        records = list(securitiesInter.iter_securities())
+        myUtils.disconnect()
+
+        assert updatedOk
+        assert len(records) == 1
+        assert records[0]["symbol"] == "AAPL"
+        assert records[0]["currentPrice"] == Decimal("150.25")
+        assert records[0]["currentPriceDate"] == date.today()
+        assert records[0]["52weekLowPrice"] == 90
+
+    def test_historical_prices(self, sqliteSettings):
+        """
+        Save daily prices, copy one to weekly, read back as columns and dictionaries.
+        """
+        myUtils = UtilsInterface()
+        myUtils.connect()
+        historyInter = HistoricalPricesInterface()
+        today = date.today()
+        historyInter.save_daily_historical_prices(
+            7, [(today - timedelta(days=i), Decimal(20 + i)) for i in range(5)])
+        historyInter.save_weekly_price_for_security(7, today)
+        columns = historyInter.get_historical_price_columns(
+            7, sqliteSettings.db_daily_table_name, 10)
+        weekly = historyInter.get_historical_prices(7, sqliteSettings.db_weekly_table_name, 10)
+        myUtils.disconnect()
+
+        assert columns["priceDate"][0] == today - timedelta(days=4)
+        assert columns["price"].tolist() == [24.0, 23.0, 22.0, 21.0, 20.0]
+        assert weekly == [{"priceDate": today, "price": Decimal(20)}]
+
+    def test_transaction_rolls_back(self, sqliteSettings):
+        """
+        Failed statement should roll back earlier statements in the transaction.
+        """
+        myUtils = UtilsInterface()
+        myUtils.connect()
+        historyInter = HistoricalPricesInterface()
+        with myUtils.transaction():
+            historyInter.save_daily_price_for_security(7, 12.5, date.today())
+            dbAccess.delete_data("noSuchTable", "1=1")
+        prices = historyInter.get_historical_prices(7, sqliteSettings.db_daily_table_name, 10)
+        myUtils.disconnect()
+
+        assert not myUtils.last_transaction_committed()
+        assert prices == []
+
+
+@pytest.mark.unit
+def test_file_database(tmp_path):
+    """
+    File backed database should keep data after pool, and connections, are closed.
+    """
+    mySettings = settings.Settings.instance()
+    origBackend, origPath = mySettings.db_backend, mySettings.sqlite_path
+    dbAccess.close_pool()
+    mySettings.db_backend = "sqlite"
+    mySettings.sqlite_path = str(tmp_path / "spr.db")
+
+    dbAccess.connect()
+    dbAccess.create_table("CREATE TABLE t1 (`id` MEDIUMINT UNSIGNED NOT NULL AUTO_INCREMENT, "
+                          "price DECIMAL(10,2), PRIMARY KEY (`id`)) ENGINE=InnoDB")
+    dbAccess.insert_data("t1", ["price"], [(1.5,), (2.5,)])
+    dbAccess.disconnect()
+    dbAccess.close_pool()
+
+    dbAccess.connect()
+    records = dbAccess.select_data("t1", ["id", "price"], "1=1")
+    dbAccess.disconnect()
+    dbAccess.close_pool()
+    mySettings.db_backend, mySettings.sqlite_path = origBackend, origPath
+
+    assert records == [{"id": 1, "price": Decimal("1.5")}, {"id": 2, "price": Decimal("2.5")}]